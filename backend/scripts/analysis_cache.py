@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Read size when hashing model files
+HASH_CHUNK_SIZE = 1024 * 1024
+# Entries are deleted by a TTL index (see db_schema.INDEXES) this long after they were stored
+ANALYSIS_CACHE_TTL_DAYS = float(os.getenv("ANALYSIS_CACHE_TTL_DAYS", "30"))
+
+def hash_bytes(data):
+    """Returns the SHA-256 hex digest of a bytes object."""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path):
+    """Returns the SHA-256 hex digest of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class AnalysisCache:
+    """
+    Content-addressed store of analysis results. Entries are keyed by the hash of the uploaded
+    bytes combined with a version string that covers the model files and the analysis
+    parameters, so replacing a model or changing the grid produces new keys and old entries
+    are never hit again. MongoDB deletes entries ANALYSIS_CACHE_TTL_DAYS after created_at,
+    which removes those of earlier versions and bounds the size of the collection.
+
+    @param collection: The MongoDB collection holding cache entries.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(content_hash, version):
+        """
+        Builds the cache key of an upload.
+
+        @param content_hash: SHA-256 of the uploaded bytes.
+        @param version: Fingerprint of the models and analysis parameters.
+        @return: The cache key.
+        """
+        return hashlib.sha256(f"{content_hash}|{version}".encode()).hexdigest()
+
+    def get(self, content_hash, version):
+        """
+        Looks up previously computed results for an upload.
+
+        @return: Tuple (image_shape, compressed_analysis_results), or None on a miss.
+        """
+        entry = self.collection.find_one_and_update(
+            {"_id": self.key(content_hash, version)},
+            {"$inc": {"hits": 1}, "$set": {"last_hit_at": datetime.utcnow()}}
+        )
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            return None
+        logger.info(f"Analysis cache hit for upload {content_hash[:12]}")
+        return entry["image_shape"], entry["compressed_analysis_results"]
+
+    def put(self, content_hash, version, image_shape, compressed_data):
+        """Stores the analysis results of an upload."""
+        self.collection.update_one(
+            {"_id": self.key(content_hash, version)},
+            {"$setOnInsert": {
+                "content_hash": content_hash,
+                "version": version,
+                "image_shape": image_shape,
+                "compressed_analysis_results": compressed_data,
+                "created_at": datetime.utcnow(),
+                "hits": 0
+            }},
+            upsert=True
+        )
+
+    def stats(self):
+        """Returns hit/miss counters of this process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None
+            }
@@ -0,0 +1,146 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+import numpy as np
+from backend.scripts.onnx_interference import onnx_prediction_batch, preprocess_image
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Number of recent requests the wait time statistics are computed over
+STATS_WINDOW = 1000
+
+class DetectionBatcher:
+    """
+    Collects concurrent detection requests for one ONNX session and runs them as a single batch.
+
+    A batch is started as soon as max_batch_size requests are waiting, or max_wait_ms after the
+    first request of the batch was submitted, whichever comes first. Only worth it for sessions
+    that support batching (see onnx_interference.supports_batching).
+
+    @param session: The ONNX inference session for prediction.
+    @param max_batch_size: Maximum number of images per session run.
+    @param max_wait_ms: How long the first request of a batch waits for more requests.
+    @param name: Name used in logs and statistics.
+    """
+
+    def __init__(self, session, max_batch_size, max_wait_ms, name):
+        self.session = session
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._wait_times = deque(maxlen=STATS_WINDOW)
+        self._run_times = deque(maxlen=STATS_WINDOW)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, image_bchw=None):
+        """
+        Queues an image for detection.
+
+        @param image: The image as a NumPy array.
+        @param image_bchw: Optional input tensor from preprocess_image(image).
+        @return: A Future resolving to the class_bboxes dictionary of the image (see onnx_prediction).
+        """
+        if self._closed:
+            raise RuntimeError(f"Detection batcher {self.name} is closed")
+        if image_bchw is None:
+            image_bchw = preprocess_image(image)
+        future = Future()
+        self._queue.put((image, image_bchw, future, time.perf_counter()))
+        return future
+
+    def predict(self, image, image_bchw=None):
+        """Blocking variant of submit, drop-in replacement for onnx_prediction(image, session, image_bchw)."""
+        return self.submit(image, image_bchw).result()
+
+    def close(self):
+        """Stops the scheduler thread after the requests already queued have been served."""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        """
+        Returns scheduler statistics for tuning max_batch_size and max_wait_ms.
+
+        @return: Dict with the current queue depth, a histogram of executed batch sizes and
+                 wait/run time percentiles in milliseconds over the last STATS_WINDOW requests.
+        """
+        with self._stats_lock:
+            wait_times = np.array(self._wait_times) * 1000
+            run_times = np.array(self._run_times) * 1000
+            histogram = dict(sorted(self._batch_sizes.items()))
+
+        def percentiles(values):
+            if len(values) == 0:
+                return None
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(values.max())}
+
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_size_histogram": histogram,
+            "wait_ms": percentiles(wait_times),
+            "run_ms": percentiles(run_times)
+        }
+
+    def _collect_batch(self):
+        """Blocks for the first request, then gathers more until the batch is full or the wait is over."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        # Measured from submission, so time spent queued behind the previous batch counts
+        deadline = first[3] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Serve what we have, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+
+            images = [image for image, _, _, _ in batch]
+            tensors = [image_bchw for _, image_bchw, _, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = onnx_prediction_batch(images, self.session, self.max_batch_size, tensors)
+            except Exception as e:
+                logger.error(f"Detection batcher {self.name} failed on a batch of {len(batch)}: {e}")
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            for (_, _, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._wait_times.extend(started - submitted for _, _, _, submitted in batch)
+                self._run_times.append(finished - started)
+            logger.debug("Detection batcher %s ran a batch of %d in %.1f ms",
+                         self.name, len(batch), (finished - started) * 1000)
+        logger.info(f"Detection batcher {self.name} stopped")
@@ -0,0 +1,72 @@
+"""
+Load test for the backend's database-bound endpoints: POST /token and
+GET /cases/{case_name}/images, at increasing numbers of concurrent clients.
+Reports throughput and latency percentiles per endpoint and concurrency level.
+
+Start the backend first (MONGO_URI=memory:// runs it without MongoDB), then:
+    python -m backend.scripts.bench_api_concurrency --username admin --password secret --case demo
+        [--base-url http://127.0.0.1:8000] [--concurrency 1 8 32 64] [--requests 500]
+"""
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from backend.scripts.script_utils import script_parser
+
+def login(session, base_url, username, password):
+    response = session.post(f"{base_url}/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+def run_load(name, call, concurrency, total):
+    """Runs `total` calls from `concurrency` threads, each with its own HTTP session."""
+    local = threading.local()
+    durations, errors = [], []
+    lock = threading.Lock()
+
+    def one(_):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            call(local.session).raise_for_status()
+        except requests.RequestException as e:
+            with lock:
+                errors.append(e)
+            return
+        with lock:
+            durations.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    durations.sort()
+    p99 = durations[min(len(durations) - 1, int(len(durations) * 0.99))] if durations else float("nan")
+    p50 = statistics.median(durations) if durations else float("nan")
+    print(f"{name:>12} x{concurrency:<4}: {len(durations) / elapsed:8.1f} req/s, "
+          f"p50 {p50:8.2f} ms, p99 {p99:8.2f} ms, {len(errors)} errors")
+
+if __name__ == "__main__":
+    parser = script_parser(__doc__)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--case", required=True, help="Existing case whose images are listed")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint and concurrency level")
+    args = parser.parse_args()
+
+    token = login(requests.Session(), args.base_url, args.username, args.password)
+    headers = {"Authorization": f"Bearer {token}"}
+    credentials = {"username": args.username, "password": args.password}
+
+    for concurrency in args.concurrency:
+        run_load("token", lambda s: s.post(f"{args.base_url}/token", data=credentials), concurrency, args.requests)
+        run_load(
+            "case images",
+            lambda s: s.get(f"{args.base_url}/cases/{args.case}/images", headers=headers),
+            concurrency, args.requests
+        )
@@ -0,0 +1,35 @@
+"""
+Compares detector throughput of one-image-at-a-time onnx_prediction against onnx_prediction_batch.
+
+Usage:
+    python -m backend.scripts.bench_batch_detection path/to/images [--batch-sizes 1 2 4 8] [--repeats 3]
+"""
+import os
+import numpy as np
+from PIL import Image
+from backend.scripts.onnx_interference import load_onnx_model, onnx_prediction, onnx_prediction_batch
+from backend.scripts.script_utils import best_of, image_paths, script_parser
+
+def load_images(directory):
+    return [np.array(Image.open(path).convert("RGB")) for path in image_paths(directory)]
+
+
+if __name__ == "__main__":
+    parser = script_parser(__doc__)
+    parser.add_argument("images")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    for model in ("capsules", "tissue"):
+        session = load_onnx_model(os.path.join("backend", "models", f"{model}.onnx"))
+        # Warm up so the first measured run does not pay for lazy initialisation
+        onnx_prediction(images[0], session)
+
+        sequential = best_of(args.repeats, lambda: [onnx_prediction(image, session) for image in images])
+        print(f"{model}: one at a time {len(images) / sequential:6.2f} images/s")
+        for batch_size in args.batch_sizes:
+            batched = best_of(args.repeats, lambda: onnx_prediction_batch(images, session, batch_size))
+            print(f"{model}: batch size {batch_size:3d}  {len(images) / batched:6.2f} images/s "
+                  f"({sequential / batched:.2f}x)")
@@ -0,0 +1,89 @@
+"""
+Measures case and image lookup latency on a scratch database with many cases, before and
+after db_schema.ensure_indexes:
+
+    case by name:     cases.find_one({"caseName": ...})
+    user by name:     users.find_one({"username": ...})
+    images (array):   case.imageIds followed by images.find({"_id": {"$in": ...}}), the old linkage
+    images (case_id): images.find({"case_id": ...}).sort("_id"), the current linkage
+
+The scratch database is dropped at the end unless --keep is given.
+
+Usage (needs a running MongoDB):
+    python -m backend.scripts.bench_case_lookup [--cases 100000] [--images-per-case 3] [--lookups 500]
+"""
+import random
+import statistics
+import time
+from bson import ObjectId
+from pymongo import MongoClient
+from backend.scripts.db_schema import ensure_indexes
+from backend.scripts.script_utils import script_parser
+
+def populate(db, cases, images_per_case, batch_size=10000):
+    for offset in range(0, cases, batch_size):
+        case_docs, image_docs, user_docs = [], [], []
+        for number in range(offset, min(offset + batch_size, cases)):
+            case_id = ObjectId()
+            image_ids = [ObjectId() for _ in range(images_per_case)]
+            case_docs.append({"_id": case_id, "caseName": f"case-{number}", "imageIds": [str(i) for i in image_ids]})
+            image_docs.extend({"_id": image_id, "case_id": str(case_id), "filename": f"{image_id}.jpg"}
+                              for image_id in image_ids)
+            user_docs.append({"username": f"user-{number}", "email": f"user-{number}@example.org"})
+        db["Cases"].insert_many(case_docs)
+        db["Users"].insert_many(user_docs)
+        if image_docs:
+            db["Images"].insert_many(image_docs)
+
+def measure(label, lookup, names):
+    durations = []
+    for name in names:
+        start = time.perf_counter()
+        lookup(name)
+        durations.append((time.perf_counter() - start) * 1000)
+    durations.sort()
+    p99 = durations[min(len(durations) - 1, int(len(durations) * 0.99))]
+    print(f"{label:>18}: p50 {statistics.median(durations):8.3f} ms, p99 {p99:8.3f} ms")
+
+def run_lookups(db, cases, lookups):
+    names = [random.randrange(cases) for _ in range(lookups)]
+
+    def images_by_array(number):
+        case = db["Cases"].find_one({"caseName": f"case-{number}"})
+        return list(db["Images"].find({"_id": {"$in": [ObjectId(i) for i in case["imageIds"]]}}))
+
+    def images_by_case_id(number):
+        case = db["Cases"].find_one({"caseName": f"case-{number}"})
+        return list(db["Images"].find({"case_id": str(case["_id"])}).sort("_id", 1))
+
+    measure("case by name", lambda n: db["Cases"].find_one({"caseName": f"case-{n}"}), names)
+    measure("user by name", lambda n: db["Users"].find_one({"username": f"user-{n}"}), names)
+    measure("images (array)", images_by_array, names)
+    measure("images (case_id)", images_by_case_id, names)
+
+if __name__ == "__main__":
+    parser = script_parser(__doc__)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--database", default="bench_case_lookup")
+    parser.add_argument("--cases", type=int, default=100000)
+    parser.add_argument("--images-per-case", type=int, default=3)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database")
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    client.drop_database(args.database)
+    db = client[args.database]
+    try:
+        start = time.perf_counter()
+        populate(db, args.cases, args.images_per_case)
+        print(f"Inserted {args.cases} cases in {time.perf_counter() - start:.1f} s\n\nWithout indexes")
+        run_lookups(db, args.cases, args.lookups)
+
+        start = time.perf_counter()
+        ensure_indexes(db)
+        print(f"\nWith indexes (built in {time.perf_counter() - start:.1f} s)")
+        run_lookups(db, args.cases, args.lookups)
+    finally:
+        if not args.keep:
+            client.drop_database(args.database)
@@ -0,0 +1,75 @@
+"""
+Measures how much of an upload's latency goes into logging, with the old configuration
+(root at DEBUG, synchronous FileHandler, per-segment/per-detection f-string logs and the
+full mask logged with logger.info) against the queued configuration from logging_config.
+
+Usage:
+    python -m backend.scripts.bench_logging [--boxes 8] [--mask-shape 3000 4000] [--repeats 5]
+"""
+import logging
+import logging.config
+import os
+import tempfile
+import time
+import uuid
+import numpy as np
+from backend.scripts.script_utils import script_parser
+
+def legacy_config(log_file):
+    return {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "formatters": {"default": {"format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s"}},
+        "handlers": {
+            "file": {"class": "logging.FileHandler", "filename": log_file, "formatter": "default"},
+        },
+        "root": {"handlers": ["file"], "level": "DEBUG"},
+    }
+
+def legacy_upload_logging(logger, mask, boxes, segments_per_box, detections):
+    """Replays the log calls an upload made before: per detection, per grid segment and the mask itself."""
+    for index in range(detections):
+        logger.info(f"Detected object with class_id=0, confidence=0.9, "
+                    f"x_min={index}, y_min={index}, x_max={index + 10}, y_max={index + 10}")
+    for _ in range(boxes):
+        for _ in range(segments_per_box):
+            segment = {"id": str(uuid.uuid4()), "x_start": 1.0, "y_start": 2.0, "x_end": 3.0, "y_end": 4.0}
+            logger.info(f"Created horizontal segment: {segment}")
+            logger.info(f"Created vertical segment: {segment}")
+        logger.info(mask)
+
+def current_upload_logging(logger, mask, boxes, segments_per_box, detections):
+    """Replays the log calls an upload makes now."""
+    logger.debug("Detected %d objects", detections)
+    for _ in range(boxes):
+        logger.debug("Generated %d horizontal and %d vertical grid segments", segments_per_box, segments_per_box)
+
+def measure(label, upload_logging, logger, mask, args):
+    durations = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        upload_logging(logger, mask, args.boxes, args.segments_per_box, args.detections)
+        durations.append(time.perf_counter() - start)
+    print(f"{label:>8}: {min(durations) * 1000:9.2f} ms per upload (best of {args.repeats})")
+
+if __name__ == "__main__":
+    parser = script_parser(__doc__)
+    parser.add_argument("--boxes", type=int, default=8)
+    parser.add_argument("--segments-per-box", type=int, default=60)
+    parser.add_argument("--detections", type=int, default=10)
+    parser.add_argument("--mask-shape", type=int, nargs=2, default=[3000, 4000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    mask = np.zeros(args.mask_shape, dtype=bool)
+    mask[100:200, 100:200] = True
+    log_dir = tempfile.mkdtemp()
+
+    logging.config.dictConfig(legacy_config(os.path.join(log_dir, "legacy.log")))
+    measure("before", legacy_upload_logging, logging.getLogger("bench"), mask, args)
+
+    # Importing logging_config applies the queued configuration
+    os.environ["LOG_FILE"] = os.path.join(log_dir, "current.log")
+    from backend.scripts import logging_config
+    measure("after", current_upload_logging, logging.getLogger("bench"), mask, args)
+    logging_config.log_listener.stop()
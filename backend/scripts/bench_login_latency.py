@@ -0,0 +1,63 @@
+"""
+Measures /token latency against a running backend, first idle and then while uploads are in flight.
+With inference running in the inference pool both numbers should stay in the same range.
+
+Usage:
+    python -m backend.scripts.bench_login_latency --username admin --password secret \
+        --case bench_case --image path/to/macro.jpg [--uploads 4] [--logins 50]
+"""
+import statistics
+import threading
+import time
+import requests
+from backend.scripts.script_utils import script_parser
+
+def login(base_url, username, password):
+    start = time.perf_counter()
+    response = requests.post(f"{base_url}/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return time.perf_counter() - start, response.json()["access_token"]
+
+def measure_logins(base_url, username, password, count):
+    return [login(base_url, username, password)[0] for _ in range(count)]
+
+def upload(base_url, token, case_name, image_path):
+    with open(image_path, "rb") as f:
+        response = requests.post(
+            f"{base_url}/cases/{case_name}/upload-image",
+            files={"file": (image_path, f, "image/jpeg")},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+    response.raise_for_status()
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{label:>18}: median {statistics.median(latencies) * 1000:7.1f} ms, "
+          f"p95 {p95 * 1000:7.1f} ms, max {latencies[-1] * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    parser = script_parser(__doc__)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--case", required=True)
+    parser.add_argument("--image", required=True)
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--logins", type=int, default=50)
+    args = parser.parse_args()
+
+    _, token = login(args.base_url, args.username, args.password)
+    report("idle", measure_logins(args.base_url, args.username, args.password, args.logins))
+
+    uploaders = [
+        threading.Thread(target=upload, args=(args.base_url, token, args.case, args.image))
+        for _ in range(args.uploads)
+    ]
+    for thread in uploaders:
+        thread.start()
+    # Give the uploads time to reach the inference pool
+    time.sleep(0.5)
+    report(f"{args.uploads} uploads running", measure_logins(args.base_url, args.username, args.password, args.logins))
+    for thread in uploaders:
+        thread.join()
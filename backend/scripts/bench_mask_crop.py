@@ -0,0 +1,62 @@
+"""
+Measures masks stored cropped to their bounding box against full-image masks.
+
+Synthesises macro photos of the size of a 12 MP upload with several tissue pieces (irregular
+ellipses of different sizes, one mask each, as SAM2 returns them) and reports, per codec,
+the stored size of the analysis container and the time to decode every mask to its crop
+and to the full canvas. Round trips of cropped masks are covered by tests/test_mask_codec.py.
+
+Usage:
+    python -m backend.scripts.bench_mask_crop [--shape 3000 4000] [--tissues 2 4 6] [--repeats 5]
+"""
+import cv2
+import numpy as np
+from common.analysis_format import pack_analysis_results, unpack_analysis_results
+from common.mask_codec import MASK_CODECS, encode_mask_with_metadata, decode_mask_with_metadata, decode_mask_crop
+from backend.scripts.script_utils import best_of, script_parser
+
+def tissue_masks(rng, shape, count):
+    """One mask per tissue piece: a rotated ellipse with a wobbly outline, placed without overlap in a grid."""
+    height, width = shape
+    cols = int(np.ceil(np.sqrt(count)))
+    rows = int(np.ceil(count / cols))
+    cell_h, cell_w = height // rows, width // cols
+    masks = []
+    for index in range(count):
+        row, col = divmod(index, cols)
+        center = np.array([col * cell_w + cell_w / 2, row * cell_h + cell_h / 2])
+        axes = np.array([cell_w, cell_h]) * rng.uniform(0.2, 0.45, size=2)
+        angles = np.linspace(0, 2 * np.pi, 180, endpoint=False)
+        radius = 1 + 0.08 * np.sin(angles * rng.integers(3, 9) + rng.uniform(0, 2 * np.pi))
+        rotation = rng.uniform(0, np.pi)
+        x = axes[0] * radius * np.cos(angles)
+        y = axes[1] * radius * np.sin(angles)
+        points = np.stack([x * np.cos(rotation) - y * np.sin(rotation),
+                           x * np.sin(rotation) + y * np.cos(rotation)], axis=1) + center
+        mask = np.zeros(shape, dtype=np.uint8)
+        cv2.fillPoly(mask, [points.astype(np.int32)], 1)
+        masks.append(mask)
+    return masks
+
+if __name__ == "__main__":
+    parser = script_parser(__doc__)
+    parser.add_argument("--shape", type=int, nargs=2, default=[3000, 4000])
+    parser.add_argument("--tissues", type=int, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    shape = tuple(args.shape)
+    rng = np.random.default_rng(1)
+    for count in args.tissues:
+        masks = tissue_masks(rng, shape, count)
+        coverage = sum(int(mask.sum()) for mask in masks) / (shape[0] * shape[1])
+        print(f"\n{count} tissues on {shape[1]}x{shape[0]}, {coverage:.1%} of the image covered")
+        for codec in MASK_CODECS:
+            for crop in (False, True):
+                packed = pack_analysis_results([encode_mask_with_metadata(mask, {}, codec, crop) for mask in masks])
+                entries = unpack_analysis_results(packed)
+                full_ms = best_of(args.repeats, lambda: [decode_mask_with_metadata(e, shape) for e in entries]) * 1000
+                crop_ms = best_of(args.repeats, lambda: [decode_mask_crop(e, shape) for e in entries]) * 1000
+                label = f"{codec}{' cropped' if crop else ''}"
+                print(f"{label:>16}: stored {len(packed) / 1024:8.1f} KiB, decode to crop {crop_ms:8.2f} ms, "
+                      f"to full canvas {full_ms:8.2f} ms")
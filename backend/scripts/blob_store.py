@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Read size when streaming uploads into a store
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+class HashingReader:
+    """
+    Wraps a binary file object and computes the SHA-256 and size of everything read through it.
+
+    @param source: The wrapped file object.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self.source.read(size)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+class LocalBlobStore:
+    """
+    Content-addressed blob store in a local directory. Blobs are stored once per content
+    hash under <root>/<hash[:2]>/<hash>, so re-uploading the same file takes no extra space.
+
+    @param root: Directory holding the blobs.
+    """
+    name = "local"
+
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, ".tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, ref):
+        key = ref["key"]
+        return os.path.join(self.root, key[:2], key)
+
+    def save_stream(self, source, chunk_size=BLOB_CHUNK_SIZE):
+        """
+        Streams a file object into the store while hashing it.
+
+        @param source: Binary file object, e.g. UploadFile.file.
+        @return: Tuple (blob reference, SHA-256 hex digest of the content).
+        """
+        reader = HashingReader(source)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter(lambda: reader.read(chunk_size), b""):
+                    f.write(chunk)
+            content_hash = reader.hexdigest()
+            ref = {"store": self.name, "key": content_hash, "size": reader.size}
+            target = self.path(ref)
+            if os.path.exists(target):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return ref, content_hash
+
+    def open(self, ref):
+        """Opens a blob for streaming reads. The caller closes the returned file object."""
+        return open(self.path(ref), "rb")
+
+    def read(self, ref):
+        with self.open(ref) as f:
+            return f.read()
+
+    def delete(self, ref):
+        try:
+            os.remove(self.path(ref))
+        except FileNotFoundError:
+            pass
+
+class GridFSBlobStore:
+    """
+    Blob store in MongoDB GridFS. Files are chunked by GridFS, so neither the 16 MB document
+    limit nor reads of the image documents are affected by the image size. Uploads with the
+    same content hash share one GridFS file.
+
+    @param db: The pymongo database.
+    @param bucket_name: Name of the GridFS bucket.
+    """
+    name = "gridfs"
+
+    def __init__(self, db, bucket_name="images"):
+        from gridfs import GridFSBucket
+        self.bucket = GridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f"{bucket_name}.files"]
+        self.files.create_index("metadata.content_hash")
+
+    def save_stream(self, source, chunk_size=BLOB_CHUNK_SIZE):
+        """See LocalBlobStore.save_stream."""
+        reader = HashingReader(source)
+        file_id = self.bucket.upload_from_stream("upload", reader, chunk_size_bytes=chunk_size)
+        content_hash = reader.hexdigest()
+
+        existing = self.files.find_one({"metadata.content_hash": content_hash}, {"_id": 1})
+        if existing is not None:
+            self.bucket.delete(file_id)
+            file_id = existing["_id"]
+        else:
+            self.files.update_one({"_id": file_id}, {"$set": {"metadata": {"content_hash": content_hash}}})
+        return {"store": self.name, "key": str(file_id), "size": reader.size}, content_hash
+
+    def open(self, ref):
+        """Opens a blob for streaming reads; GridFS fetches the chunks as they are read."""
+        from bson import ObjectId
+        return self.bucket.open_download_stream(ObjectId(ref["key"]))
+
+    def read(self, ref):
+        with self.open(ref) as f:
+            return f.read()
+
+    def delete(self, ref):
+        from bson import ObjectId
+        self.bucket.delete(ObjectId(ref["key"]))
+
+def create_blob_store(kind, db=None, directory="blobs"):
+    """
+    Creates the configured blob store.
+
+    @param kind: "local" or "gridfs".
+    @param db: The pymongo database, required for "gridfs".
+    @param directory: Root directory, used for "local".
+    @return: The blob store.
+    """
+    if kind == LocalBlobStore.name:
+        return LocalBlobStore(directory)
+    if kind == GridFSBlobStore.name:
+        return GridFSBlobStore(db)
+    raise ValueError(f"Unknown blob store {kind!r}, expected 'local' or 'gridfs'")
@@ -0,0 +1,77 @@
+"""
+Compares the batched SegmentationSession path against SAM2 decoding every box on its own,
+one single-mask prediction (multimask_output=False) per box, as process_image stores them.
+
+Usage:
+    python -m backend.scripts.check_segmentation_parity path/to/image.jpg [more images ...]
+"""
+import os
+import sys
+import time
+import numpy as np
+from PIL import Image
+from sam2.build_sam import build_sam2
+from sam2.sam2_image_predictor import SAM2ImagePredictor
+from backend.scripts.onnx_interference import load_onnx_model
+from backend.scripts.process_tissue import (
+    calculate_pixels_per_cm, detect, get_highest_conf_bbox, process_image, process_tissue
+)
+
+# Masks of the two paths must overlap at least this much to count as equal
+MIN_MASK_IOU = 0.99
+
+def mask_iou(mask_a, mask_b):
+    union = np.logical_or(mask_a, mask_b).sum()
+    if union == 0:
+        return 1.0
+    return np.logical_and(mask_a, mask_b).sum() / union
+
+def single_mask(predictor, image, bbox):
+    predictor.set_image(image)
+    masks, _, _ = predictor.predict(box=np.asarray(bbox, dtype=np.float32), multimask_output=False)
+    return masks[0]
+
+def per_box_path(predictor, ort_session_capsule, ort_session_tissue, image):
+    best_class, best_bbox, _ = get_highest_conf_bbox(detect(image, ort_session_capsule))
+    _1cm = calculate_pixels_per_cm(single_mask(predictor, image, best_bbox), best_class)
+    tissues = []
+    for cls, bboxes in process_tissue(ort_session_tissue, image).items():
+        for bbox, confidence in bboxes:
+            bbox = tuple(map(float, bbox))
+            tissues.append((cls, bbox, confidence, single_mask(predictor, image, bbox)))
+    return _1cm, tissues
+
+def check_image(predictor, ort_session_capsule, ort_session_tissue, image_path):
+    image = np.array(Image.open(image_path).convert("RGB"))
+
+    start = time.perf_counter()
+    reference_1cm, reference = per_box_path(predictor, ort_session_capsule, ort_session_tissue, image)
+    per_box_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched_1cm, batched = process_image(predictor, ort_session_capsule, ort_session_tissue, image)
+    batched_time = time.perf_counter() - start
+
+    ok = len(reference) == len(batched) and abs(reference_1cm - batched_1cm) <= 1e-3 * reference_1cm
+    for (cls_a, bbox_a, _, mask_a), (cls_b, bbox_b, _, mask_b) in zip(reference, batched):
+        iou = mask_iou(mask_a, mask_b)
+        ok = ok and cls_a == cls_b and bbox_a == bbox_b and iou >= MIN_MASK_IOU
+        print(f"  class={cls_a} bbox={tuple(round(v, 1) for v in bbox_a)} mask IoU={iou:.4f}")
+
+    print(f"{image_path}: {'OK' if ok else 'MISMATCH'} "
+          f"(1cm {reference_1cm:.2f} vs {batched_1cm:.2f} px, "
+          f"per-box {per_box_time:.2f} s, batched {batched_time:.2f} s, {len(reference)} tissue boxes)")
+    return ok
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+
+    ort_session_capsule = load_onnx_model(os.path.join("backend", "models", "capsules.onnx"))
+    ort_session_tissue = load_onnx_model(os.path.join("backend", "models", "tissue.onnx"))
+    sam = "./backend/sam2/checkpoints/sam2.1_hiera_tiny.pt"
+    model_cfg = "configs/sam2.1/sam2.1_hiera_t.yaml"
+    predictor = SAM2ImagePredictor(build_sam2(model_cfg, sam, device='cpu', apply_postprocessing=False))
+
+    results = [check_image(predictor, ort_session_capsule, ort_session_tissue, path) for path in sys.argv[1:]]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from backend.scripts.memory_db import InMemoryDatabase
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Connection settings. MONGO_URI=memory:// swaps MongoDB for the in-process stand-in of memory_db
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "image_upload_db")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+# 0 waits indefinitely for replies
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+# How long an operation waits for a free pooled connection before failing
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+# Write concern: a number of nodes or "majority", and whether writes wait for the journal
+MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN", "1")
+MONGO_JOURNAL = os.getenv("MONGO_JOURNAL", "0") == "1"
+# Threads running database calls for the event loop; more than the connection pool would only queue
+DB_THREADS = int(os.getenv("DB_THREADS", str(MONGO_MAX_POOL_SIZE)))
+
+def connect(uri=MONGO_URI, db_name=MONGO_DB_NAME):
+    """
+    Connects to the configured database.
+
+    @param uri: MongoDB connection string, or "memory://" for the in-memory stand-in.
+    @param db_name: Name of the database.
+    @return: A pymongo Database with the configured write concern, or an InMemoryDatabase.
+    """
+    if uri.startswith("memory://"):
+        logger.warning("Using the in-memory database, nothing is persisted")
+        return InMemoryDatabase(db_name)
+
+    from pymongo import MongoClient
+    from pymongo.write_concern import WriteConcern
+    client = MongoClient(
+        uri,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS or None,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS
+    )
+    w = int(MONGO_WRITE_CONCERN) if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN
+    return client.get_database(db_name, write_concern=WriteConcern(w=w, j=MONGO_JOURNAL))
+
+class DatabaseExecutor:
+    """
+    Runs blocking pymongo calls on a dedicated thread pool so async handlers never wait for a
+    database round trip on the event loop. Database calls do not compete with other blocking
+    work (hashing, thumbnails, blob I/O) for Starlette's shared thread pool.
+
+    @param max_workers: Number of threads, see DB_THREADS.
+    """
+
+    def __init__(self, max_workers=DB_THREADS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mongo")
+
+    async def run(self, func, *args, **kwargs):
+        """Runs func(*args, **kwargs) on the database threads and returns its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,42 @@
+import logging
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from backend.scripts.analysis_cache import ANALYSIS_CACHE_TTL_DAYS
+from backend.scripts.jobs import ensure_job_indexes
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# (collection, keys, options) of every index the application relies on
+INDEXES = [
+    ("Users", [("username", ASCENDING)], {"unique": True, "name": "username_unique"}),
+    ("Users", [("email", ASCENDING)], {"unique": True, "name": "email_unique"}),
+    ("Cases", [("caseName", ASCENDING)], {"unique": True, "name": "caseName_unique"}),
+    # Serves the case image listing, including its pagination by _id
+    ("Images", [("case_id", ASCENDING), ("_id", ASCENDING)], {"name": "case_id_id"}),
+    # Expires analysis cache entries, including those of earlier model and analysis versions
+    ("AnalysisCache", [("created_at", ASCENDING)], {
+        "name": "created_at_ttl", "expireAfterSeconds": int(ANALYSIS_CACHE_TTL_DAYS * 24 * 3600)
+    }),
+]
+
+def ensure_indexes(db):
+    """
+    Creates the application's indexes if they do not exist yet. Index creation is idempotent,
+    so this runs on every startup. A unique index that cannot be built because of existing
+    duplicates is logged and skipped, so the duplicates can be cleaned up while the
+    application keeps running.
+
+    @param db: The pymongo database.
+    @return: Names of the indexes that could not be created.
+    """
+    failed = []
+    for collection, keys, options in INDEXES:
+        try:
+            db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            failed.append(options["name"])
+            logger.error(f"Could not create index {options['name']} on {collection}: {e}")
+    ensure_job_indexes(db["AnalysisJobs"])
+    logger.info("Database indexes ensured")
+    return failed
@@ -0,0 +1,109 @@
+"""
+Compares an INT8 detector against its FP32 original on a folder of sample images.
+
+For every image the detections of both models are matched per class by IoU. The report lists
+how many FP32 boxes were found again, the mean IoU and confidence difference of the matches,
+and the CPU latency of both models.
+
+Usage:
+    python -m backend.scripts.evaluate_quantization backend/models/tissue.onnx path/to/images \
+        [--int8 backend/models/tissue.int8.onnx] [--min-iou 0.5]
+"""
+import os
+import time
+import numpy as np
+from PIL import Image
+from backend.scripts.onnx_interference import onnx_prediction, preprocess_image
+from backend.scripts.onnx_runtime import OnnxRuntimeManager, runtime_config_from_env
+from backend.scripts.script_utils import image_paths, script_parser
+
+def box_iou(box_a, box_b):
+    x_min, y_min = max(box_a[0], box_b[0]), max(box_a[1], box_b[1])
+    x_max, y_max = min(box_a[2], box_b[2]), min(box_a[3], box_b[3])
+    intersection = max(0.0, x_max - x_min) * max(0.0, y_max - y_min)
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+def match_detections(reference, candidate, min_iou):
+    """
+    Greedily matches the boxes of two class_bboxes dicts, highest IoU first.
+
+    @return: List of (iou, confidence difference) per matched pair, and the number of reference boxes.
+    """
+    matches = []
+    total = 0
+    for class_id, reference_boxes in reference.items():
+        total += len(reference_boxes)
+        candidate_boxes = candidate.get(class_id, [])
+        pairs = sorted(
+            ((box_iou(ref_box, cand_box), i, j)
+             for i, (ref_box, _) in enumerate(reference_boxes)
+             for j, (cand_box, _) in enumerate(candidate_boxes)),
+            reverse=True
+        )
+        used_reference, used_candidate = set(), set()
+        for iou, i, j in pairs:
+            if iou < min_iou:
+                break
+            if i in used_reference or j in used_candidate:
+                continue
+            used_reference.add(i)
+            used_candidate.add(j)
+            matches.append((iou, float(candidate_boxes[j][1]) - float(reference_boxes[i][1])))
+    return matches, total
+
+def timed_prediction(image, image_bchw, session):
+    start = time.perf_counter()
+    result = onnx_prediction(image, session, image_bchw)
+    return result, time.perf_counter() - start
+
+def latency_summary(latencies):
+    latencies = np.array(latencies) * 1000
+    p50, p95 = np.percentile(latencies, [50, 95])
+    return f"p50 {p50:7.1f} ms, p95 {p95:7.1f} ms"
+
+if __name__ == "__main__":
+    parser = script_parser(__doc__)
+    parser.add_argument("fp32")
+    parser.add_argument("images")
+    parser.add_argument("--int8", help="defaults to <fp32 name>.int8.onnx")
+    parser.add_argument("--min-iou", type=float, default=0.5)
+    args = parser.parse_args()
+    int8 = args.int8 or f"{os.path.splitext(args.fp32)[0]}.int8.onnx"
+
+    # Latency is compared on CPU, the deployment target of the quantized models
+    config = runtime_config_from_env()
+    config["providers"] = ["CPUExecutionProvider"]
+    manager = OnnxRuntimeManager(config)
+    fp32_session = manager.load("fp32", args.fp32)
+    int8_session = manager.load("int8", int8)
+
+    matches, total = [], 0
+    fp32_latencies, int8_latencies = [], []
+    paths = image_paths(args.images)
+    for path in paths:
+        image = np.array(Image.open(path).convert("RGB"))
+        image_bchw = preprocess_image(image)
+        reference, fp32_latency = timed_prediction(image, image_bchw, fp32_session)
+        candidate, int8_latency = timed_prediction(image, image_bchw, int8_session)
+        fp32_latencies.append(fp32_latency)
+        int8_latencies.append(int8_latency)
+
+        image_matches, image_total = match_detections(reference, candidate, args.min_iou)
+        matches.extend(image_matches)
+        total += image_total
+        print(f"{path}: {len(image_matches)}/{image_total} FP32 boxes matched")
+
+    ious = np.array([iou for iou, _ in matches])
+    confidence_deltas = np.array([delta for _, delta in matches])
+    print(f"\nImages: {len(paths)}, FP32 boxes: {total}, matched at IoU >= {args.min_iou}: "
+          f"{len(matches)} ({len(matches) / max(total, 1):.1%})")
+    if len(matches):
+        print(f"Mean IoU of matches: {ious.mean():.4f} (min {ious.min():.4f})")
+        print(f"Confidence INT8 - FP32: mean {confidence_deltas.mean():+.4f}, "
+              f"mean abs {np.abs(confidence_deltas).mean():.4f}")
+    print(f"FP32 latency: {latency_summary(fp32_latencies)}")
+    print(f"INT8 latency: {latency_summary(int8_latencies)}  "
+          f"(speedup {np.median(fp32_latencies) / np.median(int8_latencies):.2f}x at p50)")
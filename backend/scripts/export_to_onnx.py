@@ -1,9 +1,38 @@
-from super_gradients.common.object_names import Models
+"""
+Exports a YOLO-NAS checkpoint to ONNX and optionally writes an INT8 variant next to it.
+
+Usage:
+    python -m backend.scripts.export_to_onnx --checkpoint backend/models/capsules.pth \
+        --output backend/models/capsules.onnx [--batch-size 4] \
+        [--quantization int8-dynamic | int8-static --calibration-images path/to/images]
+
+--batch-size fixes the batch dimension of the exported graph (the NMS post-processing does
+not support a dynamic one). The backend pads partial batches, so a model exported with
+--batch-size DETECTION_BATCH_SIZE lets batch uploads and the micro-batcher run several
+images per session call; the default of 1 predicts images one at a time.
+
+INT8 variants are written as <name>.int8.onnx, which is where the backend looks for them
+when DETECTOR_PRECISION=int8.
+"""
+import os
+from collections import defaultdict, deque
+import numpy as np
+import onnxruntime
+from PIL import Image
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+from onnxruntime.quantization.shape_inference import quant_pre_process
 from super_gradients.training import models
 from super_gradients.conversion import DetectionOutputFormatMode
-from super_gradients.conversion.conversion_enums import ExportQuantizationMode
 from super_gradients.conversion import ExportTargetBackend
-import os
+from backend.scripts.onnx_interference import preprocess_image
+from backend.scripts.script_utils import image_paths, script_parser
+
+# Static quantization converts only these ops; post-processing (box decoding, TopK, Gather,
+# NonMaxSuppression) stays FP32
+QUANTIZED_OP_TYPES = ["Conv", "MatMul"]
+# Node name parts of the YOLO-NAS box regression branch (regression convs, prediction conv and
+# the DFL projection); these and everything computed from them stay FP32 as well
+BOX_REGRESSION_NODE_PATTERNS = ("reg_convs", "reg_pred", "proj_conv")
 
 def load_yolo_model(model_type, num_classes, checkpoint_path):
     model = models.get(
@@ -13,16 +42,131 @@ def load_yolo_model(model_type, num_classes, checkpoint_path):
     )
     return model
 
-model = load_yolo_model("yolo_nas_l", 2, os.path.abspath("models/capsules.pth"))
+def export_fp32(model, output_path, batch_size=1):
+    return model.export(
+        output_path,
+        batch_size = batch_size,
+        confidence_threshold = 0.5,
+        nms_threshold = 0.5,
+        num_pre_nms_predictions = 100,
+        max_predictions_per_image = 100,
+        output_predictions_format = DetectionOutputFormatMode.FLAT_FORMAT,
+        #engine=ExportTargetBackend.TENSORRT
+    )
+
+def int8_path(onnx_path):
+    """Returns the path of the INT8 variant of an ONNX model, e.g. capsules.onnx -> capsules.int8.onnx."""
+    root, extension = os.path.splitext(onnx_path)
+    return f"{root}.int8{extension}"
+
+class ImageFolderCalibrationReader(CalibrationDataReader):
+    """
+    Feeds preprocessed sample images to the static quantizer to calibrate activation ranges,
+    batch_size images per input to match the model's fixed batch dimension.
+    """
+
+    def __init__(self, input_name, image_dir, max_images, batch_size=1):
+        tensors = [
+            preprocess_image(np.array(Image.open(path).convert("RGB"))) for path in image_paths(image_dir, max_images)
+        ]
+        batches = []
+        for offset in range(0, len(tensors), batch_size):
+            chunk = tensors[offset:offset + batch_size]
+            # The last batch is filled up with its first images
+            chunk += [chunk[i % len(chunk)] for i in range(batch_size - len(chunk))]
+            batches.append({input_name: np.concatenate(chunk)})
+        self.tensors = iter(batches)
+
+    def get_next(self):
+        return next(self.tensors, None)
+
+def fp32_nodes(model_path):
+    """
+    Names the nodes static quantization must leave in FP32: the box regression branch, the
+    NonMaxSuppression node, and every node downstream of either. Box coordinates lose the most
+    accuracy under INT8, and the post-processing gains nothing from it.
+
+    @param model_path: Path of the (preprocessed) ONNX model.
+    @return: Sorted list of node names.
+    """
+    import onnx
+    graph = onnx.load(model_path).graph
+    consumers = defaultdict(list)
+    for node in graph.node:
+        for name in node.input:
+            consumers[name].append(node)
+
+    pending = deque(
+        node for node in graph.node
+        if node.op_type == "NonMaxSuppression" or any(part in node.name for part in BOX_REGRESSION_NODE_PATTERNS)
+    )
+    excluded = set()
+    while pending:
+        node = pending.popleft()
+        if node.name in excluded:
+            continue
+        excluded.add(node.name)
+        for output in node.output:
+            pending.extend(consumers[output])
+    return sorted(excluded)
+
+def quantize_int8(fp32_path, mode, calibration_images=None, max_calibration_images=100):
+    """
+    Writes an INT8 variant of an exported model.
+
+    @param fp32_path: Path of the FP32 ONNX model.
+    @param mode: "int8-dynamic" (weights only, no calibration) or "int8-static" (weights and activations).
+    @param calibration_images: Folder of sample images, required for int8-static.
+    @param max_calibration_images: Upper bound on the number of calibration images.
+    @return: Path of the INT8 model.
+    """
+    output_path = int8_path(fp32_path)
+    if mode == "int8-dynamic":
+        quantize_dynamic(fp32_path, output_path, weight_type=QuantType.QUInt8)
+    elif mode == "int8-static":
+        if not calibration_images:
+            raise ValueError("int8-static quantization needs --calibration-images")
+        model_input = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0]
+        batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else 1
+        # Shape inference and graph cleanup give the quantizer more ops it can convert
+        preprocessed_path = f"{os.path.splitext(fp32_path)[0]}.preprocessed.onnx"
+        quant_pre_process(fp32_path, preprocessed_path)
+        # Only the backbone, neck and classification branch are quantized
+        excluded_nodes = fp32_nodes(preprocessed_path)
+        print(f"Keeping {len(excluded_nodes)} box regression and post-processing nodes in FP32")
+        quantize_static(
+            preprocessed_path,
+            output_path,
+            ImageFolderCalibrationReader(model_input.name, calibration_images, max_calibration_images, batch_size),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            op_types_to_quantize=QUANTIZED_OP_TYPES,
+            nodes_to_exclude=excluded_nodes
+        )
+        os.remove(preprocessed_path)
+    else:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+    return output_path
 
-export_result = model.export(
-    "capsules.onnx",
-    confidence_threshold = 0.5,
-    nms_threshold = 0.5,
-    num_pre_nms_predictions = 100,
-    max_predictions_per_image = 100,
-    output_predictions_format = DetectionOutputFormatMode.FLAT_FORMAT,
-    #engine=ExportTargetBackend.TENSORRT
-)
+if __name__ == "__main__":
+    parser = script_parser(__doc__)
+    parser.add_argument("--model-type", default="yolo_nas_l")
+    parser.add_argument("--num-classes", type=int, default=2)
+    parser.add_argument("--checkpoint", default="backend/models/capsules.pth")
+    parser.add_argument("--output", default="backend/models/capsules.onnx")
+    parser.add_argument("--batch-size", type=int, default=1, help="Fixed batch dimension of the exported model")
+    parser.add_argument("--quantization", choices=["none", "int8-dynamic", "int8-static"], default="none")
+    parser.add_argument("--calibration-images")
+    parser.add_argument("--max-calibration-images", type=int, default=100)
+    args = parser.parse_args()
 
+    model = load_yolo_model(args.model_type, args.num_classes, os.path.abspath(args.checkpoint))
+    export_result = export_fp32(model, args.output, args.batch_size)
+    print(f"Exported FP32 model with batch size {args.batch_size} to {args.output}")
 
+    if args.quantization != "none":
+        quantized_path = quantize_int8(args.output, args.quantization,
+                                       args.calibration_images, args.max_calibration_images)
+        print(f"Exported {args.quantization} model to {quantized_path}")
@@ -1,96 +1,133 @@
-import uuid
 import json
+import os
+import threading
 import cv2
 import numpy as np
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from common.grid_spec import GridSegmentsView, generate_grid_spec, grid_lines
 
 # Initialize logger
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+# Directory for debug dumps of every analysed image's grids, one file per image. Empty disables
+# the dumps; the grids are always persisted with the image's analysis results in MongoDB.
+GRID_DEBUG_DIR = os.getenv("GRID_DEBUG_DIR", "")
+
+_debug_executor = None
+_debug_executor_lock = threading.Lock()
+
 # Generate Grid Segments
 def generate_grid_segments(bounding_box, cm_to_pixels, grid_size_cm):
-    logger.info("Generating grid segments.")
-    logger.info(f"Bounding box: {bounding_box}, cm_to_pixels: {cm_to_pixels}, grid_size_cm: {grid_size_cm}")
-
-    x_min, y_min, x_max, y_max = bounding_box
-    cell_width = cm_to_pixels * grid_size_cm[0]
-    cell_height = cm_to_pixels * grid_size_cm[1]
-
-    horizontal_segments = []
-    vertical_segments = []
-
-    current_y = y_min
-    while current_y < y_max:
-        current_x = x_min
-        while current_x < x_max:
-            horizontal_segments.append({
-                "id": str(uuid.uuid4()),
-                "x_start": current_x,
-                "y_start": current_y,
-                "x_end": min(current_x + cell_width, x_max),
-                "y_end": current_y
-            })
-            vertical_segments.append({
-                "id": str(uuid.uuid4()),
-                "x_start": current_x,
-                "y_start": current_y,
-                "x_end": current_x,
-                "y_end": min(current_y + cell_height, y_max)
-            })
-            logger.info(f"Created horizontal segment: {horizontal_segments[-1]}")
-            logger.info(f"Created vertical segment: {vertical_segments[-1]}")
-            current_x += cell_width
-        current_y += cell_height
-
-    current_x = x_min
-    while current_x < x_max:
-        horizontal_segments.append({
-            "id": str(uuid.uuid4()),
-            "x_start": current_x,
-            "y_start": current_y,
-            "x_end": min(current_x + cell_width, x_max),
-            "y_end": current_y
-        })
-        logger.info(f"Created horizontal segment: {horizontal_segments[-1]}")
-        current_x += cell_width
-
-    current_y = y_min
-    while current_y < y_max:
-        vertical_segments.append({
-            "id": str(uuid.uuid4()),
-            "x_start": x_max,
-            "y_start": current_y,
-            "x_end": x_max,
-            "y_end": min(current_y + cell_height, y_max)
-        })
-        logger.info(f"Created vertical segment: {vertical_segments[-1]}")
-        current_y += cell_height
-
-    metadata = {
-        "bounding_box": bounding_box,
-        "cm_to_pixels": cm_to_pixels,
-        "grid_size_cm": grid_size_cm
+    """
+    Returns the grid over a bounding box as a lazily expanded view with the old
+    horizontal_segments/vertical_segments/metadata keys. The compact spec is on `.spec`.
+    """
+    spec = generate_grid_spec(bounding_box, cm_to_pixels, grid_size_cm)
+    logger.debug("Generated %dx%d grid for bounding box %s", spec["rows"], spec["cols"], bounding_box)
+    return GridSegmentsView(spec)
+
+# Tissue Coverage per Grid Cell
+def grid_cell_coverage(spec, mask):
+    """
+    Computes how much tissue every grid cell contains, using a summed-area table over the
+    grid's part of the mask, so the cost is one pass over those pixels plus O(1) per cell.
+
+    @param spec: Grid spec from generate_grid_spec.
+    @param mask: Binary tissue mask of the whole image, shape (H, W).
+    @return: Dict with the row-major per-cell "fraction" of tissue pixels, the tissue
+             "area_cm2" per cell and the "total_area_cm2" of the grid.
+    """
+    height, width = mask.shape[:2]
+    xs, ys, x_ends, y_ends = grid_lines(spec)
+    # Pixel index ranges [start, end) of every column and row, clipped to the image
+    col_start = np.clip(np.round(xs), 0, width).astype(np.intp)
+    col_end = np.clip(np.round(x_ends), 0, width).astype(np.intp)
+    row_start = np.clip(np.round(ys[:-1]), 0, height).astype(np.intp)
+    row_end = np.clip(np.round(y_ends), 0, height).astype(np.intp)
+    if len(col_start) == 0 or len(row_start) == 0:
+        return {"fraction": [], "area_cm2": [], "total_area_cm2": 0.0}
+
+    # Integral image of the grid's region only; cv2.integral pads a zero row and column
+    x_offset, y_offset = col_start.min(), row_start.min()
+    region = mask[y_offset:row_end.max(), x_offset:col_end.max()]
+    if region.size:
+        integral = cv2.integral((region > 0).astype(np.uint8))
+    else:
+        integral = np.zeros((region.shape[0] + 1, region.shape[1] + 1), dtype=np.int32)
+    x0, x1 = col_start - x_offset, col_end - x_offset
+    y0, y1 = (row_start - y_offset)[:, None], (row_end - y_offset)[:, None]
+    tissue_pixels = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+
+    cell_pixels = (y1 - y0) * (x1 - x0)
+    fraction = np.divide(tissue_pixels, cell_pixels, out=np.zeros(tissue_pixels.shape), where=cell_pixels > 0)
+    area_cm2 = tissue_pixels / float(spec["cm_to_pixels"]) ** 2
+    return {
+        "fraction": np.round(fraction, 3).ravel().tolist(),
+        "area_cm2": np.round(area_cm2, 4).ravel().tolist(),
+        "total_area_cm2": round(float(area_cm2.sum()), 4)
     }
-    logger.info("Grid segments generation complete.")
-    return {"horizontal_segments": horizontal_segments, "vertical_segments": vertical_segments, "metadata": metadata}
 
 # Save and Load Grid Segments
 def save_grid_segments(grid_segments, filepath="grid_segments.json"):
-    logger.info(f"Saving grid segments to {filepath}.")
+    logger.debug("Saving grid segments to %s.", filepath)
     try:
         with open(filepath, 'w') as f:
-            json.dump(grid_segments, f, indent=4)
-        logger.info(f"Grid segments successfully saved to {filepath}.")
+            # Views are stored as their compact spec
+            json.dump(getattr(grid_segments, "spec", grid_segments), f, indent=4)
+        logger.debug("Grid segments successfully saved to %s.", filepath)
     except Exception as e:
         logger.error(f"Failed to save grid segments to {filepath}: {str(e)}")
 
+def get_debug_executor():
+    """Returns the single background thread that writes grid debug dumps, created on first use."""
+    global _debug_executor
+    with _debug_executor_lock:
+        if _debug_executor is None:
+            _debug_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grid-debug")
+        return _debug_executor
+
+def dump_grids_async(image_key, grids, directory=GRID_DEBUG_DIR):
+    """
+    Writes the grids of one image to <directory>/<image_key>.json in the background.
+    Does nothing unless a debug directory is configured.
+
+    @param image_key: Identifies the image, e.g. the content hash of the upload.
+    @param grids: The grids (specs or views) of the image's tissues.
+    @param directory: Target directory, defaults to GRID_DEBUG_DIR.
+    @return: A Future of the write, or None when dumps are disabled.
+    """
+    if not directory or image_key is None:
+        return None
+    grids = [getattr(grid, "spec", grid) for grid in grids]
+    return get_debug_executor().submit(_write_grid_dump, os.path.join(directory, f"{image_key}.json"), grids)
+
+def _write_grid_dump(filepath, grids):
+    try:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial dump
+        tmp_path = f"{filepath}.tmp"
+        save_grid_segments(grids, tmp_path)
+        os.replace(tmp_path, filepath)
+    except Exception as e:
+        logger.error(f"Failed to write grid debug dump {filepath}: {e}")
+
+def shutdown_grid_debug_writer():
+    """Waits for pending debug dumps and stops the writer thread."""
+    global _debug_executor
+    with _debug_executor_lock:
+        executor, _debug_executor = _debug_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
 def load_grid_segments(filepath="grid_segments.json"):
     logger.info(f"Loading grid segments from {filepath}.")
     try:
         with open(filepath, 'r') as f:
             grid_segments = json.load(f)
         logger.info("Grid segments loaded successfully.")
+        if "origin" in grid_segments:
+            return GridSegmentsView(grid_segments)
         return grid_segments
     except Exception as e:
         logger.error(f"Failed to load grid segments from {filepath}: {str(e)}")
@@ -0,0 +1,112 @@
+import io
+import logging
+import re
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from PIL import Image
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Bytes per chunk when streaming image files to clients
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class RangeNotSatisfiable(Exception):
+    """Raised for a Range header that does not overlap the file."""
+
+def parse_range(header, size):
+    """
+    Parses a single-range HTTP Range header.
+
+    @param header: Value of the Range header, or None.
+    @param size: Size of the file in bytes.
+    @return: Inclusive (start, end) byte positions, or None to send the whole file
+             (no header, or a form that is not supported, such as multiple ranges).
+    @raise RangeNotSatisfiable: If the range lies outside the file, which every range does for an empty file.
+    """
+    if not header:
+        return None
+    match = _RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        raise RangeNotSatisfiable(header)
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+def iter_file(fileobj, start, length, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yields `length` bytes of a file object from `start` on, in chunks, and closes it afterwards.
+
+    @param fileobj: Seekable binary file object, e.g. from a blob store's open().
+    """
+    try:
+        fileobj.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fileobj.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+def http_date(moment):
+    """Formats a naive UTC datetime for Last-Modified headers."""
+    return format_datetime(moment.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def is_not_modified(headers, etag, last_modified):
+    """
+    Evaluates If-None-Match and If-Modified-Since against an image's validators.
+
+    @param headers: The request headers.
+    @param etag: Quoted ETag of the image.
+    @param last_modified: Naive UTC datetime the image was stored at.
+    @return: True if the client's copy is current and 304 can be sent.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            # Dates with a "-0000" zone parse as naive; HTTP dates are UTC
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+def make_thumbnail(fileobj, max_size):
+    """
+    Renders a JPEG thumbnail that fits into max_size x max_size pixels.
+    JPEG files are decoded at reduced scale, so full resolution pixels are never materialised.
+
+    @param fileobj: Binary file object of the original image.
+    @param max_size: Longest side of the thumbnail in pixels.
+    @return: The JPEG bytes.
+    """
+    image = Image.open(fileobj)
+    image.draft("RGB", (max_size, max_size))
+    image = image.convert("RGB")
+    image.thumbnail((max_size, max_size))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
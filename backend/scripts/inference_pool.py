@@ -0,0 +1,68 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Number of worker threads running detection/segmentation. ONNX Runtime and torch release the
+# GIL while they compute, so threads run in parallel and share the already loaded models.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+# Maximum number of jobs waiting for or running in the pool before new ones are rejected
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "16"))
+
+class InferencePoolFull(Exception):
+    """Raised when the inference pool already holds INFERENCE_MAX_PENDING jobs."""
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+def get_inference_executor():
+    """
+    Returns the process wide inference executor, creating it on first use.
+
+    @return: ThreadPoolExecutor with INFERENCE_WORKERS threads.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            logger.info(f"Starting inference pool with {INFERENCE_WORKERS} workers")
+            _executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+        return _executor
+
+def pending_jobs():
+    """Returns the number of jobs currently queued or running in the inference pool."""
+    return _pending
+
+async def run_in_inference_pool(func, *args, **kwargs):
+    """
+    Runs a blocking function in the inference pool without blocking the event loop.
+
+    @param func: The blocking callable.
+    @return: The return value of func.
+    @raise InferencePoolFull: If INFERENCE_MAX_PENDING jobs are already queued or running.
+    """
+    global _pending
+    with _lock:
+        if _pending >= INFERENCE_MAX_PENDING:
+            raise InferencePoolFull(f"{_pending} inference jobs pending")
+        _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_inference_executor(), functools.partial(func, *args, **kwargs))
+    finally:
+        with _lock:
+            _pending -= 1
+
+def shutdown_inference_pool(wait=True):
+    """Stops the inference pool. Jobs already submitted are finished if wait is True."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        logger.info("Shutting down inference pool")
+        executor.shutdown(wait=wait)
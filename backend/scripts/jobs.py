@@ -0,0 +1,173 @@
+import logging
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+def ensure_job_indexes(jobs_collection):
+    """
+    Creates the index used by claim_next_job to find the oldest claimable job.
+
+    @param jobs_collection: The MongoDB collection holding analysis jobs.
+    """
+    jobs_collection.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+
+def enqueue_job(jobs_collection, image_id, case_id, requested_by=None):
+    """
+    Persists a new analysis job for an uploaded image.
+
+    @param jobs_collection: The MongoDB collection holding analysis jobs.
+    @param image_id: ID of the image document to analyse.
+    @param case_id: ID of the case the image belongs to.
+    @param requested_by: Username of the uploader, who may read the job's status.
+    @return: The ID of the new job as a string.
+    """
+    job_document = {
+        "image_id": str(image_id),
+        "case_id": str(case_id),
+        "requested_by": requested_by,
+        "status": JOB_PENDING,
+        "attempts": 0,
+        "created_at": datetime.utcnow(),
+        "claimed_at": None,
+        "claimed_by": None,
+        "finished_at": None,
+        "timings": {},
+        "error": None
+    }
+    result = jobs_collection.insert_one(job_document)
+    logger.info(f"Enqueued analysis job {result.inserted_id} for image {image_id}")
+    return str(result.inserted_id)
+
+def claim_next_job(jobs_collection, worker_id, lease_seconds, max_attempts):
+    """
+    Atomically claims the oldest pending job. Jobs that have been running for longer than
+    lease_seconds are considered abandoned by a crashed worker and can be claimed again,
+    until they have been claimed max_attempts times (see fail_exhausted_job).
+
+    @param jobs_collection: The MongoDB collection holding analysis jobs.
+    @param worker_id: Identifier of the claiming worker, stored on the job.
+    @param lease_seconds: How long a claimed job stays reserved for its worker.
+    @param max_attempts: How often a job is claimed before it is given up.
+    @return: The claimed job document, or None if there is nothing to do.
+    """
+    now = datetime.utcnow()
+    job = jobs_collection.find_one_and_update(
+        {"$or": [
+            {"status": JOB_PENDING, "attempts": {"$lt": max_attempts}},
+            {
+                "status": JOB_RUNNING,
+                "claimed_at": {"$lt": now - timedelta(seconds=lease_seconds)},
+                "attempts": {"$lt": max_attempts}
+            }
+        ]},
+        {
+            "$set": {"status": JOB_RUNNING, "claimed_at": now, "claimed_by": worker_id},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+    if job is not None:
+        logger.info(f"Worker {worker_id} claimed analysis job {job['_id']} (attempt {job['attempts']})")
+    return job
+
+def fail_exhausted_job(jobs_collection, lease_seconds, max_attempts):
+    """
+    Marks one job as failed whose lease expired on its last allowed attempt, so a job that
+    keeps crashing its worker is not claimed forever.
+
+    @return: The failed job document, or None if there is none.
+    """
+    now = datetime.utcnow()
+    job = jobs_collection.find_one_and_update(
+        {
+            "status": {"$in": [JOB_PENDING, JOB_RUNNING]},
+            "attempts": {"$gte": max_attempts},
+            "$or": [
+                {"status": JOB_PENDING},
+                {"claimed_at": {"$lt": now - timedelta(seconds=lease_seconds)}}
+            ]
+        },
+        {"$set": {
+            "status": JOB_FAILED,
+            "finished_at": now,
+            "error": f"Given up after {max_attempts} attempts"
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+    if job is not None:
+        logger.error(f"Analysis job {job['_id']} failed after {job['attempts']} attempts")
+    return job
+
+def _claimed_job(job_id, worker_id):
+    """Query matching a job only while it is running under the given worker's claim."""
+    return {"_id": ObjectId(job_id), "status": JOB_RUNNING, "claimed_by": worker_id}
+
+def _update_claimed_job(jobs_collection, job_id, worker_id, update):
+    result = jobs_collection.update_one(_claimed_job(job_id, worker_id), update)
+    if result.matched_count == 0:
+        logger.warning(f"Worker {worker_id} no longer holds analysis job {job_id}, not updating it")
+    return result.matched_count == 1
+
+def renew_lease(jobs_collection, job_id, worker_id):
+    """
+    Extends the lease of a running job by resetting its claim time, so it is not considered
+    abandoned while its worker is still processing it.
+
+    @return: True if the worker still held the job, False if it was claimed by another worker or finished.
+    """
+    return _update_claimed_job(jobs_collection, job_id, worker_id, {"$set": {"claimed_at": datetime.utcnow()}})
+
+def release_job(jobs_collection, job_id, worker_id):
+    """Puts a claimed job back into the queue without counting the attempt. Returns False if the claim was lost."""
+    return _update_claimed_job(
+        jobs_collection, job_id, worker_id,
+        {"$set": {"status": JOB_PENDING, "claimed_at": None, "claimed_by": None}, "$inc": {"attempts": -1}}
+    )
+
+def complete_job(jobs_collection, job_id, worker_id, timings):
+    """Marks a job as done and stores its stage timings (in seconds). Returns False if the claim was lost."""
+    return _update_claimed_job(
+        jobs_collection, job_id, worker_id,
+        {"$set": {"status": JOB_DONE, "finished_at": datetime.utcnow(), "timings": timings}}
+    )
+
+def fail_job(jobs_collection, job_id, worker_id, error, timings):
+    """Marks a job as failed and stores the error message. Returns False if the claim was lost."""
+    return _update_claimed_job(
+        jobs_collection, job_id, worker_id,
+        {"$set": {"status": JOB_FAILED, "finished_at": datetime.utcnow(), "timings": timings, "error": error}}
+    )
+
+def get_job(jobs_collection, job_id):
+    """
+    Looks up a job by its ID.
+
+    @return: The job document, or None if the ID is unknown or malformed.
+    """
+    if not ObjectId.is_valid(job_id):
+        return None
+    return jobs_collection.find_one({"_id": ObjectId(job_id)})
+
+def serialize_job(job):
+    """Converts a job document into a JSON serializable dict."""
+    return {
+        "job_id": str(job["_id"]),
+        "image_id": job["image_id"],
+        "case_id": job["case_id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"].isoformat(),
+        "claimed_at": job["claimed_at"].isoformat() if job["claimed_at"] else None,
+        "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None,
+        "timings": job["timings"],
+        "error": job["error"]
+    }
@@ -1,7 +1,26 @@
+import atexit
 import logging
+import os
+import queue
+import threading
+import time
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
 
-# Logging configuration
+# Root level and per-module overrides, e.g.
+# LOG_LEVELS="backend.scripts.grid=DEBUG,backend.scripts.onnx_interference=WARNING"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# Records beyond this many waiting for the writer thread are dropped instead of blocking the caller
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Dropped records are reported with a warning at most this often
+LOG_DROP_REPORT_SECONDS = float(os.getenv("LOG_DROP_REPORT_SECONDS", "60"))
+
+# Logging configuration. The console and file handlers are not attached to any logger here;
+# configure_logging() moves them behind a queue so request threads never wait for I/O.
 logging_config = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -16,23 +35,101 @@ logging_config = {
             "formatter": "default",
         },
         "file": {
-            "class": "logging.FileHandler",
-            "filename": "app.log",  # Logs will be saved in this file
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": LOG_FILE,  # Logs will be saved in this file
+            "maxBytes": LOG_MAX_BYTES,
+            "backupCount": LOG_BACKUP_COUNT,
             "formatter": "default",
         },
     },
     "root": {
         "handlers": ["console", "file"],
-        "level": "DEBUG",  # Changed from INFO to DEBUG
+        "level": LOG_LEVEL,
     },
     "loggers": {
         "watchfiles.main": {  # Suppress watchfiles logs
-            "handlers": ["console", "file"],
             "level": "WARNING",
-            "propagate": False,
         },
     },
 }
 
-dictConfig(logging_config)
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that drops records when the queue is full instead of blocking. Records are
+    prepared by the base class on the calling thread, so the message and exception text reflect
+    the state at the time of the log call. Dropped records are counted and reported with a
+    warning at most every report_interval seconds, once the queue has room again.
+
+    @param log_queue: The bounded queue read by the listener.
+    @param report_interval: Minimum seconds between two dropped-record warnings.
+    """
+
+    def __init__(self, log_queue, report_interval=LOG_DROP_REPORT_SECONDS):
+        super().__init__(log_queue)
+        self.report_interval = report_interval
+        self.dropped = 0
+        self._unreported = 0
+        self._last_report = 0.0
+        self._drop_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+                self._unreported += 1
+            return
+        self._report_dropped()
+
+    def _report_dropped(self):
+        with self._drop_lock:
+            now = time.monotonic()
+            if not self._unreported or now - self._last_report < self.report_interval:
+                return
+            count, self._unreported, self._last_report = self._unreported, 0, now
+        report = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            "Log queue full, dropped %d records (%d since start)", (count, self.dropped), None
+        )
+        try:
+            self.queue.put_nowait(self.prepare(report))
+        except queue.Full:
+            with self._drop_lock:
+                self._unreported += count
+
+def parse_log_levels(spec):
+    """Parses "module=LEVEL,module=LEVEL" into a dict."""
+    levels = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = entry.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+def configure_logging(config=logging_config, level_overrides=LOG_LEVELS):
+    """
+    Applies the logging configuration and routes all records through a bounded queue
+    to a listener thread that does the formatting and writing.
+
+    @param config: dictConfig style configuration.
+    @param level_overrides: Per-module levels, see LOG_LEVELS.
+    @return: The started QueueListener.
+    """
+    dictConfig(config)
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    for name, level in parse_log_levels(level_overrides).items():
+        logging.getLogger(name).setLevel(level)
+    return listener
+
+log_listener = configure_logging()
 logger = logging.getLogger()
@@ -0,0 +1,298 @@
+import copy
+import threading
+from types import SimpleNamespace
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+_MISSING = object()
+
+_TYPE_ALIASES = {
+    "string": str, "int": int, "long": int, "double": float, "bool": bool,
+    "object": dict, "array": list, "objectId": ObjectId, "binData": bytes, "null": type(None)
+}
+
+def _get(document, path):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _set(document, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+def _unset(document, path):
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(last, None)
+
+def _compare(value, op, operand):
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+        if op == "$lt":
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False
+
+def _equals(value, operand):
+    if isinstance(value, list) and not isinstance(operand, list):
+        return operand in value
+    if value is _MISSING:
+        return operand is None
+    return value == operand
+
+def _match_condition(value, condition):
+    if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+        return _equals(value, condition)
+    for op, operand in condition.items():
+        if op == "$eq" and not _equals(value, operand):
+            return False
+        if op == "$ne" and _equals(value, operand):
+            return False
+        if op == "$in" and not any(_equals(value, candidate) for candidate in operand):
+            return False
+        if op == "$nin" and any(_equals(value, candidate) for candidate in operand):
+            return False
+        if op in ("$gt", "$gte", "$lt", "$lte") and not _compare(value, op, operand):
+            return False
+        if op == "$exists" and (value is not _MISSING) != bool(operand):
+            return False
+        if op == "$type" and (value is _MISSING or not isinstance(value, _TYPE_ALIASES[operand])):
+            return False
+    return True
+
+def matches(document, query):
+    """Evaluates the subset of the MongoDB query language used by the application."""
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(document, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, sub) for sub in condition):
+                return False
+        elif not _match_condition(_get(document, key), condition):
+            return False
+    return True
+
+def _project(document, projection):
+    document = copy.deepcopy(document)
+    if not projection:
+        return document
+    fields = {key: bool(value) for key, value in projection.items()}
+    include_id = fields.pop("_id", True)
+    if any(fields.values()):
+        projected = {key: document[key] for key, keep in fields.items() if keep and key in document}
+    else:
+        projected = {key: value for key, value in document.items() if key not in fields}
+    if include_id and "_id" in document:
+        projected["_id"] = document["_id"]
+    else:
+        projected.pop("_id", None)
+    return projected
+
+def _sorted(documents, spec):
+    """Sorts by several fields with one stable sort per field, least significant first."""
+    documents = list(documents)
+    for field, direction in reversed(spec):
+        def key(document, field=field):
+            value = _get(document, field)
+            # Missing values sort first, like null in MongoDB
+            present = value is not _MISSING and value is not None
+            return (present, value if present else 0)
+        documents.sort(key=key, reverse=direction < 0)
+    return documents
+
+def _normalize_sort(key_or_list, direction=None):
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, 1 if direction is None else direction)]
+    return list(key_or_list)
+
+class InMemoryCursor:
+    """Result of InMemoryCollection.find, supporting sort, limit and iteration."""
+
+    def __init__(self, documents, projection):
+        self._documents = documents
+        self._projection = projection
+        self._sort = []
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        documents = self._documents
+        if self._sort:
+            documents = _sorted(documents, self._sort)
+        if self._limit:
+            documents = documents[:self._limit]
+        return (_project(document, self._projection) for document in documents)
+
+class InMemoryCollection:
+    """
+    Thread-safe in-memory stand-in for a pymongo collection, implementing the operations
+    and the query/update subset the application uses, including unique indexes.
+
+    @param name: Collection name.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._documents = {}
+        self._unique_indexes = []
+        self._lock = threading.RLock()
+
+    def create_index(self, keys, unique=False, name=None, **kwargs):
+        fields = tuple(key for key, _ in _normalize_sort(keys))
+        if unique and fields not in self._unique_indexes:
+            with self._lock:
+                self._unique_indexes.append(fields)
+        return name or "_".join(fields)
+
+    def _check_unique(self, document):
+        for fields in self._unique_indexes:
+            values = tuple(_get(document, field) for field in fields)
+            for other in self._documents.values():
+                if other["_id"] != document["_id"] and tuple(_get(other, field) for field in fields) == values:
+                    raise DuplicateKeyError(f"Duplicate key for {fields} in {self.name}: {values}")
+
+    def _find(self, query, sort=None):
+        documents = [document for document in self._documents.values() if matches(document, query)]
+        if sort:
+            documents = _sorted(documents, _normalize_sort(sort))
+        return documents
+
+    def insert_one(self, document):
+        with self._lock:
+            document.setdefault("_id", ObjectId())
+            stored = copy.deepcopy(document)
+            self._check_unique(stored)
+            self._documents[stored["_id"]] = stored
+        return SimpleNamespace(inserted_id=document["_id"], acknowledged=True)
+
+    def insert_many(self, documents):
+        return SimpleNamespace(inserted_ids=[self.insert_one(document).inserted_id for document in documents])
+
+    def find(self, query=None, projection=None, **kwargs):
+        with self._lock:
+            return InMemoryCursor(self._find(query), projection)
+
+    def find_one(self, query=None, projection=None, sort=None, **kwargs):
+        with self._lock:
+            documents = self._find(query, sort)
+            return _project(documents[0], projection) if documents else None
+
+    def count_documents(self, query):
+        with self._lock:
+            return len(self._find(query))
+
+    def _apply_update(self, document, update, inserting):
+        for op, fields in update.items():
+            for path, value in fields.items():
+                if op == "$set" or (op == "$setOnInsert" and inserting):
+                    _set(document, path, copy.deepcopy(value))
+                elif op == "$unset":
+                    _unset(document, path)
+                elif op == "$inc":
+                    current = _get(document, path)
+                    _set(document, path, (0 if current is _MISSING else current) + value)
+                elif op == "$push":
+                    current = _get(document, path)
+                    _set(document, path, ([] if current is _MISSING else current) + [copy.deepcopy(value)])
+
+    def _upsert_document(self, query, update):
+        document = {
+            key: value for key, value in query.items()
+            if not key.startswith("$") and not (isinstance(value, dict) and any(k.startswith("$") for k in value))
+        }
+        self._apply_update(document, update, inserting=True)
+        document.setdefault("_id", ObjectId())
+        return document
+
+    def find_one_and_update(self, query, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        with self._lock:
+            documents = self._find(query, sort)
+            if not documents:
+                if not upsert:
+                    return None
+                document = self._upsert_document(query, update)
+                self._check_unique(document)
+                self._documents[document["_id"]] = document
+                return _project(document, projection) if return_document == ReturnDocument.AFTER else None
+            document = documents[0]
+            before = copy.deepcopy(document)
+            updated = copy.deepcopy(document)
+            self._apply_update(updated, update, inserting=False)
+            self._check_unique(updated)
+            self._documents[updated["_id"]] = updated
+            return _project(updated if return_document == ReturnDocument.AFTER else before, projection)
+
+    def update_one(self, query, update, upsert=False, **kwargs):
+        with self._lock:
+            documents = self._find(query)
+            if not documents:
+                if not upsert:
+                    return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+                document = self._upsert_document(query, update)
+                self._check_unique(document)
+                self._documents[document["_id"]] = document
+                return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=document["_id"])
+            updated = copy.deepcopy(documents[0])
+            self._apply_update(updated, update, inserting=False)
+            self._check_unique(updated)
+            modified = updated != documents[0]
+            self._documents[updated["_id"]] = updated
+            return SimpleNamespace(matched_count=1, modified_count=int(modified), upserted_id=None)
+
+    def delete_one(self, query):
+        with self._lock:
+            documents = self._find(query)
+            if documents:
+                del self._documents[documents[0]["_id"]]
+            return SimpleNamespace(deleted_count=len(documents[:1]))
+
+class InMemoryDatabase:
+    """
+    Stand-in for a pymongo database whose collections live in process memory, for tests and
+    local runs without MongoDB (MONGO_URI=memory://). Collections are created on first access.
+
+    @param name: Database name.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = InMemoryCollection(name)
+            return self._collections[name]
+
+    def list_collection_names(self):
+        return list(self._collections)
@@ -0,0 +1,90 @@
+"""
+Converts analysis results stored as base64(zlib(JSON)) strings into the binary container of
+common.analysis_format. Every converted document is decoded again and compared with the
+original before it is written, and the write only applies if the stored value is unchanged,
+so the migration can run next to a live backend and be restarted at any time.
+
+Usage:
+    python -m backend.scripts.migrate_analysis_results [--mongo-uri mongodb://localhost:27017/]
+        [--collections Images AnalysisCache] [--batch-size 200] [--dry-run]
+"""
+import logging
+import numpy as np
+from bson import Binary
+from pymongo import MongoClient, UpdateOne
+from common.analysis_format import decompress_legacy_results, pack_analysis_results, unpack_analysis_results
+from backend.scripts.script_utils import script_parser
+
+logger = logging.getLogger(__name__)
+
+FIELD = "compressed_analysis_results"
+
+def same_entries(legacy, converted):
+    """Checks that the converted entries carry the same metadata and masks as the legacy ones."""
+    if len(legacy) != len(converted):
+        return False
+    for old, new in zip(legacy, converted):
+        if old["metadata"] != new["metadata"]:
+            return False
+        if "rle" in old:
+            rle = np.asarray(old["rle"], dtype=np.int64)
+            if not np.array_equal(rle[:len(rle) // 2 * 2], new["rle"]):
+                return False
+    return True
+
+def migrate_collection(collection, batch_size, dry_run):
+    """
+    Migrates the legacy results of one collection.
+
+    @return: Dict with the number of converted, failed and skipped documents and the stored sizes in bytes.
+    """
+    stats = {"converted": 0, "failed": 0, "skipped": 0, "bytes_before": 0, "bytes_after": 0}
+    pending = []
+
+    def flush():
+        if pending and not dry_run:
+            result = collection.bulk_write(pending, ordered=False)
+            # Documents changed since they were read are left for the next run
+            stats["skipped"] += len(pending) - result.modified_count
+            stats["converted"] -= len(pending) - result.modified_count
+        pending.clear()
+
+    cursor = collection.find({FIELD: {"$type": "string", "$ne": ""}}, {FIELD: 1}, batch_size=batch_size)
+    for document in cursor:
+        legacy_value = document[FIELD]
+        try:
+            entries = decompress_legacy_results(legacy_value)
+            binary = pack_analysis_results(entries)
+            if not same_entries(entries, unpack_analysis_results(binary)):
+                raise ValueError("round trip mismatch")
+        except Exception as e:
+            stats["failed"] += 1
+            logger.error(f"Cannot convert {collection.name} {document['_id']}: {e}")
+            continue
+
+        stats["converted"] += 1
+        stats["bytes_before"] += len(legacy_value)
+        stats["bytes_after"] += len(binary)
+        pending.append(UpdateOne({"_id": document["_id"], FIELD: legacy_value}, {"$set": {FIELD: Binary(binary)}}))
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+    return stats
+
+if __name__ == "__main__":
+    parser = script_parser(__doc__)
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--database", default="image_upload_db")
+    parser.add_argument("--collections", nargs="+", default=["Images", "AnalysisCache"])
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="Convert and verify, but do not write")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    db = MongoClient(args.mongo_uri)[args.database]
+    for name in args.collections:
+        stats = migrate_collection(db[name], args.batch_size, args.dry_run)
+        saved = 1 - stats["bytes_after"] / stats["bytes_before"] if stats["bytes_before"] else 0.0
+        print(f"{name}: {stats['converted']} converted, {stats['failed']} failed, {stats['skipped']} changed "
+              f"concurrently, {stats['bytes_before']} -> {stats['bytes_after']} bytes ({saved:.0%} smaller)"
+              f"{' (dry run)' if args.dry_run else ''}")
@@ -0,0 +1,148 @@
+import hashlib
+import importlib
+import logging
+import threading
+import time
+from backend.scripts.batch_scheduler import DetectionBatcher
+from backend.scripts.onnx_interference import supports_batching
+from backend.scripts.analysis_cache import hash_file
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+class ModelsNotReady(Exception):
+    """Raised when a model is requested before the registry has finished loading."""
+
+class ModelRegistry:
+    """
+    Loads the detectors and SAM2 once, optionally in a background thread, and gates access
+    until everything is ready. onnxruntime and sam2 (which pulls in torch) are imported by
+    the loader, so importing the application itself stays cheap.
+
+    @param models_dir: Directory holding the exported ONNX models.
+    @param detector_precision: "fp32" or "int8", see onnx_runtime.detector_model_path.
+    @param sam_checkpoint: Path of the SAM2 checkpoint.
+    @param sam_config: Name of the SAM2 model config.
+    @param detection_batch_size: Maximum batch size of the detection micro-batchers.
+    @param detection_max_wait_ms: Micro-batching wait, or None to call the sessions directly.
+    """
+
+    def __init__(self, models_dir, detector_precision, sam_checkpoint, sam_config,
+                 detection_batch_size, detection_max_wait_ms):
+        self.models_dir = models_dir
+        self.detector_precision = detector_precision
+        self.sam_checkpoint = sam_checkpoint
+        self.sam_config = sam_config
+        self.detection_batch_size = detection_batch_size
+        self.detection_max_wait_ms = detection_max_wait_ms
+
+        self.onnx_runtime = None
+        self.ort_session_capsule = None
+        self.ort_session_tissue = None
+        self.capsule_detector = None
+        self.tissue_detector = None
+        self.predictor = None
+        # Hash over all model files, changes whenever a model is replaced
+        self.fingerprint = None
+
+        self.timings = {}
+        self.error = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """Imports the inference libraries and loads all models. Blocks until done."""
+        started = time.perf_counter()
+        try:
+            self._timed("import_onnxruntime", importlib.import_module, "backend.scripts.onnx_runtime")
+            self._timed("import_sam2", importlib.import_module, "sam2.build_sam")
+            self._timed("import_sam2", importlib.import_module, "sam2.sam2_image_predictor")
+            from backend.scripts.onnx_runtime import OnnxRuntimeManager, detector_model_path
+            from sam2.build_sam import build_sam2
+            from sam2.sam2_image_predictor import SAM2ImagePredictor
+
+            capsules_path = detector_model_path(self.models_dir, "capsules", self.detector_precision)
+            tissue_path = detector_model_path(self.models_dir, "tissue", self.detector_precision)
+            self.fingerprint = self._timed(
+                "fingerprint", self._fingerprint, [capsules_path, tissue_path, self.sam_checkpoint]
+            )
+
+            self.onnx_runtime = OnnxRuntimeManager()
+            self.ort_session_capsule = self._timed("load_capsules", self.onnx_runtime.load, "capsules", capsules_path)
+            self.ort_session_tissue = self._timed("load_tissue", self.onnx_runtime.load, "tissue", tissue_path)
+            sam2 = self._timed(
+                "load_sam2", build_sam2, self.sam_config, self.sam_checkpoint, device='cpu', apply_postprocessing=False
+            )
+            self.predictor = SAM2ImagePredictor(sam2)
+
+            self.capsule_detector = self._detector(self.ort_session_capsule, "capsule")
+            self.tissue_detector = self._detector(self.ort_session_tissue, "tissue")
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Loading models failed: {e}")
+            raise
+        finally:
+            self.timings["total"] = time.perf_counter() - started
+
+        logger.info(f"Models ready, startup timings (s): {self.timings}")
+        self._ready.set()
+
+    def load_in_background(self):
+        """Starts load() in a daemon thread and returns immediately."""
+        self._thread = threading.Thread(target=self._load_quietly, name="model-loader", daemon=True)
+        self._thread.start()
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout=None):
+        """Blocks until the models are loaded. Returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    def require_ready(self):
+        """Raises ModelsNotReady unless all models are loaded."""
+        if not self._ready.is_set():
+            raise ModelsNotReady(self.error or "Models are still loading")
+
+    def status(self):
+        """Returns readiness, load error and the import/load time breakdown in seconds."""
+        return {"ready": self.is_ready(), "error": self.error, "timings": self.timings}
+
+    def close(self):
+        """Stops the detection micro-batchers."""
+        for detector in (self.capsule_detector, self.tissue_detector):
+            if isinstance(detector, DetectionBatcher):
+                detector.close()
+
+    def _detector(self, session, name):
+        """
+        Puts a DetectionBatcher in front of a session if micro-batching is enabled and the session
+        can run several images at once; otherwise requests would only queue behind one thread.
+        """
+        if self.detection_max_wait_ms is None:
+            return session
+        if not supports_batching(session):
+            logger.info(f"The {name} detector has a batch size of 1, micro-batching disabled for it")
+            return session
+        return DetectionBatcher(session, self.detection_batch_size, self.detection_max_wait_ms, name)
+
+    def _load_quietly(self):
+        try:
+            self.load()
+        except Exception:
+            # Already logged and kept in self.error for /ready
+            pass
+
+    @staticmethod
+    def _fingerprint(paths):
+        digest = hashlib.sha256()
+        for path in paths:
+            digest.update(hash_file(path).encode())
+        return digest.hexdigest()
+
+    def _timed(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
@@ -1,9 +1,7 @@
 import logging
 import cv2
 import numpy as np
-import onnxruntime
 import time
-from super_gradients.training.utils.media.image import load_image
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -16,6 +14,7 @@ def load_onnx_model(onnx_path):
     @return: ONNX inference session if loaded successfully, None otherwise.
     """
     logger.info(f"Loading ONNX model from path: {onnx_path}")
+    import onnxruntime
     try:
         session = onnxruntime.InferenceSession(
             onnx_path,
@@ -27,67 +26,168 @@ def load_onnx_model(onnx_path):
         logger.error(f"Failed to load ONNX model from {onnx_path}: {str(e)}")
         return None
 
-def onnx_prediction(image, session):
-    """
-    Predicts using the ONNX model and returns scaled bounding boxes with confidence scores grouped by class.
+# Input resolution of the exported YOLO-NAS detectors
+MODEL_INPUT_SIZE = 640
 
-    @param input_image_path: Path to the input image.
-    @param session: The ONNX inference session for prediction.
-    @return: A dictionary where keys are class IDs and values are lists of tuples (bounding box, confidence score).
-    """
-    try:
-        #logger.info(f"Predicting Image: {input_image_path}")
-        class_bboxes = {}
-
-        # Load the original image
-        #image = load_image(input_image_path)
-        original_height, original_width = image.shape[:2]
+# Input/output names per session, looked up once instead of on every prediction.
+# Keyed by id(); the session is kept in the value so the id cannot be reused.
+_session_io = {}
 
-        # Resize image to 640x640 for the model
-        resized_image = cv2.resize(image, (640, 640))
-        image_bchw = np.transpose(np.expand_dims(resized_image, 0), (0, 3, 1, 2))
+def get_session_io(session):
+    """
+    Returns the cached input and output names of a session.
 
+    @param session: The ONNX inference session.
+    @return: Tuple (input_names, output_names).
+    """
+    cached = _session_io.get(id(session))
+    if cached is None:
         inputs = [o.name for o in session.get_inputs()]
         outputs = [o.name for o in session.get_outputs()]
+        cached = _session_io[id(session)] = (session, inputs, outputs)
+    return cached[1], cached[2]
 
-        start = time.perf_counter()
-        result = session.run(outputs, {inputs[0]: image_bchw})
-        end = time.perf_counter()
-        logger.info(f"Prediction time: {end-start} ms")
+def preprocess_image(image):
+    """
+    Converts an image into the detector input tensor. The capsule and tissue detectors
+    take the same input, so the tensor can be computed once and passed to both.
 
-        flat_predictions = result[0]
+    @param image: The image as a NumPy array (HWC).
+    @return: Tensor of shape (1, C, 640, 640).
+    """
+    resized_image = cv2.resize(image, (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))
+    return np.transpose(np.expand_dims(resized_image, 0), (0, 3, 1, 2))
 
-        # Scaling factors
-        scale_x = original_width / 640
-        scale_y = original_height / 640
+def postprocess_predictions(flat_predictions, original_shape):
+    """
+    Scales flat-format detections back to the original image size and groups them by class.
 
-        # Post-process predictions and scale bbox coordinates
-        for _, x_min, y_min, x_max, y_max, confidence, class_id in flat_predictions:
-            class_id = int(class_id)
-            logger.info(f"Detected object with class_id={class_id}, confidence={confidence}, "
-                        f"x_min={x_min}, y_min={y_min}, x_max={x_max}, y_max={y_max}")
+    @param flat_predictions: Rows of (batch_index, x_min, y_min, x_max, y_max, confidence, class_id).
+    @param original_shape: Shape of the original image.
+    @return: A dictionary where keys are class IDs (in order of first detection) and values are
+             lists of tuples (bounding box, confidence score).
+    """
+    class_bboxes = {}
+    if len(flat_predictions) == 0:
+        return class_bboxes
+    original_height, original_width = original_shape[:2]
 
-            # Scale the coordinates back to the original image size
-            x_min_scaled = x_min * scale_x
-            y_min_scaled = y_min * scale_y
-            x_max_scaled = x_max * scale_x
-            y_max_scaled = y_max * scale_y
+    # Scaling factors
+    scale_x = original_width / MODEL_INPUT_SIZE
+    scale_y = original_height / MODEL_INPUT_SIZE
 
-            bbox = (x_min_scaled, y_min_scaled, x_max_scaled, y_max_scaled)
-            bbox_with_confidence = (bbox, confidence)
+    # Scale all boxes at once, in the dtype a per-value `coordinate * scale` would produce
+    dtype = type(flat_predictions.dtype.type(0) * scale_x)
+    scale = np.array([scale_x, scale_y, scale_x, scale_y], dtype=dtype)
+    bboxes = flat_predictions[:, 1:5].astype(dtype) * scale
+    confidences = flat_predictions[:, 5]
+    class_ids = flat_predictions[:, 6].astype(np.int64)
+    logger.debug("Detected %d objects", len(flat_predictions))
 
-            # Initialize the class in the dictionary if not already present
-            if class_id not in class_bboxes:
-                class_bboxes[class_id] = []
+    # Group by class, keeping the detection order within and across classes
+    unique_ids, first_index = np.unique(class_ids, return_index=True)
+    for class_id in unique_ids[np.argsort(first_index)]:
+        rows = np.flatnonzero(class_ids == class_id)
+        class_bboxes[int(class_id)] = list(zip(map(tuple, bboxes[rows]), confidences[rows]))
 
-            # Append the bounding box with confidence score to the corresponding class
-            class_bboxes[class_id].append(bbox_with_confidence)
+    return class_bboxes
 
-        return class_bboxes
+def onnx_prediction(image, session, image_bchw=None):
+    """
+    Predicts using the ONNX model and returns scaled bounding boxes with confidence scores grouped by class.
 
+    @param image: The image as a NumPy array.
+    @param session: The ONNX inference session for prediction.
+    @param image_bchw: Optional input tensor from preprocess_image(image), to avoid preprocessing twice.
+    @return: A dictionary where keys are class IDs and values are lists of tuples (bounding box, confidence score).
+    """
+    try:
+        if image_bchw is None:
+            image_bchw = preprocess_image(image)
+        # Sessions exported with a fixed batch size above 1 need the tensor padded to a full batch
+        return run_prediction_batch(session, [image_bchw], [image.shape])[0]
     except Exception as e:
+        # Empty results would pass for "nothing detected"; let the caller fail the upload
         logger.error(f"Error during prediction: {str(e)}")
-        return {}
+        raise
+
+def session_batch_size(session):
+    """Returns the fixed batch dimension of the session's first input, or None if it is dynamic."""
+    batch_dim = session.get_inputs()[0].shape[0]
+    return batch_dim if isinstance(batch_dim, int) and batch_dim > 0 else None
+
+def supports_batching(session):
+    """
+    Returns True if the session takes several images per run: its batch dimension is dynamic,
+    or fixed above 1 (see export_to_onnx --batch-size), in which case partial batches are padded.
+    """
+    batch_size = session_batch_size(session)
+    return batch_size is None or batch_size > 1
+
+def run_prediction_batch(session, tensors, shapes):
+    """
+    Runs one session call on a batch of preprocessed images.
+
+    @param session: The ONNX inference session for prediction.
+    @param tensors: List of (1, C, 640, 640) tensors from preprocess_image, at most the
+                    session's fixed batch size if it has one.
+    @param shapes: Shapes of the original images, in the same order.
+    @return: List with one class_bboxes dictionary (see onnx_prediction) per image.
+    """
+    inputs, outputs = get_session_io(session)
+    batch_bchw = np.concatenate(tensors)
+    fixed_batch_size = session_batch_size(session)
+    if fixed_batch_size is not None and len(tensors) < fixed_batch_size:
+        # Pad with blank images; their detections are dropped below
+        padding = np.zeros((fixed_batch_size - len(tensors),) + batch_bchw.shape[1:], dtype=batch_bchw.dtype)
+        batch_bchw = np.concatenate([batch_bchw, padding])
+
+    start = time.perf_counter()
+    flat_predictions = session.run(outputs, {inputs[0]: batch_bchw})[0]
+    end = time.perf_counter()
+    logger.debug("Batch prediction time for %d images: %.1f ms", len(tensors), (end - start) * 1000)
+
+    # The first column of the flat format is the index of the image within the batch
+    batch_indices = flat_predictions[:, 0].astype(np.int64)
+    return [
+        postprocess_predictions(flat_predictions[batch_indices == index], shape)
+        for index, shape in enumerate(shapes)
+    ]
+
+def onnx_prediction_batch(images, session, batch_size, tensors=None):
+    """
+    Predicts several images with as few session runs as possible by stacking their
+    input tensors into NCHW batches.
+
+    @param images: List of images as NumPy arrays. The images may have different sizes.
+    @param session: The ONNX inference session for prediction.
+    @param batch_size: Maximum number of images per session run.
+    @param tensors: Optional input tensors from preprocess_image, one per image.
+    @return: List with one class_bboxes dictionary (see onnx_prediction) per image.
+    """
+    if tensors is None:
+        tensors = [preprocess_image(image) for image in images]
+
+    if not supports_batching(session):
+        logger.debug("Session has a fixed batch size of 1, predicting images one at a time")
+        return [onnx_prediction(image, session, tensor) for image, tensor in zip(images, tensors)]
+
+    # A fixed batch dimension caps the chunk size; shorter chunks are padded by run_prediction_batch
+    fixed_batch_size = session_batch_size(session)
+    if fixed_batch_size is not None:
+        batch_size = min(batch_size, fixed_batch_size)
+
+    results = []
+    for offset in range(0, len(images), batch_size):
+        chunk = slice(offset, offset + batch_size)
+        shapes = [image.shape for image in images[chunk]]
+        try:
+            results.extend(run_prediction_batch(session, tensors[chunk], shapes))
+        except Exception as e:
+            # Empty results would pass for "nothing detected"; let the caller fail the upload
+            logger.error(f"Error during batch prediction of {len(shapes)} images: {str(e)}")
+            raise
+    return results
 
 def draw_bboxes(image_path, class_predictions, output_path, class_labels=None):
     """
@@ -99,6 +199,9 @@ def draw_bboxes(image_path, class_predictions, output_path, class_labels=None):
     @param class_labels: Optional dictionary with class IDs as keys and class names as values.
     @return: Image with drawn bounding boxes and labels.
     """
+    # super_gradients is only needed here, importing it at module level slows down backend startup
+    from super_gradients.training.utils.media.image import load_image
+
     # Load the original image
     image = load_image(image_path)
 
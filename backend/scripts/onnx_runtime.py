@@ -0,0 +1,216 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+import numpy as np
+import onnxruntime
+from backend.scripts.onnx_interference import MODEL_INPUT_SIZE
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Number of recent runs per model the latency percentiles are computed over
+LATENCY_WINDOW = 1000
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    "sequential": onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+# ONNX tensor element types of the detector inputs
+INPUT_DTYPES = {
+    "tensor(uint8)": np.uint8,
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+}
+
+def runtime_config_from_env():
+    """
+    Reads the ONNX Runtime configuration from the environment.
+
+    ORT_INTRA_OP_THREADS / ORT_INTER_OP_THREADS: thread pool sizes (0 lets ORT decide).
+    ORT_GRAPH_OPTIMIZATION: disable, basic, extended or all.
+    ORT_EXECUTION_MODE: sequential or parallel.
+    ORT_CPU_MEM_ARENA / ORT_MEM_PATTERN: 1 or 0.
+    ORT_PROVIDERS: comma separated execution providers, in order of preference.
+    ORT_WARMUP_RUNS: inferences run on a dummy input when a model is loaded.
+
+    @return: Dict with the configuration.
+    """
+    return {
+        "intra_op_threads": int(os.getenv("ORT_INTRA_OP_THREADS", "0")),
+        "inter_op_threads": int(os.getenv("ORT_INTER_OP_THREADS", "0")),
+        "graph_optimization": os.getenv("ORT_GRAPH_OPTIMIZATION", "all"),
+        "execution_mode": os.getenv("ORT_EXECUTION_MODE", "sequential"),
+        "cpu_mem_arena": os.getenv("ORT_CPU_MEM_ARENA", "1") == "1",
+        "mem_pattern": os.getenv("ORT_MEM_PATTERN", "1") == "1",
+        "providers": os.getenv("ORT_PROVIDERS", "CUDAExecutionProvider,CPUExecutionProvider").split(","),
+        "warmup_runs": int(os.getenv("ORT_WARMUP_RUNS", "2")),
+    }
+
+def build_session_options(config, enable_profiling=False, profile_prefix=None):
+    """
+    Builds SessionOptions from a runtime configuration.
+
+    @param config: Dict as returned by runtime_config_from_env.
+    @param enable_profiling: Whether ORT should write a profile of every run.
+    @param profile_prefix: Path prefix of the profile file.
+    @return: onnxruntime.SessionOptions
+    """
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = config["intra_op_threads"]
+    options.inter_op_num_threads = config["inter_op_threads"]
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[config["graph_optimization"]]
+    options.execution_mode = EXECUTION_MODES[config["execution_mode"]]
+    options.enable_cpu_mem_arena = config["cpu_mem_arena"]
+    options.enable_mem_pattern = config["mem_pattern"]
+    if enable_profiling:
+        options.enable_profiling = True
+        if profile_prefix:
+            options.profile_file_prefix = profile_prefix
+    return options
+
+def dummy_input(session, batch_size=1):
+    """
+    Creates an all-zero input for the first input of a session. Dynamic dimensions
+    are filled with batch_size for the batch axis and MODEL_INPUT_SIZE otherwise.
+    """
+    model_input = session.get_inputs()[0]
+    shape = [
+        dim if isinstance(dim, int) else (batch_size if axis == 0 else MODEL_INPUT_SIZE)
+        for axis, dim in enumerate(model_input.shape)
+    ]
+    return model_input.name, np.zeros(shape, dtype=INPUT_DTYPES.get(model_input.type, np.float32))
+
+def detector_model_path(models_dir, name, precision):
+    """
+    Returns the path of a detector model in the requested precision.
+
+    @param models_dir: Directory holding the exported models.
+    @param name: Model name, e.g. "capsules".
+    @param precision: "fp32" for <name>.onnx or "int8" for <name>.int8.onnx (see export_to_onnx).
+    @return: Path of the model file. Falls back to FP32 if the INT8 variant has not been exported.
+    """
+    fp32_path = os.path.join(models_dir, f"{name}.onnx")
+    if precision == "fp32":
+        return fp32_path
+    if precision != "int8":
+        raise ValueError(f"Unknown detector precision: {precision}")
+    int8_path = os.path.join(models_dir, f"{name}.int8.onnx")
+    if not os.path.exists(int8_path):
+        logger.warning(f"{int8_path} not found, using FP32 model {fp32_path}")
+        return fp32_path
+    return int8_path
+
+class TimedSession:
+    """
+    Wraps an InferenceSession and records the latency of every run() call.
+    Everything else is forwarded to the wrapped session.
+    """
+
+    def __init__(self, session, name):
+        self.session = session
+        self.name = name
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def run(self, output_names, input_feed, run_options=None):
+        start = time.perf_counter()
+        try:
+            return self.session.run(output_names, input_feed, run_options)
+        finally:
+            with self._lock:
+                self._latencies.append(time.perf_counter() - start)
+
+    def latency_stats(self):
+        """Returns run count and latency percentiles in milliseconds over the last LATENCY_WINDOW runs."""
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+        if len(latencies) == 0:
+            return {"runs": 0}
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        return {
+            "runs": len(latencies),
+            "p50": float(p50), "p90": float(p90), "p99": float(p99), "max": float(latencies.max())
+        }
+
+    def __getattr__(self, attribute):
+        return getattr(self.session, attribute)
+
+class OnnxRuntimeManager:
+    """
+    Builds ONNX sessions from a runtime configuration, warms them up and keeps per-model latency statistics.
+
+    @param config: Dict as returned by runtime_config_from_env. Read from the environment if None.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or runtime_config_from_env()
+        self.sessions = {}
+        self.paths = {}
+
+    def load(self, name, onnx_path):
+        """
+        Loads and warms up a model.
+
+        @param name: Name the model is registered under.
+        @param onnx_path: Path to the ONNX model file.
+        @return: The TimedSession wrapping the model.
+        """
+        logger.info(f"Loading ONNX model {name} from {onnx_path} with {self.config}")
+        start = time.perf_counter()
+        session = onnxruntime.InferenceSession(
+            onnx_path,
+            sess_options=build_session_options(self.config),
+            providers=self.config["providers"]
+        )
+        loaded = time.perf_counter()
+        self.warmup(session, self.config["warmup_runs"])
+        logger.info(f"ONNX model {name} loaded in {loaded - start:.2f} s, "
+                    f"warmed up in {time.perf_counter() - loaded:.2f} s")
+
+        timed_session = TimedSession(session, name)
+        self.sessions[name] = timed_session
+        self.paths[name] = onnx_path
+        return timed_session
+
+    def warmup(self, session, runs):
+        """Runs inference on a dummy input so allocations and kernel selection happen before the first request."""
+        input_name, tensor = dummy_input(session)
+        for _ in range(runs):
+            session.run(None, {input_name: tensor})
+
+    def profile(self, name, runs=10):
+        """
+        Profiles a model with ORT's built-in profiler. A separate profiling session is built so
+        the serving session is not slowed down.
+
+        @param name: Name of a loaded model.
+        @param runs: Number of inferences to profile.
+        @return: Path of the chrome-trace JSON file written by ONNX Runtime.
+        """
+        prefix = os.path.join(tempfile.gettempdir(), f"ort_profile_{name}")
+        session = onnxruntime.InferenceSession(
+            self.paths[name],
+            sess_options=build_session_options(self.config, enable_profiling=True, profile_prefix=prefix),
+            providers=self.config["providers"]
+        )
+        input_name, tensor = dummy_input(session)
+        for _ in range(runs):
+            session.run(None, {input_name: tensor})
+        profile_path = session.end_profiling()
+        logger.info(f"Wrote ONNX Runtime profile of {name} to {profile_path}")
+        return profile_path
+
+    def latency_stats(self):
+        """Returns latency statistics for all loaded models."""
+        return {name: session.latency_stats() for name, session in self.sessions.items()}
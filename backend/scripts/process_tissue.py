@@ -1,18 +1,25 @@
-from backend.scripts.onnx_interference import onnx_prediction, draw_bboxes
+from backend.scripts.onnx_interference import onnx_prediction, onnx_prediction_batch, preprocess_image, draw_bboxes
+from backend.scripts.batch_scheduler import DetectionBatcher
 import os
-import torch
+import threading
+import time
 #from sam2.build_sam import build_sam2
 import cv2
 from PIL import Image
 import numpy as np
-import supervision as sv
 #from sam2.sam2_image_predictor import SAM2ImagePredictor
-import matplotlib.pyplot as plt
 
 ########## TESTING REMOVE LATER ############
 
 ############################################
 
+# SAM2ImagePredictor keeps the embedding of the last set_image() call as state, so inference
+# workers sharing one predictor must not interleave set_image() and predict()
+predictor_lock = threading.Lock()
+
+# Boxes decoded per prompt-decoder call; bounds the full-resolution masks held at once
+SEGMENTATION_BOX_CHUNK = int(os.getenv("SEGMENTATION_BOX_CHUNK", "16"))
+
 def show_mask(mask, ax, random_color=False, borders = True):
     if random_color:
         color = np.concatenate([np.random.random(3), np.array([0.6])], axis=0)
@@ -29,6 +36,8 @@ def show_mask(mask, ax, random_color=False, borders = True):
     ax.imshow(mask_image)
 
 def show_masks(image, masks, scores, point_coords=None, box_coords=None, input_labels=None, borders=True):
+    # Plotting is for debugging only, keep matplotlib out of the backend import
+    import matplotlib.pyplot as plt
     for i, (mask, score) in enumerate(zip(masks, scores)):
         plt.figure(figsize=(10, 10))
         plt.imshow(image)
@@ -75,8 +84,34 @@ def get_highest_conf_bbox(results):
 
     return best_class, best_bbox, max_confidence
 
+def detect(image, detector, image_bchw=None):
+    """
+    Runs object detection on an image.
+
+    @param image: The image as a NumPy array.
+    @param detector: An ONNX inference session, or a DetectionBatcher in front of one.
+    @param image_bchw: Optional input tensor from preprocess_image(image).
+    @return: A dictionary where keys are class IDs and values are lists of tuples (bounding box, confidence score).
+    """
+    if isinstance(detector, DetectionBatcher):
+        return detector.predict(image, image_bchw)
+    return onnx_prediction(image, detector, image_bchw)
+
+def detect_batch(images, detector, batch_size, tensors=None):
+    """
+    Runs object detection on several images, see detect and onnx_prediction_batch.
+
+    @return: List with one class_bboxes dictionary per image.
+    """
+    if isinstance(detector, DetectionBatcher):
+        # The batcher forms the batches itself, possibly together with other callers' images
+        tensors = tensors or [None] * len(images)
+        futures = [detector.submit(image, image_bchw) for image, image_bchw in zip(images, tensors)]
+        return [future.result() for future in futures]
+    return onnx_prediction_batch(images, detector, batch_size, tensors)
+
 def process_capsule(predictor, ort_session, image):
-    result = onnx_prediction(image, ort_session)
+    result = detect(image, ort_session)
     best_class, best_bbox, max_confidence = get_highest_conf_bbox(result)
     best_bbox = np.array(best_bbox)
     masks, scores, logits = segment_bbox(predictor, image, best_bbox)
@@ -85,7 +120,7 @@ def process_capsule(predictor, ort_session, image):
     return _1cm
 
 def process_tissue(ort_session, image):
-    result = onnx_prediction(image, ort_session)
+    result = detect(image, ort_session)
     return result
 
 def segment_bbox(predictor, image, bbox):
@@ -93,6 +128,129 @@ def segment_bbox(predictor, image, bbox):
     masks, scores, logits = predictor.predict(box=bbox, multimask_output=True)
     return masks, scores, logits
 
+class SegmentationSession:
+    """
+    Embeds an image with the SAM2 encoder once and decodes any number of box prompts against it.
+
+    @param predictor: The SAM2ImagePredictor to use. The predictor keeps the embedding of the
+                      last image it has seen, so it must not be shared by two sessions at once.
+    @param image: The image as a NumPy array (HWC, RGB).
+    """
+
+    def __init__(self, predictor, image):
+        self.predictor = predictor
+        self.image_shape = image.shape[:2]
+        predictor.set_image(image)
+
+    def segment(self, bboxes, single_mask=False, chunk_size=SEGMENTATION_BOX_CHUNK):
+        """
+        Decodes the boxes in batched prompt-decoder calls of up to chunk_size boxes.
+
+        @param bboxes: Sequence of (x_min, y_min, x_max, y_max) boxes in image coordinates.
+        @param single_mask: If True SAM2 predicts one mask per box (multimask_output=False)
+                            instead of three candidates.
+        @param chunk_size: Maximum number of boxes per decoder call.
+        @return: Tuple (masks, scores, logits). With single_mask=False the arrays have shape
+                 (N, 3, H, W), (N, 3) and (N, 3, 256, 256); with single_mask=True the mask
+                 axis is dropped: (N, H, W), (N,) and (N, 256, 256).
+        """
+        boxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+        if len(boxes) == 0:
+            height, width = self.image_shape
+            masks_shape = (0, height, width) if single_mask else (0, 3, height, width)
+            scores_shape = (0,) if single_mask else (0, 3)
+            logits_shape = (0, 256, 256) if single_mask else (0, 3, 256, 256)
+            return np.zeros(masks_shape, dtype=bool), np.zeros(scores_shape, dtype=np.float32), \
+                np.zeros(logits_shape, dtype=np.float32)
+
+        chunks = [self._segment_chunk(boxes[start:start + chunk_size], single_mask)
+                  for start in range(0, len(boxes), max(1, chunk_size))]
+        if len(chunks) == 1:
+            return chunks[0]
+        return tuple(np.concatenate(parts) for parts in zip(*chunks))
+
+    def _segment_chunk(self, boxes, single_mask):
+        masks, scores, logits = self.predictor.predict(box=boxes, multimask_output=not single_mask)
+
+        # SAM2 drops the batch axis when only a single box was passed
+        if masks.ndim == 3:
+            masks, scores, logits = masks[None], scores[None], logits[None]
+
+        if single_mask:
+            # One mask per box: drop the mask axis
+            return masks[:, 0], scores[:, 0], logits[:, 0]
+        return masks, scores, logits
+
+def segment_detections(predictor, image, capsule_result, tissue_result):
+    """
+    Segments the best capsule box and all tissue boxes of an image against a single SAM2 image embedding.
+
+    @param predictor: The SAM2ImagePredictor used for segmentation.
+    @param image: The image as a NumPy array.
+    @param capsule_result: Capsule detections as returned by onnx_prediction.
+    @param tissue_result: Tissue detections as returned by onnx_prediction.
+    @return: Tuple (_1cm, tissues) where tissues is a list of (class_id, bbox, confidence, mask)
+             tuples holding the highest scoring mask of every tissue box.
+    """
+    best_class, best_bbox, max_confidence = get_highest_conf_bbox(capsule_result)
+    detections = [
+        (cls, tuple(map(float, bbox)), confidence)
+        for cls, bboxes in tissue_result.items()
+        for bbox, confidence in bboxes
+    ]
+    boxes = [best_bbox] + [bbox for _, bbox, _ in detections]
+
+    with predictor_lock:
+        session = SegmentationSession(predictor, image)
+        masks, scores, _ = session.segment(boxes, single_mask=True)
+
+    _1cm = calculate_pixels_per_cm(masks[0], best_class)
+    tissues = [
+        (cls, bbox, confidence, mask)
+        for (cls, bbox, confidence), mask in zip(detections, masks[1:])
+    ]
+    return _1cm, tissues
+
+def process_image(predictor, ort_session_capsule, ort_session_tissue, image, timings=None):
+    """
+    Runs capsule and tissue detection and segments the capsule box plus all tissue boxes
+    against a single SAM2 image embedding.
+
+    @param predictor: The SAM2ImagePredictor used for segmentation.
+    @param ort_session_capsule: ONNX session (or DetectionBatcher) of the capsule detector.
+    @param ort_session_tissue: ONNX session (or DetectionBatcher) of the tissue detector.
+    @param image: The image as a NumPy array.
+    @param timings: Optional dict that receives the "detection" and "segmentation" durations in seconds.
+    @return: Tuple (_1cm, tissues), see segment_detections.
+    """
+    start = time.perf_counter()
+    # Both detectors take the same input tensor
+    image_bchw = preprocess_image(image)
+    capsule_result = detect(image, ort_session_capsule, image_bchw)
+    tissue_result = detect(image, ort_session_tissue, image_bchw)
+    detected = time.perf_counter()
+
+    result = segment_detections(predictor, image, capsule_result, tissue_result)
+
+    if timings is not None:
+        timings["detection"] = detected - start
+        timings["segmentation"] = time.perf_counter() - detected
+    return result
+
+def process_images(predictor, ort_session_capsule, ort_session_tissue, images, batch_size):
+    """
+    Like process_image for several images, running each detector on batches of up to batch_size images.
+
+    @return: List with one (_1cm, tissues) tuple per image.
+    """
+    tensors = [preprocess_image(image) for image in images]
+    capsule_results = detect_batch(images, ort_session_capsule, batch_size, tensors)
+    tissue_results = detect_batch(images, ort_session_tissue, batch_size, tensors)
+    return [
+        segment_detections(predictor, image, capsule_result, tissue_result)
+        for image, capsule_result, tissue_result in zip(images, capsule_results, tissue_results)
+    ]
+
 if __name__ == "__main__":
     ort_session_capsule = load_onnx_model(os.path.join("models", "capsules.onnx"))
     ort_session_tissue = load_onnx_model(os.path.join("models", "tissue.onnx"))
@@ -0,0 +1,116 @@
+import logging
+from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+class UserRepository:
+    """
+    Async access to the Users collection.
+
+    @param collection: The pymongo (or memory_db) collection.
+    @param executor: DatabaseExecutor running the blocking calls.
+    """
+
+    def __init__(self, collection, executor):
+        self.collection = collection
+        self.executor = executor
+
+    async def find_by_username(self, username):
+        return await self.executor.run(self.collection.find_one, {"username": username})
+
+    async def find_by_email(self, email):
+        return await self.executor.run(self.collection.find_one, {"email": email})
+
+    async def insert(self, document):
+        """Inserts a user. Raises DuplicateKeyError if the username or email is taken."""
+        result = await self.executor.run(self.collection.insert_one, document)
+        return result.inserted_id
+
+class CaseRepository:
+    """
+    Async access to the Cases collection.
+
+    @param collection: The pymongo (or memory_db) collection.
+    @param executor: DatabaseExecutor running the blocking calls.
+    """
+
+    def __init__(self, collection, executor):
+        self.collection = collection
+        self.executor = executor
+
+    async def find_by_name(self, case_name):
+        return await self.executor.run(self.collection.find_one, {"caseName": case_name})
+
+    async def insert(self, document):
+        """Inserts a case. Raises DuplicateKeyError if the name is taken."""
+        result = await self.executor.run(self.collection.insert_one, document)
+        return result.inserted_id
+
+    async def get_or_create(self, case_name):
+        """Returns the case with the given name, creating it atomically if it does not exist."""
+        return await self.executor.run(self._upsert, case_name)
+
+    def _upsert(self, case_name):
+        try:
+            return self.collection.find_one_and_update(
+                {"caseName": case_name},
+                {"$setOnInsert": {"caseName": case_name, "createdAt": datetime.utcnow()}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Two concurrent upserts both missed; the unique index lets only one insert, read its case
+            return self.collection.find_one({"caseName": case_name})
+
+class ImageRepository:
+    """
+    Async access to the Images collection.
+
+    @param collection: The pymongo (or memory_db) collection.
+    @param executor: DatabaseExecutor running the blocking calls.
+    """
+
+    def __init__(self, collection, executor):
+        self.collection = collection
+        self.executor = executor
+
+    async def find_by_id(self, image_id, projection=None):
+        return await self.executor.run(self.collection.find_one, {"_id": image_id}, projection)
+
+    async def insert(self, document):
+        result = await self.executor.run(self.collection.insert_one, document)
+        return result.inserted_id
+
+    async def update(self, image_id, fields):
+        """Sets fields on an image document."""
+        await self.executor.run(self.collection.update_one, {"_id": image_id}, {"$set": fields})
+
+    async def references_blob(self, blob_ref):
+        """Returns True if an image or its thumbnail is stored in the given blob."""
+        query = {"$or": [{"blob.key": blob_ref["key"]}, {"thumbnail.blob.key": blob_ref["key"]}]}
+        return await self.executor.run(self.collection.find_one, query, {"_id": 1}) is not None
+
+    def cursor_for_case(self, case_id, after=None, limit=None, projection=None):
+        """
+        Returns a (blocking) cursor over the images of a case in _id order, served by the
+        (case_id, _id) index. Iterate it off the event loop.
+
+        @param case_id: The case's ID.
+        @param after: Only images with a larger _id (the pagination cursor).
+        @param limit: Maximum number of images, or None for all.
+        """
+        query = {"case_id": str(case_id)}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        cursor = self.collection.find(query, projection).sort("_id", 1)
+        return cursor.limit(limit) if limit else cursor
+
+    async def list_for_case(self, case_id, after=None, limit=None, projection=None, transform=None):
+        """Like cursor_for_case, reading all documents (each passed through transform) on the database threads."""
+        def read():
+            cursor = self.cursor_for_case(case_id, after, limit, projection)
+            return [transform(image) if transform else image for image in cursor]
+        return await self.executor.run(read)
@@ -0,0 +1,32 @@
+"""
+Helpers shared by the command line scripts in backend/scripts (benchmarks, checks, exports
+and migrations). The scripts are run as modules from the repository root, so that the
+backend and common packages are importable: python -m backend.scripts.<name> [options]
+"""
+import argparse
+import os
+import time
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+
+def script_parser(doc):
+    """Returns an argument parser showing the script's module docstring as its help text."""
+    return argparse.ArgumentParser(
+        description=doc,
+        epilog="Run from the repository root as python -m backend.scripts.<name>.",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+
+def image_paths(directory, limit=None):
+    """Returns the sorted paths of the image files in a directory, at most limit of them."""
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(IMAGE_EXTENSIONS))
+    return [os.path.join(directory, name) for name in names[:limit]]
+
+def best_of(repeats, func):
+    """Runs func repeats times and returns the fastest duration in seconds."""
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
@@ -0,0 +1,237 @@
+import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Deep Zoom (DZI) pyramid settings
+TILE_SIZE = int(os.getenv("TILE_SIZE", "256"))
+TILE_FORMAT = os.getenv("TILE_FORMAT", "jpeg")  # "jpeg" or "webp"
+TILE_QUALITY = int(os.getenv("TILE_QUALITY", "80"))
+TILE_CACHE_DIR = os.getenv("TILE_CACHE_DIR", "tile_cache")
+# Pyramids are evicted least recently used first once the cache exceeds this size
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+TILE_EXTENSIONS = {"jpeg": "jpg", "webp": "webp"}
+TILE_MEDIA_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+def max_level(width, height):
+    """Index of the full resolution level: level 0 is 1x1 pixel, each level doubles the size."""
+    return max(0, math.ceil(math.log2(max(width, height, 1))))
+
+def level_size(width, height, level):
+    """Size of a pyramid level in pixels."""
+    scale = 2 ** (max_level(width, height) - level)
+    return max(1, math.ceil(width / scale)), max(1, math.ceil(height / scale))
+
+def dzi_descriptor(width, height, tile_size=TILE_SIZE, tile_format=TILE_FORMAT):
+    """Returns the Deep Zoom descriptor (XML) of an image's pyramid."""
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{tile_size}" Overlap="0" '
+        f'Format="{TILE_EXTENSIONS[tile_format]}"><Size Width="{width}" Height="{height}"/></Image>'
+    )
+
+def build_pyramid(image, out_dir, tile_size=TILE_SIZE, tile_format=TILE_FORMAT, quality=TILE_QUALITY):
+    """
+    Cuts an image into the tiles of all pyramid levels, written to <out_dir>/<level>/<col>_<row>.<ext>.
+    Every level is produced from the one above it by 2x box downsampling, so the full
+    resolution image is only decoded once.
+
+    @param image: The PIL image.
+    @param out_dir: Target directory.
+    @return: Total size of the written tiles in bytes.
+    """
+    extension = TILE_EXTENSIONS[tile_format]
+    level_image = image.convert("RGB")
+    total = 0
+    for level in range(max_level(*image.size), -1, -1):
+        level_dir = os.path.join(out_dir, str(level))
+        os.makedirs(level_dir, exist_ok=True)
+        width, height = level_image.size
+        for row in range(math.ceil(height / tile_size)):
+            for col in range(math.ceil(width / tile_size)):
+                box = (col * tile_size, row * tile_size,
+                       min((col + 1) * tile_size, width), min((row + 1) * tile_size, height))
+                path = os.path.join(level_dir, f"{col}_{row}.{extension}")
+                level_image.crop(box).save(path, format=tile_format.upper(), quality=quality)
+                total += os.path.getsize(path)
+        if level > 0:
+            level_image = level_image.reduce(2)
+    return total
+
+class TileCache:
+    """
+    On-disk cache of DZI tile pyramids, one directory per image key (the content hash).
+    A pyramid is built completely on the first tile request (or ahead of time with prefetch)
+    into a temporary directory and moved into place, so partial pyramids are never served.
+    Whole pyramids are evicted least recently used first when the cache grows beyond max_bytes:
+    they are moved aside under the cache lock and deleted afterwards, so tiles opened by
+    read_tile stay readable and a rebuild of the same image never collides with the deletion.
+
+    @param root: Cache directory.
+    @param max_bytes: Size limit of the cache.
+    @param tile_size: Tile edge in pixels.
+    @param tile_format: "jpeg" or "webp".
+    """
+
+    def __init__(self, root=TILE_CACHE_DIR, max_bytes=TILE_CACHE_MAX_BYTES, tile_size=TILE_SIZE,
+                 tile_format=TILE_FORMAT):
+        if tile_format not in TILE_EXTENSIONS:
+            raise ValueError(f"Unknown tile format {tile_format!r}, expected one of {tuple(TILE_EXTENSIONS)}")
+        self.root = root
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self.tile_format = tile_format
+        self.extension = TILE_EXTENSIONS[tile_format]
+        self.media_type = TILE_MEDIA_TYPES[tile_format]
+
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self._prefetch_executor = None
+        self.hits = 0
+        self.builds = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        """Registers pyramids left by a previous run, oldest first."""
+        existing = []
+        for key in os.listdir(self.root):
+            path = os.path.join(self.root, key)
+            if key.startswith((".build-", ".evicted-")):
+                # Interrupted build or deletion
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            if not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+            existing.append((os.path.getmtime(path), key, size))
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+
+    def _pyramid_dir(self, key):
+        return os.path.join(self.root, f"{key}-{self.tile_size}-{self.extension}")
+
+    def ensure(self, key, open_source):
+        """
+        Builds the pyramid of an image unless it is cached. Blocking.
+
+        @param key: Cache key of the image, e.g. its content hash.
+        @param open_source: Callable returning a binary file object of the original image.
+        @return: The pyramid directory.
+        """
+        pyramid_dir = self._pyramid_dir(key)
+        name = os.path.basename(pyramid_dir)
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return pyramid_dir
+            build_lock = self._build_locks.setdefault(name, threading.Lock())
+
+        # One build per image; concurrent requests for the same image wait for it
+        with build_lock:
+            with self._lock:
+                if name in self._entries:
+                    self._entries.move_to_end(name)
+                    return pyramid_dir
+            tmp_dir = tempfile.mkdtemp(dir=self.root, prefix=".build-")
+            try:
+                with open_source() as f:
+                    size = build_pyramid(Image.open(f), tmp_dir, self.tile_size, self.tile_format)
+                os.replace(tmp_dir, pyramid_dir)
+            except BaseException:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            logger.info("Built tile pyramid %s (%.1f MiB)", name, size / 1024 ** 2)
+            with self._lock:
+                self._entries[name] = size
+                self.builds += 1
+                self._build_locks.pop(name, None)
+                evicted = self._evict(keep=name)
+            for path in evicted:
+                shutil.rmtree(path, ignore_errors=True)
+        return pyramid_dir
+
+    def _evict(self, keep):
+        """
+        Unregisters least recently used pyramids until the cache fits max_bytes and moves their
+        directories aside. Called with the lock held; the caller deletes the returned directories.
+
+        @return: Paths of the moved pyramid directories.
+        """
+        evicted = []
+        total = sum(self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            name, size = next(iter(self._entries.items()))
+            if name == keep:
+                break
+            del self._entries[name]
+            total -= size
+            self.evictions += 1
+            trash_dir = os.path.join(self.root, f".evicted-{uuid.uuid4().hex}")
+            try:
+                os.replace(os.path.join(self.root, name), trash_dir)
+                evicted.append(trash_dir)
+            except FileNotFoundError:
+                pass
+            logger.debug("Evicted tile pyramid %s", name)
+        return evicted
+
+    def read_tile(self, key, level, col, row, open_source):
+        """
+        Returns the content of a tile, building the image's pyramid first if needed. Blocking.
+        The tile is opened under the cache lock, while its pyramid cannot be evicted.
+
+        @return: The tile content, or None if the tile does not exist at that level.
+        """
+        name = os.path.basename(self._pyramid_dir(key))
+        while True:
+            path = os.path.join(self.ensure(key, open_source), str(level), f"{col}_{row}.{self.extension}")
+            with self._lock:
+                if name not in self._entries:
+                    # Evicted since ensure returned, build it again
+                    continue
+                try:
+                    f = open(path, "rb")
+                except FileNotFoundError:
+                    return None
+            with f:
+                return f.read()
+
+    def prefetch(self, key, open_source):
+        """Builds an image's pyramid in the background, e.g. right after ingest."""
+        with self._lock:
+            if self._prefetch_executor is None:
+                self._prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tiles")
+        future = self._prefetch_executor.submit(self.ensure, key, open_source)
+        future.add_done_callback(
+            lambda f: f.exception() and logger.error(f"Building tile pyramid {key} failed: {f.exception()}")
+        )
+        return future
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pyramids": len(self._entries),
+                "bytes": sum(self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "builds": self.builds,
+                "evictions": self.evictions
+            }
+
+    def close(self):
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(wait=False)
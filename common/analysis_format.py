@@ -0,0 +1,251 @@
+"""
+Binary container for the analysis results of an image, stored as BSON Binary in
+Images.compressed_analysis_results and in the analysis cache.
+
+Layout (all integers are unsigned LEB128 varints unless noted):
+
+    magic        4 bytes  b"EHAR"
+    version      1 byte   FORMAT_VERSION
+    flags        1 byte   FLAG_ZLIB: the rest of the container is zlib-compressed
+    count               number of entries (one per segmented tissue)
+    per entry:
+        mask type    1 byte   MASK_RLE or MASK_PACKBITS
+        metadata     length + UTF-8 JSON of the entry's metadata
+        mask         length + payload
+
+RLE payloads are the [start, length, ...] runs of common.mask_codec, delta encoded (every
+start is stored relative to the end of the previous run) and written as varints, so typical
+runs take two or three bytes instead of a JSON number plus separator. Packbits payloads are
+the raw np.packbits bytes.
+
+Results written before this container existed are base64(zlib(JSON)) strings; read_analysis_results
+and read_analysis_metadata accept both.
+"""
+import base64
+import json
+import zlib
+import numpy as np
+
+MAGIC = b"EHAR"
+FORMAT_VERSION = 1
+FLAG_ZLIB = 0x01
+
+MASK_RLE = 0
+MASK_PACKBITS = 1
+
+class AnalysisFormatError(ValueError):
+    """Raised when analysis results cannot be decoded."""
+
+def encode_varints(values):
+    """
+    Encodes non-negative integers as LEB128 varints without a Python loop over the values.
+
+    @param values: 1-D array-like of non-negative integers.
+    @return: The encoded bytes.
+    """
+    values = np.asarray(values, dtype=np.uint64).ravel()
+    if len(values) == 0:
+        return b""
+    # Bytes per value: one per started group of 7 bits, at least one
+    lengths = np.ones(len(values), dtype=np.int64)
+    remaining = values >> np.uint64(7)
+    while remaining.any():
+        lengths += remaining > 0
+        remaining >>= np.uint64(7)
+
+    offsets = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max())):
+        present = lengths > k
+        group = (values[present] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        continuation = np.where(lengths[present] > k + 1, 0x80, 0).astype(np.uint64)
+        out[offsets[present] + k] = (group | continuation).astype(np.uint8)
+    return out.tobytes()
+
+def decode_varints(data):
+    """
+    Decodes a buffer holding only LEB128 varints.
+
+    @param data: bytes-like object.
+    @return: uint64 array of the decoded values.
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if len(raw) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    last_bytes = np.flatnonzero((raw & 0x80) == 0)
+    if len(last_bytes) == 0 or last_bytes[-1] != len(raw) - 1:
+        raise AnalysisFormatError("Truncated varint")
+    starts = np.concatenate(([0], last_bytes[:-1] + 1))
+    # Position of every byte within its value, for the shift of its 7 bit group
+    position = np.arange(len(raw)) - np.repeat(starts, last_bytes - starts + 1)
+    groups = (raw & 0x7F).astype(np.uint64) << (np.uint64(7) * position.astype(np.uint64))
+    return np.bitwise_or.reduceat(groups, starts)
+
+def encode_rle_deltas(rle):
+    """Turns [start, length, ...] runs into [gap, length, ...] with gaps relative to the previous run's end."""
+    runs = np.asarray(rle, dtype=np.int64).reshape(-1, 2)
+    ends = runs[:, 0] + runs[:, 1]
+    deltas = runs.copy()
+    deltas[1:, 0] -= ends[:-1]
+    return deltas.ravel()
+
+def decode_rle_deltas(deltas):
+    """Inverse of encode_rle_deltas."""
+    deltas = np.asarray(deltas, dtype=np.int64).reshape(-1, 2)
+    # Each start is the sum of all previous gaps and lengths plus its own gap
+    starts = np.cumsum(deltas[:, 0]) + np.concatenate(([0], np.cumsum(deltas[:-1, 1])))
+    runs = np.empty_like(deltas)
+    runs[:, 0] = starts
+    runs[:, 1] = deltas[:, 1]
+    return runs.ravel()
+
+def _write_blob(parts, blob):
+    parts.append(encode_varints([len(blob)]))
+    parts.append(blob)
+
+def pack_analysis_results(entries, compress=True):
+    """
+    Serializes the per-tissue entries of an image into the binary container.
+
+    @param entries: Dicts as returned by common.mask_codec.encode_mask_with_metadata.
+    @param compress: Whether to zlib-compress the container body.
+    @return: The container bytes.
+    """
+    parts = [encode_varints([len(entries)])]
+    for entry in entries:
+        metadata = json.dumps(entry["metadata"], separators=(",", ":")).encode("utf-8")
+        if "packbits" in entry:
+            packed = entry["packbits"]
+            mask_type, payload = MASK_PACKBITS, packed if isinstance(packed, bytes) else base64.b64decode(packed)
+        else:
+            # Legacy encoders could leave an unpaired trailing start, which decodes to nothing
+            rle = np.asarray(entry["rle"], dtype=np.int64)
+            mask_type, payload = MASK_RLE, encode_varints(encode_rle_deltas(rle[:len(rle) // 2 * 2]))
+        parts.append(bytes([mask_type]))
+        _write_blob(parts, metadata)
+        _write_blob(parts, payload)
+
+    body = b"".join(parts)
+    flags = 0
+    if compress:
+        body, flags = zlib.compress(body), flags | FLAG_ZLIB
+    return MAGIC + bytes([FORMAT_VERSION, flags]) + body
+
+class _Reader:
+    """Sequential reader over a container body."""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def byte(self):
+        if self.offset >= len(self.data):
+            raise AnalysisFormatError("Unexpected end of analysis results")
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+
+    def varint(self):
+        value, shift = 0, 0
+        while True:
+            current = self.byte()
+            value |= (current & 0x7F) << shift
+            if not current & 0x80:
+                return value
+            shift += 7
+
+    def blob(self):
+        length = self.varint()
+        if self.offset + length > len(self.data):
+            raise AnalysisFormatError("Unexpected end of analysis results")
+        blob = self.data[self.offset:self.offset + length]
+        self.offset += length
+        return blob
+
+def _read_body(data):
+    """Checks the container header and returns a reader over the (decompressed) body."""
+    data = bytes(data)
+    if data[:4] != MAGIC:
+        raise AnalysisFormatError("Not a binary analysis result")
+    if len(data) < 6 or data[4] != FORMAT_VERSION:
+        raise AnalysisFormatError(f"Unsupported analysis format version {data[4] if len(data) > 4 else None}")
+    body = data[6:]
+    if data[5] & FLAG_ZLIB:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as error:
+            raise AnalysisFormatError(f"Corrupt analysis results: {error}") from error
+    return _Reader(body)
+
+def unpack_analysis_results(data):
+    """
+    Parses the binary container.
+
+    @param data: Container bytes, e.g. a bson.Binary read from MongoDB.
+    @return: List of {"rle": np.ndarray, "metadata": dict} or {"packbits": bytes, "metadata": dict}
+             entries, accepted by common.mask_codec.decode_mask_with_metadata.
+    """
+    reader = _read_body(data)
+    entries = []
+    for _ in range(reader.varint()):
+        mask_type = reader.byte()
+        metadata = json.loads(bytes(reader.blob()).decode("utf-8"))
+        payload = reader.blob()
+        if mask_type == MASK_RLE:
+            entries.append({"rle": decode_rle_deltas(decode_varints(payload)), "metadata": metadata})
+        elif mask_type == MASK_PACKBITS:
+            entries.append({"packbits": bytes(payload), "metadata": metadata})
+        else:
+            raise AnalysisFormatError(f"Unknown mask type {mask_type}")
+    return entries
+
+def unpack_analysis_metadata(data):
+    """
+    Parses only the metadata of every entry of the binary container; the mask payloads are
+    skipped without being decoded.
+
+    @param data: Container bytes.
+    @return: List of metadata dicts, one per entry.
+    """
+    reader = _read_body(data)
+    metadata = []
+    for _ in range(reader.varint()):
+        reader.byte()
+        metadata.append(json.loads(bytes(reader.blob()).decode("utf-8")))
+        reader.blob()
+    return metadata
+
+def decompress_legacy_results(compressed_data):
+    """Decodes results stored before the binary container: base64(zlib(JSON))."""
+    try:
+        return json.loads(zlib.decompress(base64.b64decode(compressed_data)).decode("utf-8"))
+    except zlib.error as error:
+        raise AnalysisFormatError(f"Corrupt analysis results: {error}") from error
+
+def is_binary_results(value):
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:4]) == MAGIC
+
+def read_analysis_results(value):
+    """
+    Decodes stored analysis results in either format.
+
+    @param value: The stored value: container bytes, a legacy string, or None/"" for no results.
+    @return: List of entries, see unpack_analysis_results.
+    """
+    if not value:
+        return []
+    if is_binary_results(value):
+        return unpack_analysis_results(value)
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("ascii")
+    return decompress_legacy_results(value)
+
+def read_analysis_metadata(value):
+    """
+    Decodes the metadata of stored analysis results in either format, see read_analysis_results.
+
+    @return: List of metadata dicts, one per entry.
+    """
+    if is_binary_results(value):
+        return unpack_analysis_metadata(value)
+    return [entry["metadata"] for entry in read_analysis_results(value)]
@@ -0,0 +1,110 @@
+"""
+Compact description of the measurement grid drawn over a tissue bounding box.
+
+A grid spec only stores the origin, cell size, row/column counts and the clip box. The
+individual line segments are derived from it on demand, with deterministic ids, in the
+same layout generate_grid_segments used to store verbatim:
+
+    horizontal segments: rows + 1 lines of `cols` segments, the last line below the last row
+    vertical segments:   `cols` segments per row, then one segment per row on the clip box's right edge
+
+Used by the backend (ingest) and the Flask frontend (rendering).
+"""
+from collections.abc import Mapping
+import numpy as np
+
+def generate_grid_spec(bounding_box, cm_to_pixels, grid_size_cm):
+    """
+    Builds the grid spec for a bounding box.
+
+    Args:
+        bounding_box (tuple): (x_min, y_min, x_max, y_max) in pixels.
+        cm_to_pixels (float): Pixels per centimetre.
+        grid_size_cm (tuple): Cell (width, height) in centimetres.
+
+    Returns:
+        dict: The grid spec.
+    """
+    x_min, y_min, x_max, y_max = (float(v) for v in bounding_box)
+    cell_width = float(cm_to_pixels * grid_size_cm[0])
+    cell_height = float(cm_to_pixels * grid_size_cm[1])
+    cols, rows = np.ceil(np.maximum(np.array([x_max - x_min, y_max - y_min]) / [cell_width, cell_height], 0))
+    return {
+        "origin": [x_min, y_min],
+        "cell_size": [cell_width, cell_height],
+        "rows": int(rows),
+        "cols": int(cols),
+        "clip_box": [x_min, y_min, x_max, y_max],
+        "cm_to_pixels": float(cm_to_pixels),
+        "grid_size_cm": list(grid_size_cm)
+    }
+
+def grid_lines(spec):
+    """
+    Returns the line positions of a grid spec as NumPy arrays.
+
+    Returns:
+        tuple: (xs, ys, x_ends, y_ends) where xs are the `cols` left cell edges, ys the
+        `rows + 1` top edges, and x_ends/y_ends the clipped right/bottom edges of each column/row.
+    """
+    x0, y0 = spec["origin"]
+    cell_width, cell_height = spec["cell_size"]
+    _, _, x_max, y_max = spec["clip_box"]
+    xs = x0 + np.arange(spec["cols"]) * cell_width
+    ys = y0 + np.arange(spec["rows"] + 1) * cell_height
+    x_ends = np.minimum(xs + cell_width, x_max)
+    y_ends = np.minimum(ys[:-1] + cell_height, y_max)
+    return xs, ys, x_ends, y_ends
+
+def expand_grid_segments(spec):
+    """
+    Expands a grid spec into the horizontal/vertical segment lists of the old storage format.
+
+    Returns:
+        dict: {"horizontal_segments": [...], "vertical_segments": [...], "metadata": {...}}
+    """
+    xs, ys, x_ends, y_ends = (a.tolist() for a in grid_lines(spec))
+    x_max = spec["clip_box"][2]
+    rows, cols = spec["rows"], spec["cols"]
+
+    horizontal_segments = [
+        {"id": f"h-{r}-{c}", "x_start": xs[c], "y_start": ys[r], "x_end": x_ends[c], "y_end": ys[r]}
+        for r in range(rows + 1) for c in range(cols)
+    ]
+    vertical_segments = [
+        {"id": f"v-{r}-{c}", "x_start": xs[c], "y_start": ys[r], "x_end": xs[c], "y_end": y_ends[r]}
+        for r in range(rows) for c in range(cols)
+    ] + [
+        {"id": f"v-{r}-{cols}", "x_start": x_max, "y_start": ys[r], "x_end": x_max, "y_end": y_ends[r]}
+        for r in range(rows)
+    ]
+    metadata = {
+        "bounding_box": spec["clip_box"],
+        "cm_to_pixels": spec["cm_to_pixels"],
+        "grid_size_cm": spec["grid_size_cm"]
+    }
+    return {"horizontal_segments": horizontal_segments, "vertical_segments": vertical_segments, "metadata": metadata}
+
+class GridSegmentsView(Mapping):
+    """
+    Read-only mapping with the keys of the old grid segments dict that expands the spec
+    only when a consumer actually reads the segments.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self._expanded = None
+
+    def to_dict(self):
+        if self._expanded is None:
+            self._expanded = expand_grid_segments(self.spec)
+        return self._expanded
+
+    def __getitem__(self, key):
+        return self.to_dict()[key]
+
+    def __iter__(self):
+        return iter(("horizontal_segments", "vertical_segments", "metadata"))
+
+    def __len__(self):
+        return 3
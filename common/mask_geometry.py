@@ -0,0 +1,106 @@
+"""
+Vector outlines of tissue masks, computed once by the backend when a mask is produced and
+stored in the mask's metadata, so viewers render stored geometry instead of decoding masks
+and tracing contours on every page view.
+
+A polygon is a flat list [x0, y0, x1, y1, ...] of integer pixel coordinates of one external
+contour, simplified with Douglas-Peucker (cv2.approxPolyDP). The polygons of a mask are the
+list of its contours.
+
+Every mask is stored at several levels of detail in metadata["polygon_lods"], coarsest
+first. Level i holds at most LOD_VERTEX_BUDGETS[i] vertices over all of the mask's polygons,
+so an overview can be drawn from a small fraction of the full geometry and the finer levels
+fetched only when zooming in. Results stored by earlier versions carry a single level in
+metadata["polygons"], or no geometry at all.
+"""
+import cv2
+import numpy as np
+from common.mask_codec import decode_mask_crop
+
+# Maximum distance in pixels between a simplified outline and the traced contour (finest level)
+DEFAULT_EPSILON = 1.5
+# Vertex budget per mask of each level of detail, coarsest first
+LOD_VERTEX_BUDGETS = (64, 256, 1024, 4096)
+# Doublings of the tolerance tried per level before the level keeps what it has
+_MAX_EPSILON_DOUBLINGS = 16
+
+def _trace(mask, offset):
+    contours, _ = cv2.findContours(
+        np.asarray(mask, dtype=np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=tuple(offset)
+    )
+    return contours
+
+def _simplify(contours, epsilon):
+    if epsilon <= 0:
+        return list(contours)
+    return [cv2.approxPolyDP(contour, epsilon, True) for contour in contours]
+
+def _to_lists(contours):
+    return [contour.reshape(-1).tolist() for contour in contours]
+
+def mask_to_polygons(mask, epsilon=DEFAULT_EPSILON, offset=(0, 0)):
+    """
+    Traces the external contours of a binary mask and simplifies them.
+
+    Args:
+        mask (np.ndarray): Binary mask.
+        epsilon (float): Douglas-Peucker tolerance in pixels; 0 keeps the traced contours.
+        offset (tuple): (x, y) added to all coordinates, for masks cropped out of an image.
+
+    Returns:
+        list: One flat [x0, y0, x1, y1, ...] list per contour.
+    """
+    return _to_lists(_simplify(_trace(mask, offset), epsilon))
+
+def mask_to_lods(mask, budgets=LOD_VERTEX_BUDGETS, epsilon=DEFAULT_EPSILON, offset=(0, 0)):
+    """
+    Builds the levels of detail of a mask's outline.
+
+    The contours are traced once. Starting from the finest level, each level doubles the
+    Douglas-Peucker tolerance of the level below it until its vertex budget is met; contours
+    that collapse to fewer than three vertices are dropped, and if the budget still cannot be
+    met the smallest contours go first.
+
+    Args:
+        mask (np.ndarray): Binary mask.
+        budgets (tuple): Vertex budget of each level, coarsest first.
+        epsilon (float): Tolerance of the finest level in pixels.
+        offset (tuple): (x, y) added to all coordinates, for masks cropped out of an image.
+
+    Returns:
+        list: One list of polygons per level, coarsest first.
+    """
+    contours = _trace(mask, offset)
+    levels = []
+    level_epsilon = max(epsilon, 0.5)
+    for budget in sorted(budgets, reverse=True):
+        for _ in range(_MAX_EPSILON_DOUBLINGS):
+            simplified = [c for c in _simplify(contours, level_epsilon) if len(c) >= 3]
+            if sum(len(c) for c in simplified) <= budget:
+                break
+            level_epsilon *= 2
+        # Largest contours first, then keep what fits
+        simplified.sort(key=cv2.contourArea, reverse=True)
+        kept, vertices = [], 0
+        for contour in simplified:
+            if vertices + len(contour) > budget and kept:
+                break
+            kept.append(contour)
+            vertices += len(contour)
+        levels.append(_to_lists(kept))
+    levels.reverse()
+    return levels
+
+def entry_lods(entry, shape):
+    """
+    Returns the levels of detail of one analysis entry ({"metadata": ..., "rle"/"packbits": ...}),
+    coarsest first. Entries stored before the levels existed have a single level; those stored
+    before any geometry was computed at ingest are decoded and traced here.
+    """
+    metadata = entry["metadata"]
+    if "polygon_lods" in metadata:
+        return metadata["polygon_lods"]
+    if "polygons" in metadata:
+        return [metadata["polygons"]]
+    mask, offset, _ = decode_mask_crop(entry, shape)
+    return [mask_to_polygons(mask, offset=offset)]
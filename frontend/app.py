@@ -1,5 +1,11 @@
+import os
+import sys
 from flask import Flask
 from flask_session import Session
+
+# Make the repository root importable for the modules shared with the backend (common/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from sites.login_site import login_site
 from sites.other_site import other_site
 from sites.admin_site import admin_site
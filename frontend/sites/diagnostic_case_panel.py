@@ -1,18 +1,28 @@
+import os
 import requests
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash
+from flask import Blueprint, current_app, render_template, stream_template, request, session, url_for, flash, Response, stream_with_context
 import base64
-import zlib
+import itertools
 import json
 import matplotlib.pyplot as plt
 import numpy as np
 from io import BytesIO
-from PIL import Image, ImageOps
-import cv2
+from PIL import Image
+from common.grid_spec import expand_grid_segments
 
 diagnostic_case_panel = Blueprint('diagnostic_case_panel', __name__)
 
 BACKEND_URL = "http://127.0.0.1:8000"
 
+# Headers passed between the browser and the backend's image endpoints, for caching and range requests
+PROXIED_REQUEST_HEADERS = ("Range", "If-None-Match", "If-Modified-Since")
+PROXIED_RESPONSE_HEADERS = (
+    "Content-Type", "Content-Length", "Content-Range", "Accept-Ranges", "ETag", "Last-Modified", "Cache-Control"
+)
+PROXY_CHUNK_SIZE = 256 * 1024
+# Deep zoom viewer, vendored under static/ (see its README); without it the panel shows the original image
+OPENSEADRAGON_SCRIPT = "js/vendor/openseadragon/openseadragon.min.js"
+
 def numpy_to_base64(np_array):
     img = Image.fromarray(np_array)
     buffer = BytesIO()
@@ -20,14 +30,6 @@ def numpy_to_base64(np_array):
     base64_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
     return base64_str
 
-def mask_to_polygons(mask):
-    """
-    Convert a binary mask to a list of polygons (vectorized contours).
-    """
-    contours, _ = cv2.findContours(mask.astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    polygons = [contour.flatten().tolist() for contour in contours]
-    return polygons
-
 def overlay_masks_on_image(base64_image: str, masks: list) -> str:
     """
     Overlays binary masks onto a base64 image in transparent red.
@@ -71,38 +73,55 @@ def overlay_masks_on_image(base64_image: str, masks: list) -> str:
 
     return final_base64_image
 
-def decode_rle(rle, shape):
-    """Decodes a run-length encoded mask back to a binary mask."""
-    flat = np.zeros(shape[0] * shape[1], dtype=np.uint8)
-    for start, length in zip(rle[0::2], rle[1::2]):
-        flat[start:start + length] = 1
-    return flat.reshape(shape)
-
-def decompress_metadata_with_masks(compressed_data):
-    """Decompresses RLE masks and metadata from a compressed format."""
-    # Decode the base64 encoded string
-    compressed = base64.b64decode(compressed_data)
-    # Decompress the zlib-compressed data
-    decompressed = zlib.decompress(compressed).decode('utf-8')
-    # Deserialize the JSON string into a Python object
-    metadata_with_rle_list = json.loads(decompressed)
-    return metadata_with_rle_list
-
-def decode_mask_with_metadata(metadata_with_rle, shape):
-    """Decodes an RLE mask along with its metadata."""
-    rle = metadata_with_rle["rle"]
-    metadata = metadata_with_rle["metadata"]
-    mask = decode_rle(rle, shape)  # Use existing RLE decoding function
-    return mask, metadata
+@diagnostic_case_panel.context_processor
+def deep_zoom_script():
+    """Names the deep zoom viewer's script for the template, or None while it is not vendored."""
+    vendored = os.path.isfile(os.path.join(current_app.static_folder, OPENSEADRAGON_SCRIPT))
+    return {"openseadragon_script": OPENSEADRAGON_SCRIPT if vendored else None}
 
 @diagnostic_case_panel.route('/', methods=['GET', 'POST'])
 def diagnostic_page():
     return render_template('diagnostic_case_panel.html')
 
+def prepare_image(image):
+    """Adds the proxy URLs and the grids of one listed image; the page fetches mask outlines through polygons_url."""
+    # The browser loads the files through the proxy routes below
+    image["image_url"] = url_for('diagnostic_case_panel.image_proxy', image_id=image["_id"])
+    image["thumbnail_url"] = url_for('diagnostic_case_panel.thumbnail_proxy', image_id=image["_id"])
+    image["dzi_url"] = url_for('diagnostic_case_panel.dzi_proxy', image_id=image["_id"])
+    image["polygons_url"] = url_for('diagnostic_case_panel.polygons_proxy', image_id=image["_id"])
+    if image.get("analysis_status", "done") != "done":
+        # Analysis still queued or failed, show the image without overlays
+        image["grids"] = []
+        return image
+
+    grids = []  # Initialize a list to store grids for the current image
+    for metadata in image.get("tissues", []):
+        # Results stored before the compact grid spec carry the expanded segments
+        grids.append(metadata["grid_segments"] if "grid_segments" in metadata
+                     else expand_grid_segments(metadata["grid"]))
+
+    # Add the grids list to the image's dictionary for future use
+    image["grids"] = grids
+    return image
+
+def iter_case_images(response):
+    """Yields the prepared images of a streamed NDJSON listing one at a time, skipping cursor lines."""
+    try:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            image = json.loads(line)
+            if "_id" in image:
+                yield prepare_image(image)
+    finally:
+        response.close()
+
 @diagnostic_case_panel.route('/get_case', methods=['GET', 'POST'])
 def diagnostic_panel():
     """
     Diagnostic case panel route, protected by user authentication.
+    The case listing is streamed from the backend and the page is rendered while it arrives.
     """
     if request.method == 'POST':
         case_name = request.form.get('case_input')
@@ -111,30 +130,18 @@ def diagnostic_panel():
 
         try:
             # Fetch case images and analysis results from the backend
-            response = requests.get(f"{BACKEND_URL}/cases/{case_name}/images", headers=headers)
+            response = requests.get(
+                f"{BACKEND_URL}/cases/{case_name}/images", headers=headers,
+                params={"format": "ndjson"}, stream=True
+            )
             if response.status_code == 200:
-                data = response.json()
-                for image in data:
-                    decompressed_data = decompress_metadata_with_masks(image["compressed_analysis_results"])
-                    grids = []  # Initialize a list to store grids for the current image
-                    masks = []
-                    for metadata_with_rle in decompressed_data:
-                        mask, metadata = decode_mask_with_metadata(metadata_with_rle, image["image_shape"])
-                        grids.append(metadata["grid_segments"])  # Append the grid_segments to the list
-                        masks.append(mask_to_polygons(mask))
-                        # Visualize or process the mask if needed
-                        # plt.figure(figsize=(8, 8))
-                        # plt.imshow(mask, cmap='gray', interpolation='nearest')
-                        # plt.title(f"Class: {metadata['class']}, Confidence: {metadata['confidence']}")
-                        # plt.colorbar(label="Value")
-                        # plt.axis('off')
-                        # plt.show()
-
-                    # Add the grids list to the image's dictionary for future use
-                    image["grids"] = grids
-                    image["masks"] = masks
-
-                return render_template('diagnostic_case_panel.html', case_name=case_name, case_data=data)
+                images = iter_case_images(response)
+                first_image = next(images, None)
+                if first_image is None:
+                    return render_template('diagnostic_case_panel.html', case_name=case_name, case_data=[])
+                return Response(stream_with_context(stream_template(
+                    'diagnostic_case_panel.html', case_name=case_name, case_data=itertools.chain([first_image], images)
+                )))
 
             else:
                 flash(f"Error: {response.json().get('detail', 'Unable to fetch data')}", "error")
@@ -142,3 +149,40 @@ def diagnostic_panel():
             flash(f"Backend request failed: {str(e)}", "error")
 
     return render_template('diagnostic_case_panel.html')
+
+def proxy_image(path, params=None):
+    """Streams an image response of the backend to the browser, forwarding caching and range headers."""
+    if 'access_token' not in session:
+        return Response(status=401)
+    headers = {"Authorization": f"Bearer {session['access_token']}"}
+    headers.update({name: request.headers[name] for name in PROXIED_REQUEST_HEADERS if name in request.headers})
+    try:
+        response = requests.get(f"{BACKEND_URL}{path}", headers=headers, params=params, stream=True)
+    except requests.exceptions.RequestException:
+        return Response(status=502)
+    return Response(
+        stream_with_context(response.iter_content(PROXY_CHUNK_SIZE)),
+        status=response.status_code,
+        headers={name: response.headers[name] for name in PROXIED_RESPONSE_HEADERS if name in response.headers}
+    )
+
+@diagnostic_case_panel.route('/images/<image_id>')
+def image_proxy(image_id):
+    return proxy_image(f"/images/{image_id}")
+
+@diagnostic_case_panel.route('/images/<image_id>/thumbnail')
+def thumbnail_proxy(image_id):
+    return proxy_image(f"/images/{image_id}/thumbnail")
+
+@diagnostic_case_panel.route('/images/<image_id>/polygons')
+def polygons_proxy(image_id):
+    return proxy_image(f"/images/{image_id}/polygons", {"lod": request.args.get("lod", type=int)})
+
+# Deep zoom viewer: the tile URLs are derived from the descriptor's (<name>.dzi -> <name>_files/)
+@diagnostic_case_panel.route('/images/<image_id>/tiles.dzi')
+def dzi_proxy(image_id):
+    return proxy_image(f"/images/{image_id}/tiles.dzi")
+
+@diagnostic_case_panel.route('/images/<image_id>/tiles_files/<int:level>/<tile>')
+def tile_proxy(image_id, level, tile):
+    return proxy_image(f"/images/{image_id}/tiles_files/{level}/{tile}")
@@ -49,15 +49,14 @@ def upload_image():
     files = request.files.getlist('images')
 
     try:
-        # Send each file to the FastAPI upload endpoint
-        for file in files:
-            headers = {"Authorization": f"Bearer {session['access_token']}"}
-            response = requests.post(
-                f"{FASTAPI_BASE_URL}/cases/{case_name}/upload-image",
-                files={"file": (file.filename, file.stream, file.content_type)},
-                headers=headers
-            )
-            response.raise_for_status()
+        # Send all files in one request so the backend can batch the detectors across images
+        headers = {"Authorization": f"Bearer {session['access_token']}"}
+        response = requests.post(
+            f"{FASTAPI_BASE_URL}/cases/{case_name}/upload-images",
+            files=[("files", (file.filename, file.stream, file.content_type)) for file in files],
+            headers=headers
+        )
+        response.raise_for_status()
 
         flash(f"Images successfully uploaded to case '{case_name}'!", "success")
         return redirect(url_for('macro_case_panel.macro_case_page'))
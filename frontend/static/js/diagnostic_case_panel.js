@@ -3,8 +3,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const fullImage = document.getElementById('full-image');
 });
 
-// Function to display the full image
-function showFullImage(imageData, imageFilename) {
+// Function to display the full image: in the deep zoom viewer, with the thumbnail behind it when the viewer is closed
+function showFullImage(imageUrl, imageFilename, dziUrl, thumbnailUrl, imageWidth, imageHeight) {
     const fullImageContainer = document.getElementById('full-image-container');
     const fullImage = document.getElementById('full-image');
     const fullImageTitle = document.getElementById('full-image-title');
@@ -13,8 +13,10 @@ function showFullImage(imageData, imageFilename) {
     const boxButton = document.getElementById('box-button');
     const maskButton = document.getElementById('mask-button');
 
-    // Set the image source and title
-    fullImage.src = `data:image/png;base64,${imageData}`;
+    // Set the image details and title
+    fullImage.dataset.dziUrl = dziUrl || '';
+    fullImage.dataset.imageWidth = imageWidth || '';
+    fullImage.dataset.imageHeight = imageHeight || '';
     fullImageTitle.textContent = imageFilename;
 
     // Show the full image container
@@ -32,6 +34,10 @@ function showFullImage(imageData, imageFilename) {
     gridButton.textContent = 'Show Grid'
     boxButton.textContent = 'Show Tissue Boxes'
     maskButton.textContent = 'Show Tissue Masks'
+
+    // Only the tiles of the visible region are loaded; the original is downloaded as a whole
+    // only when the deep zoom viewer is not available
+    fullImage.src = openTiledViewer() ? thumbnailUrl || imageUrl : imageUrl;
 }
 
 // Function to hide the full image view
@@ -49,39 +55,54 @@ function hideFullImage() {
     // Hide the container and reset the image
     fullImageContainer.style.display = 'none';
     fullImage.src = '';
+    closeTiledViewer();
 
     // Show the item list
     imagePreviewList.classList.remove('hidden');
     svgOverlay.innerHTML = '';
     boxsvgOverlay.innerHTML = '';
     masksvgOverlay.innerHTML = '';
+    delete masksvgOverlay.dataset.lod;
     gridButton.textContent = 'Show Grid'
     boxButton.textContent = 'Show Tissue Boxes'
     maskButton.textContent = 'Show Tissue Masks'
 }
 
+// The grid, box and mask overlays; all of them are drawn in pixels of the original image
+const OVERLAY_IDS = ['grid-overlay', 'box-overlay', 'mask-overlay'];
+
+// Size of the original image, from the analysis or, before it exists, the deep zoom descriptor
+function imageSize() {
+    const fullImage = document.getElementById('full-image');
+    return {
+        width: Number(fullImage.dataset.imageWidth) || fullImage.naturalWidth,
+        height: Number(fullImage.dataset.imageHeight) || fullImage.naturalHeight
+    };
+}
+
 // Function to dynamically adjust the grid overlay
 function adjustGridOverlay() {
     const fullImage = document.getElementById('full-image');
-    const svgOverlay = document.getElementById('grid-overlay');
-    const boxsvgOverlay = document.getElementById('box-overlay');
-    const masksvgOverlay = document.getElementById('mask-overlay');
-
-    const imageWidth = fullImage.clientWidth;
-    const imageHeight = fullImage.clientHeight;
-
-    // Update the SVG viewBox to match the image dimensions
-    svgOverlay.setAttribute('viewBox', `0 0 ${imageWidth} ${imageHeight}`);
-    svgOverlay.style.width = `${imageWidth}px`;
-    svgOverlay.style.height = `${imageHeight}px`;
-
-    boxsvgOverlay.setAttribute('viewBox', `0 0 ${imageWidth} ${imageHeight}`);
-    boxsvgOverlay.style.width = `${imageWidth}px`;
-    boxsvgOverlay.style.height = `${imageHeight}px`;
+    const { width, height } = imageSize();
+
+    OVERLAY_IDS.forEach(id => {
+        const overlay = document.getElementById(id);
+        // The viewBox maps image pixels onto the overlay, whatever size it is shown at
+        overlay.setAttribute('viewBox', `0 0 ${width} ${height}`);
+        overlay.setAttribute('preserveAspectRatio', 'none');
+        // Inside the deep zoom viewer, the viewer sizes the overlays as it zooms
+        overlay.style.width = tiledViewer ? '100%' : `${fullImage.clientWidth}px`;
+        overlay.style.height = tiledViewer ? '100%' : `${fullImage.clientHeight}px`;
+    });
+}
 
-    masksvgOverlay.setAttribute('viewBox', `0 0 ${imageWidth} ${imageHeight}`);
-    masksvgOverlay.style.width = `${imageWidth}px`;
-    masksvgOverlay.style.height = `${imageHeight}px`;
+// Screen pixels per image pixel at the current view
+function displayScale() {
+    if (tiledViewer && tiledViewer.world.getItemCount()) {
+        const viewport = tiledViewer.viewport;
+        return viewport.viewportToImageZoom(viewport.getZoom(true));
+    }
+    return document.getElementById('mask-overlay').clientWidth / imageSize().width;
 }
 
 // Call adjustGridOverlay whenever the window resizes
@@ -99,7 +120,6 @@ window.addEventListener('resize', () => {
 
 // Function to create and show the grid overlay
 function showGrid() {
-    const fullImage = document.getElementById('full-image');
     const fullImageTitle = document.getElementById('full-image-title').textContent;
     const gridButton = document.getElementById('grid-button');
     const svgOverlay = document.getElementById('grid-overlay');
@@ -121,20 +141,18 @@ function showGrid() {
     // Clear existing SVG grid
     svgOverlay.innerHTML = '';
 
-    const scaleX = svgOverlay.clientWidth / fullImage.naturalWidth;
-    const scaleY = svgOverlay.clientHeight / fullImage.naturalHeight;
-
     // Iterate through each grid JSON in the list
     gridsList.forEach(grids => {
         // Add horizontal segments
         grids.horizontal_segments.forEach(segment => {
             const line = document.createElementNS("http://www.w3.org/2000/svg", "line");
-            line.setAttribute("x1", segment.x_start * scaleX);
-            line.setAttribute("y1", segment.y_start * scaleY);
-            line.setAttribute("x2", segment.x_end * scaleX);
-            line.setAttribute("y2", segment.y_end * scaleY);
+            line.setAttribute("x1", segment.x_start);
+            line.setAttribute("y1", segment.y_start);
+            line.setAttribute("x2", segment.x_end);
+            line.setAttribute("y2", segment.y_end);
             line.setAttribute("stroke", "blue");
             line.setAttribute("stroke-width", "2");
+            line.setAttribute("vector-effect", "non-scaling-stroke");
             line.setAttribute("class", "grid-line");
             line.dataset.info = `${segment.id}`;
 
@@ -149,12 +167,13 @@ function showGrid() {
         // Add vertical segments
         grids.vertical_segments.forEach(segment => {
             const line = document.createElementNS("http://www.w3.org/2000/svg", "line");
-            line.setAttribute("x1", segment.x_start * scaleX);
-            line.setAttribute("y1", segment.y_start * scaleY);
-            line.setAttribute("x2", segment.x_end * scaleX);
-            line.setAttribute("y2", segment.y_end * scaleY);
+            line.setAttribute("x1", segment.x_start);
+            line.setAttribute("y1", segment.y_start);
+            line.setAttribute("x2", segment.x_end);
+            line.setAttribute("y2", segment.y_end);
             line.setAttribute("stroke", "green");
             line.setAttribute("stroke-width", "2");
+            line.setAttribute("vector-effect", "non-scaling-stroke");
             line.setAttribute("class", "grid-line");
             line.dataset.info = `${segment.id}`;
 
@@ -175,7 +194,6 @@ function showGrid() {
 
 // Function to create and show the grid overlay
 function showBoxes() {
-    const fullImage = document.getElementById('full-image');
     const fullImageTitle = document.getElementById('full-image-title').textContent;
     const boxButton = document.getElementById('box-button');
     const svgOverlay = document.getElementById('box-overlay');
@@ -198,9 +216,6 @@ function showBoxes() {
     // Clear existing SVG grid
     svgOverlay.innerHTML = '';
 
-    const scaleX = svgOverlay.clientWidth / fullImage.naturalWidth;
-    const scaleY = svgOverlay.clientHeight / fullImage.naturalHeight;
-
     // Iterate through each grid JSON in the list
     gridsList.forEach(grids => {
         const boundingBox = grids.metadata.bounding_box; // Assuming bounding_box is an array [x1, y1, x2, y2]
@@ -211,10 +226,10 @@ function showBoxes() {
 
         // Calculate attributes for the rectangle
         const [x1, y1, x2, y2] = boundingBox;
-        const x = Math.min(x1, x2) * scaleX; // Top-left X
-        const y = Math.min(y1, y2) * scaleY; // Top-left Y
-        const width = Math.abs(x2 - x1) * scaleX; // Width
-        const height = Math.abs(y2 - y1) * scaleY; // Height
+        const x = Math.min(x1, x2); // Top-left X
+        const y = Math.min(y1, y2); // Top-left Y
+        const width = Math.abs(x2 - x1); // Width
+        const height = Math.abs(y2 - y1); // Height
 
         // Create an SVG rectangle
         const rect = document.createElementNS("http://www.w3.org/2000/svg", "rect");
@@ -225,6 +240,7 @@ function showBoxes() {
         rect.setAttribute("fill", "none"); // Transparent fill
         rect.setAttribute("stroke", "red"); // Border color
         rect.setAttribute("stroke-width", "2");
+        rect.setAttribute("vector-effect", "non-scaling-stroke");
         rect.setAttribute("class", "bounding-box");
 
         // Append the rectangle to the SVG overlay
@@ -236,35 +252,89 @@ function showBoxes() {
     boxButton.textContent = 'Hide Tissue Boxes';
 }
 
-// Function to create and show the mask overlay using raw polygon data
+// Function to create and show the mask overlay from the outlines stored by the backend
 function showMasks() {
-    const fullImage = document.getElementById('full-image');
-    const fullImageTitle = document.getElementById('full-image-title').textContent;
     const maskButton = document.getElementById('mask-button'); // Button to toggle masks
     const svgOverlay = document.getElementById('mask-overlay'); // SVG overlay for masks
 
     if (maskButton.textContent !== "Show Tissue Masks") {
         svgOverlay.innerHTML = '';
+        delete svgOverlay.dataset.lod;
         maskButton.textContent = 'Show Tissue Masks';
         return;
     }
 
-    // Get the hidden masks data
+    // Ensure the SVG overlay is visible
+    svgOverlay.style.display = 'block';
+    maskButton.textContent = 'Hide Tissue Masks';
+    updateMasks();
+}
+
+// Draws the mask outlines at the level of detail the current view needs, unless they already are
+function updateMasks() {
+    const fullImageTitle = document.getElementById('full-image-title').textContent;
+    const maskButton = document.getElementById('mask-button');
+    const svgOverlay = document.getElementById('mask-overlay');
+
+    if (maskButton.textContent !== 'Hide Tissue Masks') {
+        return;
+    }
+    // Get the URL of the image's mask outlines
     const masksElement = document.getElementById(`'${fullImageTitle}'_masks`);
     if (!masksElement) {
         console.error('Mask data not found for the current image.');
         return;
     }
 
-    const rawPolygons = masksElement.textContent.trim(); // Raw polygon string
-    const masksList = eval(rawPolygons); // Parse raw string as JavaScript array
+    const lod = maskLodForScale(displayScale());
+    if (Number(svgOverlay.dataset.lod) >= lod) {
+        return;
+    }
+    loadMasks(masksElement.dataset.polygonsUrl, lod)
+        .then(masksList => {
+            const stillShown = maskButton.textContent === 'Hide Tissue Masks' &&
+                document.getElementById('full-image-title').textContent === fullImageTitle;
+            // A finer level may have arrived first
+            if (stillShown && !(Number(svgOverlay.dataset.lod) >= lod)) {
+                drawMasks(masksList);
+                svgOverlay.dataset.lod = lod;
+            }
+        })
+        .catch(error => console.error('Loading tissue masks failed:', error));
+}
+
+// Mask outlines already fetched, per image and level of detail
+const loadedMasks = new Map();
+
+// Returns a promise of the masks (each a list of polygons) of an image at a level of detail
+function loadMasks(polygonsUrl, lod) {
+    const url = `${polygonsUrl}?lod=${lod}`;
+    if (!loadedMasks.has(url)) {
+        const masks = fetch(url, { credentials: 'same-origin' })
+            .then(response => response.ok ? response.json() : Promise.reject(response.status))
+            .then(result => result.masks);
+        // Failed requests are tried again the next time
+        masks.catch(() => loadedMasks.delete(url));
+        loadedMasks.set(url, masks);
+    }
+    return loadedMasks.get(url);
+}
+
+// Level of detail of the mask outlines for a display scale (screen pixels per image pixel)
+const MASK_LOD_SCALES = [0.125, 0.25, 0.5];
+
+function maskLodForScale(scale) {
+    const lod = MASK_LOD_SCALES.findIndex(limit => scale < limit);
+    return lod === -1 ? MASK_LOD_SCALES.length : lod;
+}
+
+// Draws a list of masks (each a list of polygons) into the mask overlay, replacing what it shows
+function drawMasks(masksList) {
+    const svgOverlay = document.getElementById('mask-overlay');
 
     // Clear existing SVG mask paths
     svgOverlay.innerHTML = '';
 
-    const scaleX = svgOverlay.clientWidth / fullImage.naturalWidth;
-    const scaleY = svgOverlay.clientHeight / fullImage.naturalHeight;
-
     // Iterate through each mask (list of polygons)
     masksList.forEach(polygons => {
         // Iterate through each polygon in the mask
@@ -277,9 +347,7 @@ function showMasks() {
             // Convert points array into an SVG path string
             let pathData = '';
             for (let i = 0; i < points.length; i += 2) {
-                const x = points[i] * scaleX;
-                const y = points[i + 1] * scaleY;
-                pathData += i === 0 ? `M ${x},${y} ` : `L ${x},${y} `;
+                pathData += i === 0 ? `M ${points[i]},${points[i + 1]} ` : `L ${points[i]},${points[i + 1]} `;
             }
             pathData += 'Z'; // Close the path
 
@@ -289,17 +357,87 @@ function showMasks() {
             path.setAttribute("fill", "rgba(0, 0, 255, 0.3)"); // Semi-transparent blue fill
             path.setAttribute("stroke", "blue"); // Border color
             path.setAttribute("stroke-width", "1");
+            path.setAttribute("vector-effect", "non-scaling-stroke");
 
             // Append the path to the SVG overlay
             svgOverlay.appendChild(path);
         });
     });
+}
 
-    // Ensure the SVG overlay is visible
-    svgOverlay.style.display = 'block';
-    maskButton.textContent = 'Hide Tissue Masks';
+
+// Deep zoom viewer: loads only the tiles of the visible region and zoom level
+let tiledViewer = null;
+
+function toggleTiledViewer() {
+    if (tiledViewer) {
+        // Back to the thumbnail
+        closeTiledViewer();
+    } else {
+        openTiledViewer();
+    }
 }
 
+// Opens the current image in the deep zoom viewer; returns false if it cannot be shown there
+function openTiledViewer() {
+    const fullImage = document.getElementById('full-image');
+    const viewerElement = document.getElementById('tiled-viewer');
+    const dziUrl = fullImage.dataset.dziUrl;
+
+    if (!dziUrl || typeof OpenSeadragon === 'undefined') {
+        return false;
+    }
+    closeTiledViewer();
+    fullImage.style.display = 'none';
+    viewerElement.style.display = 'block';
+    tiledViewer = OpenSeadragon({
+        element: viewerElement,
+        tileSources: dziUrl,
+        showNavigationControl: false,
+        ajaxWithCredentials: true
+    });
+    tiledViewer.addHandler('open', () => {
+        const size = tiledViewer.world.getItemAt(0).getContentSize();
+        fullImage.dataset.imageWidth = fullImage.dataset.imageWidth || size.x;
+        fullImage.dataset.imageHeight = fullImage.dataset.imageHeight || size.y;
+        adjustGridOverlay();
+        // The overlays cover the image, which is one unit wide in viewport coordinates, and
+        // zoom and pan with it
+        OVERLAY_IDS.forEach(id => tiledViewer.addOverlay({
+            element: document.getElementById(id),
+            location: new OpenSeadragon.Rect(0, 0, 1, size.y / size.x)
+        }));
+    });
+    // Finer mask outlines once zoomed in far enough to need them
+    tiledViewer.addHandler('animation-finish', updateMasks);
+    document.getElementById('zoom-button').textContent = 'Close Deep Zoom';
+    return true;
+}
+
+function closeTiledViewer() {
+    if (tiledViewer) {
+        const container = document.getElementById('full-image-container');
+        const viewerElement = document.getElementById('tiled-viewer');
+        // Move the overlays back over the static image before the viewer goes
+        OVERLAY_IDS.forEach(id => {
+            const overlay = document.getElementById(id);
+            tiledViewer.removeOverlay(overlay);
+            overlay.removeAttribute('style');
+            overlay.style.display = 'block';
+            container.insertBefore(overlay, viewerElement);
+        });
+        tiledViewer.destroy();
+        tiledViewer = null;
+    }
+    document.getElementById('tiled-viewer').style.display = 'none';
+    document.getElementById('full-image').style.display = '';
+    // The button is left out of the page while the viewer is not vendored
+    const zoomButton = document.getElementById('zoom-button');
+    if (zoomButton) {
+        zoomButton.textContent = 'Deep Zoom';
+    }
+    adjustGridOverlay();
+}
 
 // JavaScript for making the draggable-buttons div draggable
 document.addEventListener('DOMContentLoaded', () => {
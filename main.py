@@ -1,26 +1,46 @@
+import time
+# Start of the application's own imports, for the startup time breakdown reported by /ready
+_imports_started = time.perf_counter()
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Depends, File, UploadFile
+from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pymongo import MongoClient
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
 from bcrypt import hashpw, gensalt, checkpw
 from pydantic import BaseModel, EmailStr
 from jose import JWTError, jwt
 from typing import List, Optional
 from backend.scripts.logging_config import logger
-from backend.scripts.process_tissue import process_capsule, process_tissue, segment_bbox
-from backend.scripts.onnx_interference import load_onnx_model
-from sam2.build_sam import build_sam2
-from sam2.sam2_image_predictor import SAM2ImagePredictor
+from backend.scripts.process_tissue import process_image, process_images
+from backend.scripts.inference_pool import run_in_inference_pool, shutdown_inference_pool, InferencePoolFull, pending_jobs
+from backend.scripts.model_registry import ModelRegistry, ModelsNotReady
+from backend.scripts.batch_scheduler import DetectionBatcher
+from backend.scripts.analysis_cache import AnalysisCache, hash_bytes
+from backend.scripts.blob_store import create_blob_store
+from backend.scripts.db_schema import ensure_indexes
+from backend.scripts.tiles import TileCache, dzi_descriptor
+from backend.scripts.database import connect, DatabaseExecutor, MONGO_URI
+from backend.scripts.repositories import UserRepository, CaseRepository, ImageRepository
+from backend.scripts.image_streaming import (
+    RangeNotSatisfiable, parse_range, iter_file, http_date, is_not_modified, make_thumbnail
+)
+from backend.scripts.jobs import (
+    enqueue_job, claim_next_job, fail_exhausted_job, renew_lease, release_job, complete_job, fail_job, get_job,
+    serialize_job
+)
 import os
+import asyncio
+import socket
 import numpy as np
 from PIL import Image
 import io
-from backend.scripts.grid import generate_grid_segments, save_grid_segments, load_grid_segments, visualize_grid_segments_opencv
+from common.analysis_format import AnalysisFormatError, pack_analysis_results, read_analysis_metadata, read_analysis_results
+from common.mask_codec import MASK_CODECS, encode_mask_with_metadata, mask_bbox
+from common.mask_geometry import LOD_VERTEX_BUDGETS, mask_to_lods, entry_lods
+from backend.scripts.grid import generate_grid_segments, grid_cell_coverage, dump_grids_async, shutdown_grid_debug_writer
 import json
-import matplotlib.pyplot as plt
-import base64
-import zlib
 
 ##########################
 # FOR TESTING REMOVE LATER!!
@@ -29,43 +49,121 @@ import sys
 import zipfile
 ##########################
 
-logger.info("Starting backend application")
+APP_IMPORT_SECONDS = time.perf_counter() - _imports_started
+logger.info(f"Starting backend application (imports took {APP_IMPORT_SECONDS:.2f} s)")
 
 # Initialize FastAPI app
 app = FastAPI()
 
+# Background tasks draining the analysis job queue
+job_worker_tasks = []
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("FastAPI application is starting up.")
+    if EAGER_MODEL_LOADING:
+        await run_in_threadpool(models.load)
+    else:
+        models.load_in_background()
+    await db_executor.run(ensure_indexes, db)
+    for index in range(ANALYSIS_JOB_WORKERS):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+        job_worker_tasks.append(asyncio.create_task(analysis_job_worker(worker_id)))
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("FastAPI application is shutting down.")
-
-# Connect to MongoDB
-client = MongoClient("mongodb://localhost:27017/")  # Update with your MongoDB connection string
-db = client["image_upload_db"]  # Replace with your database name
-users_collection = db["Users"]  # Replace with your collection name
-cases_collection = db["Cases"]  # Replace with your collection name for cases
-images_collection = db["Images"]  # Collection for storing images
+    for task in job_worker_tasks:
+        task.cancel()
+    await asyncio.gather(*job_worker_tasks, return_exceptions=True)
+    shutdown_inference_pool()
+    shutdown_grid_debug_writer()
+    models.close()
+    db_executor.shutdown()
+    tile_cache.close()
+
+# Connect to MongoDB (pool size, timeouts and write concern: see backend/scripts/database.py)
+db = connect()
+# All database calls of the request handlers run on this pool, off the event loop
+db_executor = DatabaseExecutor()
+user_repo = UserRepository(db["Users"], db_executor)
+case_repo = CaseRepository(db["Cases"], db_executor)
+image_repo = ImageRepository(db["Images"], db_executor)
+jobs_collection = db["AnalysisJobs"]  # Queue of pending image analyses
+analysis_cache_collection = db["AnalysisCache"]  # Analysis results by upload content hash
 
 logger.info("Connected to MongoDB database")
 
+# Image files are kept in a blob store, image documents only hold a reference:
+# "local" (content-addressed directory BLOB_STORE_DIR) or "gridfs"
+BLOB_STORE = os.getenv("BLOB_STORE", "local")
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "blobs")
+if BLOB_STORE == "gridfs" and MONGO_URI.startswith("memory://"):
+    raise ValueError("BLOB_STORE=gridfs needs MongoDB, use BLOB_STORE=local with the in-memory database")
+blob_store = create_blob_store(BLOB_STORE, db, BLOB_STORE_DIR)
+# Longest side of the thumbnails in case listings, in pixels
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "256"))
+# Deep zoom tiles for the viewer, cached on disk (TILE_* settings in backend/scripts/tiles.py).
+# Pyramids are built on the first tile request, or right after upload with TILES_AT_INGEST=1
+tile_cache = TileCache()
+TILES_AT_INGEST = os.getenv("TILES_AT_INGEST", "0") == "1"
+# Largest page of the paginated case image listing
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
 # Secret key and algorithm for JWT
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 300
 
+# Analysis job queue
+ANALYSIS_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "1"))  # Queue consumers per backend process
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))  # Unrenewed for this long, a running job is claimable again
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # Claims of a job before it is marked failed
+# Running jobs renew their lease this often, so a slow analysis is not reclaimed by another worker
+JOB_LEASE_RENEWAL_SECONDS = float(os.getenv("JOB_LEASE_RENEWAL_SECONDS", str(JOB_LEASE_SECONDS / 3)))
+
 # Dependency for OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 #AI Stuff
-ort_session_capsule = load_onnx_model(os.path.join("backend", "models", "capsules.onnx"))
-ort_session_tissue = load_onnx_model(os.path.join("backend", "models", "tissue.onnx"))
+MODELS_DIR = os.path.join("backend", "models")
+DETECTOR_PRECISION = os.getenv("DETECTOR_PRECISION", "fp32")  # "int8" uses the quantized exports
 sam = "./backend/sam2/checkpoints/sam2.1_hiera_tiny.pt"
 model_cfg = "configs/sam2.1/sam2.1_hiera_t.yaml"
-sam2 = build_sam2(model_cfg, sam, device ='cpu', apply_postprocessing=False)
-predictor = SAM2ImagePredictor(sam2)
+DETECTION_BATCH_SIZE = int(os.getenv("DETECTION_BATCH_SIZE", "4"))  # Images per detector run for batch uploads
+
+# Micro-batching: concurrent detection requests are collected for up to DETECTION_MAX_WAIT_MS
+# (or DETECTION_BATCH_SIZE requests) and run as one batch. Only applied to detectors exported
+# with a batch size above 1 (export_to_onnx --batch-size)
+DETECTION_MICRO_BATCHING = os.getenv("DETECTION_MICRO_BATCHING", "1") == "1"
+DETECTION_MAX_WAIT_MS = float(os.getenv("DETECTION_MAX_WAIT_MS", "5"))
+
+# Bump when the analysis output changes for the same image and models, so cached results are not reused
+ANALYSIS_VERSION = 9
+GRID_SIZE_CM = (1, 1)
+# Mask representation in the analysis results, one of common.mask_codec.MASK_CODECS
+MASK_CODEC = os.getenv("MASK_CODEC", "rle")
+if MASK_CODEC not in MASK_CODECS:
+    raise ValueError(f"MASK_CODEC must be one of {MASK_CODECS}, got {MASK_CODEC!r}")
+# Store masks cropped to the bounding box of their foreground rather than at full image size
+MASK_CROP = os.getenv("MASK_CROP", "1") == "1"
+# Douglas-Peucker tolerance in pixels of the finest mask outlines stored with the analysis
+MASK_POLYGON_EPSILON = float(os.getenv("MASK_POLYGON_EPSILON", "1.5"))
+# Vertex budgets per mask of the stored outline levels of detail, coarsest first
+MASK_POLYGON_LOD_BUDGETS = tuple(
+    int(budget) for budget in os.getenv("MASK_POLYGON_LOD_BUDGETS", ",".join(map(str, LOD_VERTEX_BUDGETS))).split(",")
+)
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "1") == "1"
+analysis_cache = AnalysisCache(analysis_cache_collection)
+
+# By default the models load in a background thread after startup and /ready reports when they
+# are usable. EAGER_MODEL_LOADING=1 loads them before the application accepts requests.
+EAGER_MODEL_LOADING = os.getenv("EAGER_MODEL_LOADING", "0") == "1"
+models = ModelRegistry(
+    MODELS_DIR, DETECTOR_PRECISION, sam, model_cfg,
+    DETECTION_BATCH_SIZE, DETECTION_MAX_WAIT_MS if DETECTION_MICRO_BATCHING else None
+)
 
 class UserData(BaseModel):
     username: str
@@ -95,65 +193,260 @@ def convert_numpy(obj):
     else:
         return obj
 
-def encode_rle(mask):
-    """Encodes a binary mask using run-length encoding."""
-    flat = mask.flatten()
-    runs = np.where(flat[1:] != flat[:-1])[0] + 1
-    runs[1::2] -= runs[::2]
-    return runs.tolist()
-
-def decode_rle(rle, shape):
-    """Decodes a run-length encoded mask back to a binary mask."""
-    flat = np.zeros(shape[0] * shape[1], dtype=np.uint8)
-    for start, length in zip(rle[0::2], rle[1::2]):
-        flat[start:start + length] = 1
-    return flat.reshape(shape)
-
-def encode_mask_with_metadata(mask, metadata):
-    """Encodes a binary mask along with metadata using RLE."""
-    rle = encode_rle(mask)  # Use existing RLE encoding function
-    metadata_with_rle = {
-        "rle": rle,
-        "metadata": metadata
+def decode_upload(source):
+    """Decodes an uploaded image, given as bytes or as a blob reference, into a NumPy array."""
+    if isinstance(source, (bytes, bytearray)):
+        return np.array(Image.open(io.BytesIO(source)))
+    # Streams the file from the blob store instead of reading it into memory first
+    with blob_store.open(source) as f:
+        return np.array(Image.open(f))
+
+def image_source(image):
+    """Returns what decode_upload needs for a stored image: its blob reference, or the bytes of older documents."""
+    return image["blob"] if "blob" in image else image["data"]
+
+def encode_analysis(_1cm, tissues, image_key=None):
+    """
+    Builds grid specs, per-cell tissue coverage and RLE masks for the segmented tissues of an image.
+
+    Args:
+        _1cm (float): Pixels per centimetre measured on the capsule.
+        tissues (list): (class_id, bbox, confidence, mask) tuples as returned by process_image.
+        image_key (str, optional): Names the grid debug dump of the image, see GRID_DEBUG_DIR.
+
+    Returns:
+        bytes: The analysis results in the binary container of common.analysis_format.
+    """
+    metadata_with_rle_list = []
+    grids = []
+    for cls, bbox, confidence, highest_score_mask in tissues:
+        grid_segments = generate_grid_segments(bbox, _1cm, GRID_SIZE_CM)
+        grids.append(grid_segments)
+        # The mask lies within the prompted box; only its foreground's bounding box is traced
+        x, y, width, height = mask_bbox(highest_score_mask)
+        cropped_mask = highest_score_mask[y:y + height, x:x + width]
+
+        # Metadata for the mask. Only the compact grid spec is stored, readers expand
+        # it with common.grid_spec.expand_grid_segments. Coverage lists are row-major over the grid cells.
+        metadata = {
+            "class": cls,
+            "confidence": float(confidence),
+            "bbox": bbox,
+            "grid": grid_segments.spec,
+            "coverage": grid_cell_coverage(grid_segments.spec, highest_score_mask),
+            # Outlines for the viewers at several levels of detail, so they never decode the mask themselves
+            "polygon_lods": mask_to_lods(cropped_mask, MASK_POLYGON_LOD_BUDGETS, MASK_POLYGON_EPSILON, (x, y))
+        }
+
+        # Encode mask with metadata
+        metadata_with_rle = encode_mask_with_metadata(highest_score_mask, metadata, MASK_CODEC, MASK_CROP)
+        metadata_with_rle_list.append(metadata_with_rle)
+
+    # The grids are persisted with the image's analysis results; local dumps are debug only
+    dump_grids_async(image_key, grids)
+
+    # Binary container, stored as BSON Binary
+    return pack_analysis_results(metadata_with_rle_list)
+
+def analyse_image(source, timings=None, image_key=None):
+    """
+    Runs detection, segmentation and RLE encoding for an uploaded image.
+    Blocking; called from the inference pool.
+
+    Args:
+        source (dict or bytes): Blob reference of the uploaded image file, or its bytes.
+        timings (dict, optional): Receives the duration of every stage in seconds.
+        image_key (str, optional): Identifies the image in grid debug dumps.
+
+    Returns:
+        tuple: (image_shape, compressed_analysis_results)
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    image_array = decode_upload(source)
+    timings["decode"] = time.perf_counter() - start
+
+    # Process the image (one SAM2 embedding for the capsule and all tissue boxes)
+    _1cm, tissues = process_image(models.predictor, models.capsule_detector, models.tissue_detector, image_array, timings)
+    start = time.perf_counter()
+    compressed_data = encode_analysis(_1cm, tissues, image_key)
+    timings["encoding"] = time.perf_counter() - start
+    return image_array.shape[:2], compressed_data
+
+def analyse_images(sources, image_keys=None):
+    """
+    Like analyse_image for several uploads, running the detectors on batches of
+    DETECTION_BATCH_SIZE images. Blocking; called from the inference pool.
+
+    Returns:
+        list: One (image_shape, compressed_analysis_results) tuple per upload.
+    """
+    image_arrays = [decode_upload(source) for source in sources]
+    results = process_images(
+        models.predictor, models.capsule_detector, models.tissue_detector, image_arrays, DETECTION_BATCH_SIZE
+    )
+    image_keys = image_keys or [None] * len(image_arrays)
+    return [
+        (image_array.shape[:2], encode_analysis(_1cm, tissues, image_key))
+        for image_array, (_1cm, tissues), image_key in zip(image_arrays, results, image_keys)
+    ]
+
+def analysis_summary(metadata):
+    """Summarises the per-tissue metadata of analysis results for listings: tissue count, classes and total tissue area."""
+    return {
+        "tissues": len(metadata),
+        "classes": sorted({m["class"] for m in metadata}, key=str),
+        "tissue_area_cm2": round(sum(m.get("coverage", {}).get("total_area_cm2", 0.0) for m in metadata), 4)
     }
-    return metadata_with_rle
-
-def decode_mask_with_metadata(metadata_with_rle, shape):
-    """Decodes an RLE mask along with its metadata."""
-    rle = metadata_with_rle["rle"]
-    metadata = metadata_with_rle["metadata"]
-    mask = decode_rle(rle, shape)  # Use existing RLE decoding function
-    return mask, metadata
-
-def compress_metadata_with_masks(metadata_with_rle_list):
-    """Compresses RLE masks along with metadata."""
-    # Serialize metadata and RLEs into a JSON string
-    serialized_data = json.dumps(metadata_with_rle_list)
-    # Compress using zlib and encode in base64
-    compressed = zlib.compress(serialized_data.encode())
-    return base64.b64encode(compressed).decode('utf-8')
-
-def decompress_metadata_with_masks(compressed_data):
-    """Decompresses RLE masks and metadata from a compressed format."""
-    # Decode the base64 encoded string
-    compressed = base64.b64decode(compressed_data)
-    # Decompress the zlib-compressed data
-    decompressed = zlib.decompress(compressed).decode('utf-8')
-    # Deserialize the JSON string into a Python object
-    metadata_with_rle_list = json.loads(decompressed)
-    return metadata_with_rle_list
+
+# Metadata of an analysis entry that describes its mask rather than the tissue
+MASK_METADATA_KEYS = ("mask_crop", "polygons", "polygon_lods")
+
+def tissue_metadata(metadata):
+    """
+    Per-tissue metadata of analysis results for listings: class, confidence, bounding box,
+    grid spec and coverage as plain JSON, without the masks and their outlines.
+    """
+    return [{key: value for key, value in m.items() if key not in MASK_METADATA_KEYS} for m in metadata]
+
+def analysis_listing_fields(compressed_data):
+    """
+    The fields of an image document the case listing serves from, computed once when the
+    analysis results are stored. Only the metadata of the results is read, not the masks.
+    """
+    metadata = read_analysis_metadata(compressed_data)
+    return {"analysis_summary": analysis_summary(metadata), "analysis_tissues": tissue_metadata(metadata)}
+
+def analysis_version():
+    """Identifies the models and parameters analysis results were computed with."""
+    return (f"models={models.fingerprint}|analysis={ANALYSIS_VERSION}|grid={GRID_SIZE_CM}|masks={MASK_CODEC}"
+            f"|polygons={MASK_POLYGON_EPSILON}:{MASK_POLYGON_LOD_BUDGETS}|crop={MASK_CROP}")
+
+async def analyse_upload(source, content_hash, timings=None):
+    """
+    Returns the analysis results of an upload, from the analysis cache if the same bytes
+    were analysed before with the current models, otherwise by running analyse_image
+    in the inference pool.
+
+    Returns:
+        tuple: (image_shape, compressed_analysis_results)
+    """
+    if ANALYSIS_CACHE_ENABLED:
+        cached = await db_executor.run(analysis_cache.get, content_hash, analysis_version())
+        if cached is not None:
+            if timings is not None:
+                timings["cache_hit"] = True
+            return cached
+
+    image_shape, compressed_data = await run_in_inference_pool(analyse_image, source, timings, content_hash)
+    if ANALYSIS_CACHE_ENABLED:
+        await db_executor.run(analysis_cache.put, content_hash, analysis_version(), image_shape, compressed_data)
+    return image_shape, compressed_data
+
+async def analyse_uploads(sources, content_hashes):
+    """Like analyse_upload for several uploads; only cache misses go through the batched analysis."""
+    results = [None] * len(sources)
+    if ANALYSIS_CACHE_ENABLED:
+        version = analysis_version()
+        for index, content_hash in enumerate(content_hashes):
+            results[index] = await db_executor.run(analysis_cache.get, content_hash, version)
+
+    misses = [index for index, result in enumerate(results) if result is None]
+    if misses:
+        analysed = await run_in_inference_pool(
+            analyse_images, [sources[index] for index in misses], [content_hashes[index] for index in misses]
+        )
+        for index, result in zip(misses, analysed):
+            results[index] = result
+            if ANALYSIS_CACHE_ENABLED:
+                await db_executor.run(analysis_cache.put, content_hashes[index], version, *result)
+    return results
+
+async def keep_job_leased(job_id, worker_id):
+    """Renews the lease of a running job every JOB_LEASE_RENEWAL_SECONDS until cancelled or the claim is lost."""
+    while True:
+        await asyncio.sleep(JOB_LEASE_RENEWAL_SECONDS)
+        try:
+            if not await db_executor.run(renew_lease, jobs_collection, job_id, worker_id):
+                return
+        except Exception as e:
+            logger.error(f"Could not renew the lease of analysis job {job_id}: {e}")
+
+async def run_analysis_job(job):
+    """Runs a claimed job with process_analysis_job, renewing its lease while it runs."""
+    job_id, worker_id = str(job["_id"]), job["claimed_by"]
+    lease = asyncio.create_task(keep_job_leased(job_id, worker_id))
+    try:
+        await process_analysis_job(job, job_id, worker_id)
+    finally:
+        lease.cancel()
+        await asyncio.gather(lease, return_exceptions=True)
+
+async def process_analysis_job(job, job_id, worker_id):
+    """Analyses the image referenced by a claimed job and stores the results on the image document."""
+    timings = {"queued": (job["claimed_at"] - job["created_at"]).total_seconds()}
+    start = time.perf_counter()
+    try:
+        image = await image_repo.find_by_id(ObjectId(job["image_id"]))
+        if image is None:
+            raise ValueError(f"Image {job['image_id']} does not exist")
+        content_hash = image.get("content_hash") or hash_bytes(image["data"])
+        image_shape, compressed_data = await analyse_upload(image_source(image), content_hash, timings)
+    except InferencePoolFull:
+        logger.info(f"Inference pool full, returning analysis job {job_id} to the queue")
+        await db_executor.run(release_job, jobs_collection, job_id, worker_id)
+        await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+        return
+    except Exception as e:
+        logger.error(f"Analysis job {job_id} failed: {e}")
+        timings["total"] = time.perf_counter() - start
+        # Another worker that reclaimed the job may still succeed; only the claim holder marks the image
+        if await db_executor.run(fail_job, jobs_collection, job_id, worker_id, str(e), timings):
+            await image_repo.update(ObjectId(job["image_id"]), {"analysis_status": "failed"})
+        return
+
+    await image_repo.update(ObjectId(job["image_id"]), {
+        "image_shape": image_shape,
+        "compressed_analysis_results": compressed_data,
+        **analysis_listing_fields(compressed_data),
+        "analysis_status": "done"
+    })
+    timings["total"] = time.perf_counter() - start
+    if await db_executor.run(complete_job, jobs_collection, job_id, worker_id, timings):
+        logger.info(f"Analysis job {job_id} finished in {timings['total']:.2f} s")
+
+async def analysis_job_worker(worker_id):
+    """Claims and runs analysis jobs until cancelled. Several processes can run workers on the same queue."""
+    logger.info(f"Analysis job worker {worker_id} started")
+    while True:
+        if not models.is_ready():
+            await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+            continue
+        try:
+            exhausted = await db_executor.run(fail_exhausted_job, jobs_collection, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS)
+            if exhausted is not None:
+                await image_repo.update(ObjectId(exhausted["image_id"]), {"analysis_status": "failed"})
+            job = await db_executor.run(
+                claim_next_job, jobs_collection, worker_id, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+            )
+        except Exception as e:
+            logger.error(f"Analysis job worker {worker_id} could not claim a job: {e}")
+            job = None
+        if job is None:
+            await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+            continue
+        await run_analysis_job(job)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
-    logger.debug(f"Creating access token for data: {data}")
+    logger.debug("Creating access token for user: %s", data.get("sub"))
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    logger.info(f"Access token created successfully for user: {data.get('sub')}")
+    logger.info("Access token created successfully for user: %s", data.get("sub"))
     return token
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
-    logger.debug(f"Decoding JWT token: {token}")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -161,27 +454,27 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
         if username is None or roles is None:
             logger.warning("Token is invalid: missing 'sub' or 'roles'")
             raise HTTPException(status_code=401, detail="Invalid token")
-        logger.info(f"Authenticated user: {username}")
+        logger.debug("Authenticated user: %s", username)
         return {"username": username, "roles": roles}
     except JWTError as e:
         logger.error(f"Token decoding failed: {e}")
         raise HTTPException(status_code=401, detail="Invalid token")
 
 def admin_required(current_user: dict = Depends(get_current_user)):
-    logger.debug(f"Checking admin privileges for user: {current_user}")
+    logger.debug("Checking admin privileges for user: %s", current_user["username"])
     if "admin" not in current_user["roles"]:
         logger.warning(f"Access denied for user: {current_user['username']}, insufficient privileges")
         raise HTTPException(status_code=403, detail="Access denied: Admins only")
-    logger.info(f"User {current_user['username']} has admin access")
+    logger.debug("User %s has admin access", current_user["username"])
     return current_user
 
 @app.post("/register")
 async def register_user(user_data: UserData):
     logger.info(f"Registering user: {user_data.username}")
-    if users_collection.find_one({"username": user_data.username}):
+    if await user_repo.find_by_username(user_data.username):
         logger.warning(f"Username already exists: {user_data.username}")
         raise HTTPException(status_code=400, detail="Username already exists")
-    if users_collection.find_one({"email": user_data.email}):
+    if await user_repo.find_by_email(user_data.email):
         logger.warning(f"Email already exists: {user_data.email}")
         raise HTTPException(status_code=400, detail="Email already exists")
 
@@ -194,19 +487,24 @@ async def register_user(user_data: UserData):
         "created_at": datetime.utcnow(),
         "last_login": None
     }
-    result = users_collection.insert_one(user_document)
-    logger.info(f"User {user_data.username} registered successfully with ID: {result.inserted_id}")
-    return {"success": True, "message": "User registered successfully", "user_id": str(result.inserted_id)}
+    try:
+        user_id = await user_repo.insert(user_document)
+    except DuplicateKeyError:
+        # Registered concurrently between the checks above and the insert
+        logger.warning(f"Username or email already exists: {user_data.username}")
+        raise HTTPException(status_code=400, detail="Username or email already exists")
+    logger.info(f"User {user_data.username} registered successfully with ID: {user_id}")
+    return {"success": True, "message": "User registered successfully", "user_id": str(user_id)}
 
 @app.post("/token", response_model=dict)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     logger.info(f"User login attempt: {form_data.username}")
-    user = users_collection.find_one({"username": form_data.username})
+    user = await user_repo.find_by_username(form_data.username)
     if not user:
         logger.warning(f"Login failed for username: {form_data.username}")
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
-    if not checkpw(form_data.password.encode(), user["password"].encode()):
+    if not await run_in_threadpool(checkpw, form_data.password.encode(), user["password"].encode()):
         logger.warning(f"Password validation failed for user: {form_data.username}")
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
@@ -219,24 +517,27 @@ async def create_case(case_data: CaseData, admin: dict = Depends(admin_required)
     logger.info(f"Creating new case: {case_data.caseName}")
     case_document = {
         "caseName": case_data.caseName,
-        "imageIds": [],
         "createdAt": datetime.utcnow()
     }
-    result = cases_collection.insert_one(case_document)
-    logger.info(f"Case {case_data.caseName} created successfully with ID: {result.inserted_id}")
+    try:
+        case_id = await case_repo.insert(case_document)
+    except DuplicateKeyError:
+        logger.warning(f"Case already exists: {case_data.caseName}")
+        raise HTTPException(status_code=400, detail="Case already exists")
+    logger.info(f"Case {case_data.caseName} created successfully with ID: {case_id}")
     return {
         "success": True,
         "message": "Case created successfully",
-        "case_id": str(result.inserted_id)
+        "case_id": str(case_id)
     }
 
-@app.post("/cases/{case_name}/upload-image")
-async def upload_image(
-    case_name: str,
-    file: UploadFile = File(...),
-    current_user: dict = Depends(get_current_user)
-):
-    logger.info(f"Uploading image for case: {case_name}, uploaded by: {current_user['username']}")
+def require_models_ready():
+    try:
+        models.require_ready()
+    except ModelsNotReady as e:
+        raise HTTPException(status_code=503, detail=f"Image analysis is not available yet: {e}")
+
+def require_upload_role(current_user):
     allowed_roles = {"admin", "macro_pathologist"}
     user_roles = set(current_user["roles"])
     if not allowed_roles.intersection(user_roles):
@@ -245,102 +546,96 @@ async def upload_image(
             status_code=403, detail="Access denied: Only admins or macro pathologists can upload images"
         )
 
-    # Check or create the case
-    case = cases_collection.find_one({"caseName": case_name})
-    if not case:
-        logger.debug(f"Case '{case_name}' not found. Creating new case.")
-        case_document = {
-            "caseName": case_name,
-            "imageIds": [],
-            "createdAt": datetime.utcnow()
-        }
-        result = cases_collection.insert_one(case_document)
-        case_id = result.inserted_id
-    else:
-        case_id = case["_id"]
-
-    # Read the file and process the image
-    file_content = await file.read()
-    logger.debug(f"File received: {file.filename}")
-
+async def get_or_create_case(case_name):
+    """Returns the ID of the case with the given name, creating the case if it does not exist."""
+    case = await case_repo.get_or_create(case_name)
+    return case["_id"]
+
+async def save_upload(file):
+    """Streams an uploaded file into the blob store. Returns (blob reference, content hash)."""
+    await file.seek(0)
+    return await run_in_threadpool(blob_store.save_stream, file.file)
+
+async def discard_upload(blob_ref):
+    """
+    Deletes the blob of an upload that was rejected before its image document was stored.
+    Blobs are shared by content hash, so one still referenced by a stored image is kept.
+    """
     try:
-        image = Image.open(io.BytesIO(file_content))
-        image_array = np.array(image)
-
-        # Process the image
-        _1cm = process_capsule(predictor, ort_session_capsule, image_array)
-        results_tissue = process_tissue(ort_session_tissue, image_array)
-
-        # Save analysis results
-        metadata_with_rle_list = []
-        test = []
-        for cls, bboxes in results_tissue.items():
-            for bbox, confidence in bboxes:
-                bbox = tuple(map(float, bbox))
-                grid_segments = generate_grid_segments(bbox, _1cm, (1, 1))
-                save_grid_segments(grid_segments)
-
-                # Segmentation results
-                tissue_masks, tissue_scores, _ = segment_bbox(predictor, image_array, bbox)
-                highest_score_mask = max(zip(tissue_masks, tissue_scores), key=lambda x: x[1])[0]
-                logger.info(highest_score_mask)
-
-                # Metadata for the mask
-                metadata = {
-                    "class": cls,
-                    "confidence": float(confidence),
-                    "bbox": bbox,
-                    "grid_segments": grid_segments
-                }
-
-                # Encode mask with metadata
-                test.append((metadata, highest_score_mask))
-                metadata_with_rle = encode_mask_with_metadata(highest_score_mask, metadata)
-                metadata_with_rle_list.append(metadata_with_rle)
-
-        # Compress metadata with RLE masks
-        compressed_data = compress_metadata_with_masks(metadata_with_rle_list)
-
-        # Decompress to verify integrity
-        #decompressed_data = decompress_metadata_with_masks(compressed_data)
-        #index = 0
-        #for metadata_with_rle in decompressed_data:
-            #mask, metadata = decode_mask_with_metadata(metadata_with_rle, image_array.shape[:2])
-            #visualize_grid_segments_opencv(metadata["grid_segments"], image_array, f"{index}.jpg")
-            #index += 1
-
-            # Visualize or process the mask
-        #    plt.figure(figsize=(8, 8))
-        #    plt.imshow(mask, cmap='gray', interpolation='nearest')
-        #    plt.title(f"Class: {metadata['class']}, Confidence: {metadata['confidence']}")
-        #    plt.colorbar(label="Value")
-        #    plt.axis('off')
-        #    plt.show()
-
+        if not await image_repo.references_blob(blob_ref):
+            await run_in_threadpool(blob_store.delete, blob_ref)
     except Exception as e:
-        logger.error(f"Error processing image: {e}")
-        raise HTTPException(
-            status_code=400, detail="Failed to process image. Please upload a valid image file."
-        )
+        logger.error(f"Could not delete blob {blob_ref['key']} of a rejected upload: {e}")
 
-    # Save the image and analysis results to the database
+async def discard_uploads(blob_refs):
+    """Like discard_upload for the blobs of a rejected batch upload, once per distinct blob."""
+    for blob_ref in {blob_ref["key"]: blob_ref for blob_ref in blob_refs}.values():
+        await discard_upload(blob_ref)
+
+async def store_image(case_id, file, blob_ref, content_hash, image_shape, compressed_data, analysis_status,
+                      current_user):
+    """Saves an image document referencing its blob and analysis results, links it to the case. Returns the image ID."""
     image_document = {
         "case_id": str(case_id),
         "filename": file.filename,
         "content_type": file.content_type,
-        "image_shape": image_array.shape[:2],
-        "data": file_content,
+        "content_hash": content_hash,
+        "image_shape": image_shape,
+        "blob": blob_ref,
+        "size": blob_ref["size"],
         "uploaded_at": datetime.utcnow(),
         "uploaded_by": current_user["username"],
-        "compressed_analysis_results": compressed_data  # Store compressed data here
+        "compressed_analysis_results": compressed_data,  # Store compressed data here
+        "analysis_summary": None,
+        "analysis_tissues": None,
+        "analysis_status": analysis_status
     }
-    image_result = images_collection.insert_one(image_document)
-    image_id = str(image_result.inserted_id)
+    if compressed_data is not None:
+        image_document.update(analysis_listing_fields(compressed_data))
+    # The image is linked to its case through case_id, see db_schema.INDEXES
+    image_id = str(await image_repo.insert(image_document))
+    if TILES_AT_INGEST:
+        tile_cache.prefetch(content_hash, lambda: blob_store.open(blob_ref))
+    return image_id
+
+@app.post("/cases/{case_name}/upload-image")
+async def upload_image(
+    case_name: str,
+    file: UploadFile = File(...),
+    async_analysis: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    logger.info(f"Uploading image for case: {case_name}, uploaded by: {current_user['username']}")
+    require_upload_role(current_user)
+    if not async_analysis:
+        require_models_ready()
+    case_id = await get_or_create_case(case_name)
+
+    # Store the file and process the image
+    blob_ref, content_hash = await save_upload(file)
+    logger.debug(f"File received: {file.filename}")
+
+    if async_analysis:
+        return await enqueue_image_analysis(case_name, case_id, file, blob_ref, content_hash, current_user)
 
-    # Link the image to the case
-    cases_collection.update_one(
-        {"_id": case_id},
-        {"$push": {"imageIds": image_id}}
+    try:
+        image_shape, compressed_data = await analyse_upload(blob_ref, content_hash)
+    except InferencePoolFull as e:
+        logger.warning(f"Rejecting upload for case {case_name}: {e}")
+        await discard_upload(blob_ref)
+        raise HTTPException(
+            status_code=503, detail="The image analysis queue is full. Please retry later."
+        )
+    except Exception as e:
+        logger.error(f"Error processing image: {e}")
+        await discard_upload(blob_ref)
+        raise HTTPException(
+            status_code=400, detail="Failed to process image. Please upload a valid image file."
+        )
+
+    # Save the image and analysis results to the database
+    image_id = await store_image(
+        case_id, file, blob_ref, content_hash, image_shape, compressed_data, "done", current_user
     )
 
     logger.info(f"Image {file.filename} uploaded successfully and associated with case: {case_name}")
@@ -351,71 +646,374 @@ async def upload_image(
         "image_id": image_id
     }
 
-@app.get("/cases/{case_name}/images", response_model=list)
-async def get_case_images(case_name: str, current_user: dict = Depends(get_current_user)):
-    logger.info(f"Fetching images for case: {case_name}, requested by: {current_user['username']}")
+@app.post("/cases/{case_name}/upload-images")
+async def upload_images(
+    case_name: str,
+    files: List[UploadFile] = File(...),
+    current_user: dict = Depends(get_current_user)
+):
+    logger.info(f"Uploading {len(files)} images for case: {case_name}, uploaded by: {current_user['username']}")
+    require_upload_role(current_user)
+    require_models_ready()
+    case_id = await get_or_create_case(case_name)
+
+    saved = [await save_upload(file) for file in files]
+    blob_refs = [blob_ref for blob_ref, _ in saved]
+    content_hashes = [content_hash for _, content_hash in saved]
+
+    try:
+        results = await analyse_uploads(blob_refs, content_hashes)
+    except InferencePoolFull as e:
+        logger.warning(f"Rejecting batch upload for case {case_name}: {e}")
+        await discard_uploads(blob_refs)
+        raise HTTPException(
+            status_code=503, detail="The image analysis queue is full. Please retry later."
+        )
+    except Exception as e:
+        logger.error(f"Error processing images: {e}")
+        await discard_uploads(blob_refs)
+        raise HTTPException(
+            status_code=400, detail="Failed to process images. Please upload valid image files."
+        )
+
+    image_ids = []
+    for file, blob_ref, content_hash, (image_shape, compressed_data) in zip(
+        files, blob_refs, content_hashes, results
+    ):
+        image_ids.append(await store_image(
+            case_id, file, blob_ref, content_hash, image_shape, compressed_data, "done", current_user
+        ))
+
+    logger.info(f"{len(files)} images uploaded successfully and associated with case: {case_name}")
+    return {
+        "success": True,
+        "message": f"{len(files)} images uploaded and associated with case '{case_name}'",
+        "case_id": str(case_id),
+        "image_ids": image_ids
+    }
+
+async def enqueue_image_analysis(case_name, case_id, file, blob_ref, content_hash, current_user):
+    """Stores an uploaded image without analysis results and queues its analysis job."""
+    image_id = await store_image(case_id, file, blob_ref, content_hash, None, None, "pending", current_user)
+    job_id = await db_executor.run(enqueue_job, jobs_collection, image_id, case_id, current_user["username"])
+
+    logger.info(f"Image {file.filename} stored for case {case_name}, analysis queued as job {job_id}")
+    return {
+        "success": True,
+        "message": f"Image uploaded to case '{case_name}', analysis queued",
+        "case_id": str(case_id),
+        "image_id": image_id,
+        "job_id": job_id
+    }
 
+@app.get("/jobs/{job_id}")
+async def get_analysis_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await db_executor.run(get_job, jobs_collection, job_id)
+    if not job:
+        logger.warning(f"Analysis job '{job_id}' not found")
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    # The uploader may follow their own job; anyone else needs access to the case's images
+    if job.get("requested_by") != current_user["username"]:
+        require_viewer_role(current_user)
+    return serialize_job(job)
+
+def require_viewer_role(current_user):
     allowed_roles = {"admin", "diagnostic_pathologist"}
     user_roles = set(current_user["roles"])
-
     if not allowed_roles.intersection(user_roles):
         logger.warning(f"Access denied for user {current_user['username']} to fetch images")
         raise HTTPException(
             status_code=403, detail="Access denied: Only admins or diagnostic pathologists can access case images"
         )
 
+def serialize_image(image):
+    """
+    Serializes an image document, read without pixel data, for the case listing. Mask outlines
+    are not included; viewers fetch them from /images/{image_id}/polygons when masks are shown.
+    """
+    image_id = str(image["_id"])
+    compressed_data = image.get("compressed_analysis_results")
+    summary, tissues = image.get("analysis_summary"), image.get("analysis_tissues")
+    if tissues is None and compressed_data:
+        # Documents stored before the listing fields were computed at ingest
+        try:
+            fields = analysis_listing_fields(compressed_data)
+            summary, tissues = summary or fields["analysis_summary"], fields["analysis_tissues"]
+        except (AnalysisFormatError, ValueError, KeyError) as e:
+            logger.warning(f"Unreadable analysis results of image {image_id}: {e}")
+    serialized_image = {
+        "_id": image_id,
+        "filename": image.get("filename", "unknown"),
+        "image_shape": image.get("image_shape", {}),
+        "analysis_status": image.get("analysis_status", "done"),
+        "analysis_summary": summary,
+        "image_url": f"/images/{image_id}",
+        "thumbnail_url": f"/images/{image_id}/thumbnail"
+    }
+    # The grids and coverage as plain JSON, so clients never decode the stored results
+    serialized_image["tissues"] = tissues or []
+    return serialized_image
+
+def iter_ndjson(cursor, limit):
+    """
+    Yields one JSON line per image of a Mongo cursor. When a page limit was given and the page
+    is full, a final {"next_cursor": ...} line tells the client where to continue.
+    """
+    last_id, count = None, 0
+    try:
+        for image in cursor:
+            last_id, count = image["_id"], count + 1
+            yield json.dumps(serialize_image(image)) + "\n"
+    finally:
+        cursor.close()
+    if limit and count == limit:
+        yield json.dumps({"next_cursor": str(last_id)}) + "\n"
+
+@app.get("/cases/{case_name}/images", response_model=list)
+async def get_case_images(
+    case_name: str,
+    limit: Optional[int] = None,
+    after: Optional[str] = None,
+    format: str = "json",
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Lists the images of a case with their analysis summaries and per-tissue metadata (class,
+    confidence, bounding box, grid and coverage). Neither pixel data nor the encoded masks are
+    included; image_url and thumbnail_url point to the streaming endpoints.
+
+    Images are ordered by ID. With `limit` the listing is paginated: pass the last returned
+    ID as `after` to get the next page. The X-Next-Cursor header (JSON) or a final
+    {"next_cursor": ...} line (NDJSON) is set whenever a page is full.
+    format=ndjson streams one image per line straight from the database cursor.
+    Mask outlines are served per image and level of detail by /images/{image_id}/polygons.
+    """
+    logger.info(f"Fetching images for case: {case_name}, requested by: {current_user['username']}")
+    require_viewer_role(current_user)
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
     # Fetch the case by name
-    case = cases_collection.find_one({"caseName": case_name})
+    case = await case_repo.find_by_name(case_name)
     if not case:
         logger.warning(f"Case '{case_name}' not found")
         raise HTTPException(status_code=404, detail=f"Case '{case_name}' not found")
 
-    # Retrieve all images linked to the case
-    image_ids = case.get("imageIds", [])
-    if not image_ids:
-        return []
+    # Images of the case through the (case_id, _id) index, read without inline pixel data
+    try:
+        after_id = ObjectId(after) if after else None
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid image cursor")
+    projection = {"data": 0, "thumbnail": 0}
+
+    if format == "ndjson":
+        # Starlette iterates the generator in a worker thread, one document at a time
+        cursor = image_repo.cursor_for_case(case["_id"], after_id, limit, projection)
+        return StreamingResponse(iter_ndjson(cursor, limit), media_type="application/x-ndjson")
 
-    # Convert image IDs to ObjectId and fetch corresponding images
     try:
-        object_ids = [ObjectId(image_id) for image_id in image_ids]
-        images = list(images_collection.find({"_id": {"$in": object_ids}}))
+        images = await image_repo.list_for_case(
+            case["_id"], after_id, limit, projection, serialize_image
+        )
     except Exception as e:
         logger.error(f"Error fetching images: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching images")
+    headers = {"X-Next-Cursor": images[-1]["_id"]} if limit and len(images) == limit else {}
+    return JSONResponse(content=images, headers=headers)
 
-    # Serialize images and encode binary data
-    serialized_images = []
-    for image in images:
-        serialized_image = {
-            "_id": str(image["_id"]),
-            "filename": image.get("filename", "unknown"),
-            "image_shape": image.get("image_shape", {}),
-            "compressed_analysis_results": image.get("compressed_analysis_results", "")
-        }
-
-        # Encode the binary 'data' field in Base64 if present
-        if "data" in image and isinstance(image["data"], bytes):
-            serialized_image["data"] = base64.b64encode(image["data"]).decode("utf-8")
-
-        serialized_images.append(serialized_image)
+async def find_image(image_id, projection=None):
+    try:
+        object_id = ObjectId(image_id)
+    except Exception:
+        raise HTTPException(status_code=404, detail=f"Image '{image_id}' not found")
+    image = await image_repo.find_by_id(object_id, projection)
+    if image is None:
+        raise HTTPException(status_code=404, detail=f"Image '{image_id}' not found")
+    return image
+
+def open_image_file(image):
+    """Opens the original file of an image document for streaming. Returns (file object, size)."""
+    if "blob" in image:
+        return blob_store.open(image["blob"]), image["blob"]["size"]
+    return io.BytesIO(image["data"]), len(image["data"])
+
+def image_validators(image, suffix=""):
+    """Returns the ETag and Last-Modified headers of an image (or of a derivative named by suffix)."""
+    etag = f'"{image.get("content_hash") or image["_id"]}{suffix}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if image.get("uploaded_at"):
+        headers["Last-Modified"] = http_date(image["uploaded_at"])
+    return headers
+
+@app.get("/images/{image_id}")
+async def get_image(image_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    """Streams the original image file, with conditional requests and single byte ranges."""
+    require_viewer_role(current_user)
+    image = await find_image(image_id, {"compressed_analysis_results": 0, "thumbnail": 0})
+    headers = image_validators(image)
+    if is_not_modified(request.headers, headers["ETag"], image.get("uploaded_at")):
+        return Response(status_code=304, headers=headers)
+
+    size = image["blob"]["size"] if "blob" in image else len(image["data"])
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    start, end = byte_range if byte_range else (0, size - 1)
+    headers.update({"Accept-Ranges": "bytes", "Content-Length": str(end - start + 1)})
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    fileobj, _ = await run_in_threadpool(open_image_file, image)
+    return StreamingResponse(
+        iter_file(fileobj, start, end - start + 1),
+        status_code=206 if byte_range else 200,
+        media_type=image.get("content_type") or "application/octet-stream",
+        headers=headers
+    )
 
-    return serialized_images
+def render_thumbnail(image):
+    """Renders the JPEG thumbnail of an image and stores it in the blob store. Returns (content, blob reference)."""
+    fileobj, _ = open_image_file(image)
+    with fileobj:
+        content = make_thumbnail(fileobj, THUMBNAIL_SIZE)
+    blob_ref, _ = blob_store.save_stream(io.BytesIO(content))
+    return content, blob_ref
+
+async def load_thumbnail(image):
+    """Returns the JPEG thumbnail of an image, rendering and storing it on first use."""
+    thumbnail = image.get("thumbnail")
+    if thumbnail and thumbnail.get("max_size") == THUMBNAIL_SIZE:
+        return await run_in_threadpool(blob_store.read, thumbnail["blob"])
+
+    content, blob_ref = await run_in_threadpool(render_thumbnail, image)
+    await image_repo.update(image["_id"], {"thumbnail": {"max_size": THUMBNAIL_SIZE, "blob": blob_ref}})
+    return content
+
+@app.get("/images/{image_id}/thumbnail")
+async def get_image_thumbnail(image_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    """Returns a JPEG thumbnail of an image for listings."""
+    require_viewer_role(current_user)
+    image = await find_image(image_id, {"compressed_analysis_results": 0})
+    headers = image_validators(image, f"-thumb{THUMBNAIL_SIZE}")
+    if is_not_modified(request.headers, headers["ETag"], image.get("uploaded_at")):
+        return Response(status_code=304, headers=headers)
+    content = await load_thumbnail(image)
+    return Response(content=content, media_type="image/jpeg", headers=headers)
+
+@app.get("/images/{image_id}/polygons")
+async def get_image_polygons(image_id: str, lod: Optional[int] = None, current_user: dict = Depends(get_current_user)):
+    """
+    Mask outlines of an image at one level of detail (0 is the coarsest, default the finest),
+    for viewers fetching detail as they zoom in. `levels` is the number of stored levels.
+    """
+    require_viewer_role(current_user)
+    if lod is not None and lod < 0:
+        raise HTTPException(status_code=400, detail="lod must not be negative")
+    image = await find_image(image_id, {"compressed_analysis_results": 1, "image_shape": 1})
+
+    def read():
+        lods = [entry_lods(entry, image.get("image_shape")) for entry in
+                read_analysis_results(image.get("compressed_analysis_results"))]
+        levels = max((len(mask_lods) for mask_lods in lods), default=0)
+        finest = max(levels - 1, 0)
+        level = finest if lod is None else min(lod, finest)
+        return {
+            "lod": level,
+            "levels": levels,
+            "masks": [mask_lods[min(level, len(mask_lods) - 1)] for mask_lods in lods]
+        }
+    return await run_in_threadpool(read)
+
+def image_size(image):
+    """Returns (width, height) of an image, from the analysis or, before it exists, the file header."""
+    if image.get("image_shape"):
+        height, width = image["image_shape"][:2]
+        return width, height
+    fileobj, _ = open_image_file(image)
+    with fileobj:
+        return Image.open(fileobj).size
+
+def tile_key(image):
+    return image.get("content_hash") or str(image["_id"])
+
+@app.get("/images/{image_id}/tiles.dzi")
+async def get_image_tiles_descriptor(image_id: str, current_user: dict = Depends(get_current_user)):
+    """Deep Zoom descriptor of an image; the tiles are under tiles_files/ next to it."""
+    require_viewer_role(current_user)
+    image = await find_image(image_id, {"compressed_analysis_results": 0, "thumbnail": 0})
+    width, height = await run_in_threadpool(image_size, image)
+    return Response(
+        content=dzi_descriptor(width, height, tile_cache.tile_size, tile_cache.tile_format),
+        media_type="application/xml",
+        headers=image_validators(image, "-dzi")
+    )
 
-    #analysis_result = []
-    #for image in images:
-    #    compressed_data = image.get('compressed_analysis_results')
-    #    decompressed_data = decompress_metadata_with_masks(compressed_data)
-    #    for metadata_with_rle in decompressed_data:
-    #        mask, metadata = decode_mask_with_metadata(metadata_with_rle, image.get("image_shape"))
-    #        analysis_result.append(mask, metadata)
-    #        logger.info(metadata)
+@app.get("/images/{image_id}/tiles_files/{level}/{tile}")
+async def get_image_tile(
+    image_id: str, level: int, tile: str, request: Request, current_user: dict = Depends(get_current_user)
+):
+    """Serves one pyramid tile, named <col>_<row>.<ext>. The first request of an image builds its pyramid."""
+    require_viewer_role(current_user)
+    name, _, extension = tile.partition(".")
+    col, _, row = name.partition("_")
+    if extension != tile_cache.extension or not col.isdigit() or not row.isdigit():
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    image = await find_image(image_id, {"compressed_analysis_results": 0, "thumbnail": 0})
+    headers = image_validators(image, f"-tile-{level}-{col}-{row}")
+    if is_not_modified(request.headers, headers["ETag"], image.get("uploaded_at")):
+        return Response(status_code=304, headers=headers)
+    content = await run_in_threadpool(
+        tile_cache.read_tile, tile_key(image), level, int(col), int(row), lambda: open_image_file(image)[0]
+    )
+    if content is None:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    return Response(content=content, media_type=tile_cache.media_type, headers=headers)
+
+@app.get("/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_user)):
+    metrics = {
+        "inference_pool": {"pending_jobs": pending_jobs()},
+        "analysis_cache": analysis_cache.stats(),
+        "tile_cache": tile_cache.stats()
+    }
+    if not models.is_ready():
+        return metrics
+    metrics["models"] = models.onnx_runtime.latency_stats()
+    if DETECTION_MICRO_BATCHING:
+        metrics["detection"] = {
+            name: detector.stats() if isinstance(detector, DetectionBatcher) else None
+            for name, detector in (("capsule", models.capsule_detector), ("tissue", models.tissue_detector))
+        }
+    return metrics
 
+@app.post("/admin/models/{model_name}/profile")
+async def profile_model(model_name: str, runs: int = 10, admin: dict = Depends(admin_required)):
+    require_models_ready()
+    if model_name not in models.onnx_runtime.sessions:
+        raise HTTPException(status_code=404, detail=f"Model '{model_name}' not found")
+    profile_path = await run_in_inference_pool(models.onnx_runtime.profile, model_name, runs)
+    return {"model": model_name, "runs": runs, "profile_path": profile_path}
 
 @app.post("/logout")
 async def logout():
     logger.info("User logged out successfully")
     return {"message": "Successfully logged out. Please remove the token on the client side."}
 
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    status = {"app_import_seconds": APP_IMPORT_SECONDS, **models.status()}
+    if not models.is_ready():
+        return JSONResponse(status_code=503, content=status)
+    return status
+
 @app.get("/")
 async def root():
     logger.info("Root endpoint accessed")
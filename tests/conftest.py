@@ -0,0 +1,49 @@
+import importlib
+import os
+import tempfile
+import pytest
+
+# Modules the backend application needs; tests using the backend fixture skip without them
+BACKEND_REQUIREMENTS = ("fastapi", "httpx", "multipart", "numpy", "cv2", "PIL", "bcrypt", "jose", "pymongo",
+                        "email_validator")
+
+def pytest_configure(config):
+    # The backend reads its settings when it is imported: run it on the in-memory database with
+    # its files in a scratch directory, without job workers, and with a small inference pool
+    root = tempfile.mkdtemp(prefix="backend-tests-")
+    os.environ.update({
+        "MONGO_URI": "memory://",
+        "BLOB_STORE": "local",
+        "BLOB_STORE_DIR": os.path.join(root, "blobs"),
+        "TILE_CACHE_DIR": os.path.join(root, "tiles"),
+        "LOG_FILE": os.path.join(root, "app.log"),
+        "ANALYSIS_JOB_WORKERS": "0",
+        "INFERENCE_WORKERS": "2",
+        "INFERENCE_MAX_PENDING": "2",
+    })
+
+@pytest.fixture(scope="session")
+def backend():
+    """The backend application module (main) on MONGO_URI=memory://."""
+    for module in BACKEND_REQUIREMENTS:
+        pytest.importorskip(module)
+    return importlib.import_module("main")
+
+@pytest.fixture(scope="session")
+def client(backend):
+    from fastapi.testclient import TestClient
+    with TestClient(backend.app) as client:
+        yield client
+
+@pytest.fixture
+def login(client):
+    """Registers a user with the given roles and returns the Authorization header of its token."""
+    def login(username, roles):
+        response = client.post("/register", json={
+            "username": username, "email": f"{username}@example.com", "password": "secret", "roles": roles
+        })
+        assert response.status_code == 200, response.text
+        response = client.post("/token", data={"username": username, "password": "secret"})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return login
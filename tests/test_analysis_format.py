@@ -0,0 +1,112 @@
+import base64
+import json
+import zlib
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from common.analysis_format import (
+    FORMAT_VERSION, MAGIC, AnalysisFormatError, decode_rle_deltas, decode_varints, encode_rle_deltas, encode_varints,
+    pack_analysis_results, read_analysis_metadata, read_analysis_results, unpack_analysis_results
+)
+
+def entries():
+    return [
+        {"rle": [0, 3, 10, 2, 200, 70000], "metadata": {"class": "tissue", "confidence": 0.9}},
+        {"packbits": bytes([0xFF, 0x00, 0x81]), "metadata": {"class": "capsule", "grid": None}},
+        {"rle": [], "metadata": {}},
+    ]
+
+def assert_entries_equal(decoded, expected):
+    assert len(decoded) == len(expected)
+    for got, want in zip(decoded, expected):
+        assert got["metadata"] == want["metadata"]
+        if "packbits" in want:
+            assert got["packbits"] == want["packbits"]
+        else:
+            assert np.asarray(got["rle"]).tolist() == want["rle"]
+
+@pytest.mark.parametrize("values", [
+    [],
+    [0],
+    [127, 128, 255, 16383, 16384],
+    [2 ** 32 - 1, 2 ** 35, 2 ** 63 - 1, 2 ** 64 - 1],
+    list(range(0, 1 << 20, 997)),
+])
+def test_varint_round_trip(values):
+    assert decode_varints(encode_varints(values)).tolist() == values
+
+def test_varint_encoding_is_leb128():
+    assert encode_varints([0, 127, 128, 300]) == bytes([0x00, 0x7F, 0x80, 0x01, 0xAC, 0x02])
+
+def test_truncated_varint():
+    with pytest.raises(AnalysisFormatError):
+        decode_varints(encode_varints([300])[:1])
+
+def test_rle_delta_round_trip():
+    rle = [5, 3, 8, 1, 100, 40, 1000, 1]
+    deltas = encode_rle_deltas(rle)
+    assert deltas.tolist() == [5, 3, 0, 1, 91, 40, 860, 1]
+    assert decode_rle_deltas(deltas).tolist() == rle
+    assert decode_rle_deltas(encode_rle_deltas([])).tolist() == []
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_container_round_trip(compress):
+    packed = pack_analysis_results(entries(), compress=compress)
+    assert packed[:4] == MAGIC
+    assert packed[4] == FORMAT_VERSION
+    assert_entries_equal(unpack_analysis_results(packed), entries())
+    assert_entries_equal(read_analysis_results(packed), entries())
+
+def test_packbits_given_as_base64():
+    entry = {"packbits": base64.b64encode(bytes([1, 2, 3])).decode("ascii"), "metadata": {}}
+    assert unpack_analysis_results(pack_analysis_results([entry]))[0]["packbits"] == bytes([1, 2, 3])
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_truncated_container(compress):
+    packed = pack_analysis_results(entries(), compress=compress)
+    for end in range(len(packed) - 1, 5, -max(1, len(packed) // 20)):
+        with pytest.raises(AnalysisFormatError):
+            unpack_analysis_results(packed[:end])
+
+def test_corrupt_compressed_body():
+    packed = bytearray(pack_analysis_results(entries()))
+    packed[8] ^= 0xFF
+    with pytest.raises(AnalysisFormatError):
+        unpack_analysis_results(bytes(packed))
+
+def test_unknown_mask_type():
+    body = encode_varints([1]) + bytes([7]) + encode_varints([2]) + b"{}" + encode_varints([0])
+    with pytest.raises(AnalysisFormatError, match="mask type"):
+        unpack_analysis_results(MAGIC + bytes([FORMAT_VERSION, 0]) + body)
+
+def test_bad_magic():
+    with pytest.raises(AnalysisFormatError):
+        unpack_analysis_results(b"XXXX" + pack_analysis_results(entries())[4:])
+
+@pytest.mark.parametrize("header", [MAGIC, MAGIC + bytes([FORMAT_VERSION + 1, 0])])
+def test_unknown_version(header):
+    with pytest.raises(AnalysisFormatError, match="version"):
+        unpack_analysis_results(header + pack_analysis_results(entries())[6:])
+
+def test_legacy_results():
+    legacy = [{"rle": [0, 3], "metadata": {"class": "tissue"}}]
+    stored = base64.b64encode(zlib.compress(json.dumps(legacy).encode("utf-8"))).decode("ascii")
+    assert read_analysis_results(stored) == legacy
+    assert read_analysis_results(stored.encode("ascii")) == legacy
+    assert read_analysis_results(None) == []
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_metadata_only(compress):
+    packed = pack_analysis_results(entries(), compress=compress)
+    assert read_analysis_metadata(packed) == [entry["metadata"] for entry in entries()]
+    with pytest.raises(AnalysisFormatError):
+        read_analysis_metadata(packed[:-1])
+
+def test_legacy_metadata():
+    legacy = [{"rle": [0, 3], "metadata": {"class": "tissue"}}]
+    stored = base64.b64encode(zlib.compress(json.dumps(legacy).encode("utf-8"))).decode("ascii")
+    assert read_analysis_metadata(stored) == [{"class": "tissue"}]
+    assert read_analysis_metadata(None) == []
+    with pytest.raises(AnalysisFormatError):
+        read_analysis_metadata(base64.b64encode(b"not zlib").decode("ascii"))
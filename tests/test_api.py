@@ -0,0 +1,179 @@
+import hashlib
+import io
+import os
+import uuid
+import pytest
+
+def unique(prefix):
+    return f"{prefix}-{uuid.uuid4().hex[:8]}"
+
+def png_bytes(width=8, height=6):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 120, 140)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+POLYGON_LODS = [[[0, 0, 3, 0, 3, 3]], [[0, 0, 3, 0, 3, 3, 0, 3]]]
+
+@pytest.fixture
+def analysis(backend, monkeypatch):
+    """Replaces the models with a stub analysis returning one tissue; returns the list of analysed sources."""
+    analysed = []
+
+    def analyse_image(source, timings=None, image_key=None):
+        analysed.append(source)
+        return (6, 8), backend.pack_analysis_results([{"rle": [0, 4], "metadata": {
+            "class": "tissue", "confidence": 0.9, "bbox": [0, 0, 4, 4],
+            "coverage": {"total_area_cm2": 0.5}, "polygon_lods": POLYGON_LODS
+        }}])
+
+    monkeypatch.setattr(backend, "analyse_image", analyse_image)
+    monkeypatch.setattr(backend, "ANALYSIS_CACHE_ENABLED", False)
+    monkeypatch.setattr(backend.models, "require_ready", lambda: None)
+    return analysed
+
+def upload(client, headers, case_name, content=None, **params):
+    return client.post(
+        f"/cases/{case_name}/upload-image", headers=headers, params=params,
+        files={"file": ("slide.png", content or png_bytes(), "image/png")}
+    )
+
+def test_health(client):
+    assert client.get("/health").json() == {"status": "ok"}
+
+def test_register_and_login(client, login):
+    username = unique("user")
+    assert "Authorization" in login(username, ["diagnostic_pathologist"])
+
+    duplicate = client.post("/register", json={
+        "username": username, "email": f"{unique('other')}@example.com", "password": "secret"
+    })
+    assert duplicate.status_code == 400
+    duplicate_email = client.post("/register", json={
+        "username": unique("other"), "email": f"{username}@example.com", "password": "secret"
+    })
+    assert duplicate_email.status_code == 400
+
+    assert client.post("/token", data={"username": username, "password": "wrong"}).status_code == 401
+    assert client.post("/token", data={"username": unique("nobody"), "password": "secret"}).status_code == 401
+    assert client.get("/cases/x/images", headers={"Authorization": "Bearer invalid"}).status_code == 401
+
+def test_create_case(client, login):
+    admin = login(unique("admin"), ["admin"])
+    case_name = unique("case")
+    assert client.post("/cases", json={"caseName": case_name}, headers=admin).status_code == 200
+    assert client.post("/cases", json={"caseName": case_name}, headers=admin).status_code == 400
+
+    pathologist = login(unique("user"), ["diagnostic_pathologist"])
+    assert client.post("/cases", json={"caseName": unique("case")}, headers=pathologist).status_code == 403
+
+def test_case_listing_errors(client, login):
+    viewer = login(unique("viewer"), ["diagnostic_pathologist"])
+    admin = login(unique("admin"), ["admin"])
+    case_name = unique("case")
+    client.post("/cases", json={"caseName": case_name}, headers=admin)
+
+    assert client.get(f"/cases/{case_name}/images", headers=viewer).json() == []
+    assert client.get(f"/cases/{unique('case')}/images", headers=viewer).status_code == 404
+    assert client.get(f"/cases/{case_name}/images", headers=login(unique("user"), ["user"])).status_code == 403
+    for params in ({"after": "not-an-id"}, {"limit": 0}, {"limit": 100000}, {"format": "xml"}):
+        assert client.get(f"/cases/{case_name}/images", headers=viewer, params=params).status_code == 400
+
+def test_upload_requires_role(client, login, analysis):
+    viewer = login(unique("viewer"), ["diagnostic_pathologist"])
+    assert upload(client, viewer, unique("case")).status_code == 403
+    assert analysis == []
+
+def test_upload_and_view(client, login, analysis):
+    uploader = login(unique("uploader"), ["macro_pathologist"])
+    viewer = login(unique("viewer"), ["diagnostic_pathologist"])
+    case_name = unique("case")
+    content = png_bytes()
+
+    response = upload(client, uploader, case_name, content)
+    assert response.status_code == 200, response.text
+    image_id = response.json()["image_id"]
+    assert len(analysis) == 1
+
+    images = client.get(f"/cases/{case_name}/images", headers=viewer).json()
+    assert [image["_id"] for image in images] == [image_id]
+    image = images[0]
+    assert image["image_shape"] == [6, 8] and image["analysis_status"] == "done"
+    assert image["analysis_summary"] == {"tissues": 1, "classes": ["tissue"], "tissue_area_cm2": 0.5}
+    assert image["tissues"] == [{
+        "class": "tissue", "confidence": 0.9, "bbox": [0, 0, 4, 4], "coverage": {"total_area_cm2": 0.5}
+    }]
+
+    original = client.get(image["image_url"], headers=viewer)
+    assert original.status_code == 200 and original.content == content
+    not_modified = client.get(image["image_url"], headers={**viewer, "If-None-Match": original.headers["ETag"]})
+    assert not_modified.status_code == 304
+    partial = client.get(image["image_url"], headers={**viewer, "Range": "bytes=0-9"})
+    assert partial.status_code == 206 and partial.content == content[:10]
+    assert client.get(image["image_url"], headers={**viewer, "Range": "bytes=100000-"}).status_code == 416
+
+    thumbnail = client.get(image["thumbnail_url"], headers=viewer)
+    assert thumbnail.status_code == 200 and thumbnail.headers["content-type"] == "image/jpeg"
+
+    polygons = client.get(f"/images/{image_id}/polygons", headers=viewer).json()
+    assert polygons == {"lod": 1, "levels": 2, "masks": [POLYGON_LODS[1]]}
+    coarse = client.get(f"/images/{image_id}/polygons", headers=viewer, params={"lod": 0}).json()
+    assert coarse["masks"] == [POLYGON_LODS[0]]
+    assert client.get(f"/images/{image_id}/polygons", headers=viewer, params={"lod": -1}).status_code == 400
+
+    assert client.get(image["image_url"], headers=uploader).status_code == 403
+    assert client.get("/images/not-an-id", headers=viewer).status_code == 404
+
+def test_listing_pagination(client, login, analysis):
+    uploader = login(unique("uploader"), ["admin"])
+    case_name = unique("case")
+    image_ids = [upload(client, uploader, case_name, png_bytes(8 + index)).json()["image_id"] for index in range(3)]
+
+    first = client.get(f"/cases/{case_name}/images", headers=uploader, params={"limit": 2})
+    assert [image["_id"] for image in first.json()] == image_ids[:2]
+    assert first.headers["X-Next-Cursor"] == image_ids[1]
+    rest = client.get(f"/cases/{case_name}/images", headers=uploader, params={"limit": 2, "after": image_ids[1]})
+    assert [image["_id"] for image in rest.json()] == image_ids[2:]
+    assert "X-Next-Cursor" not in rest.headers
+
+    lines = client.get(
+        f"/cases/{case_name}/images", headers=uploader, params={"format": "ndjson", "limit": 3}
+    ).text.splitlines()
+    assert len(lines) == 4 and image_ids[2] in lines[2] and image_ids[2] in lines[3]
+
+def blob_exists(backend, content):
+    return os.path.exists(backend.blob_store.path({"key": hashlib.sha256(content).hexdigest()}))
+
+def test_failed_analysis(client, login, analysis, backend, monkeypatch):
+    admin = login(unique("admin"), ["admin"])
+    stored = png_bytes(21)
+    assert upload(client, admin, unique("case"), stored).status_code == 200
+
+    def fail(source, timings=None, image_key=None):
+        raise ValueError("not a slide")
+
+    monkeypatch.setattr(backend, "analyse_image", fail)
+    case_name = unique("case")
+    rejected = png_bytes(22)
+    assert upload(client, admin, case_name, rejected).status_code == 400
+    assert client.get(f"/cases/{case_name}/images", headers=admin).json() == []
+    assert not blob_exists(backend, rejected)
+
+    # The blob of a rejected upload is kept while a stored image has the same content
+    assert upload(client, admin, case_name, stored).status_code == 400
+    assert blob_exists(backend, stored)
+
+def test_analysis_job(client, login, analysis):
+    uploader = login(unique("uploader"), ["macro_pathologist"])
+    response = upload(client, uploader, unique("case"), async_analysis=True)
+    assert response.status_code == 200, response.text
+    job_id = response.json()["job_id"]
+    # Without job workers the job stays pending
+    assert analysis == []
+
+    job = client.get(f"/jobs/{job_id}", headers=uploader).json()
+    assert job["job_id"] == job_id and job["status"] == "pending"
+    assert job["image_id"] == response.json()["image_id"]
+    assert client.get(f"/jobs/{job_id}", headers=login(unique("other"), ["macro_pathologist"])).status_code == 403
+    assert client.get(f"/jobs/{job_id}", headers=login(unique("viewer"), ["diagnostic_pathologist"])).status_code == 200
+    assert client.get("/jobs/not-a-job", headers=uploader).status_code == 404
@@ -0,0 +1,49 @@
+from datetime import datetime
+import pytest
+
+pytest.importorskip("PIL")
+
+from backend.scripts.image_streaming import RangeNotSatisfiable, http_date, is_not_modified, parse_range
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=90-200", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=-", None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=100-", 100), ("bytes=5-4", 100), ("bytes=-0", 100), ("bytes=0-", 0), ("bytes=-10", 0), ("bytes=0-0", 0),
+])
+def test_unsatisfiable_range(header, size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, size)
+
+def test_empty_file_without_range():
+    assert parse_range(None, 0) is None
+
+UPLOADED_AT = datetime(2026, 10, 17, 10, 0, 0, 500)
+
+@pytest.mark.parametrize("since, expected", [
+    (http_date(UPLOADED_AT), True),
+    ("Sat, 17 Oct 2026 09:59:59 GMT", False),
+    ("Sat, 17 Oct 2026 10:00:00 -0000", True),
+    ("Sat, 17 Oct 2026 09:59:59 -0000", False),
+    ("Sat, 17 Oct 2026 12:00:00 +0200", True),
+    ("not a date", False),
+])
+def test_if_modified_since(since, expected):
+    assert is_not_modified({"if-modified-since": since}, '"etag"', UPLOADED_AT) is expected
+
+def test_if_none_match_takes_precedence():
+    headers = {"if-none-match": '"other", "etag"', "if-modified-since": "Sat, 17 Oct 2000 10:00:00 GMT"}
+    assert is_not_modified(headers, '"etag"', UPLOADED_AT)
+    assert not is_not_modified({"if-none-match": '"other"'}, '"etag"', UPLOADED_AT)
+    assert is_not_modified({"if-none-match": "*"}, '"etag"', None)
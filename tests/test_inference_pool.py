@@ -0,0 +1,65 @@
+import threading
+import time
+import pytest
+from test_api import png_bytes, unique, upload
+
+# Login must stay this fast while every inference worker is busy
+LOGIN_BOUND_SECONDS = 2.0
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+@pytest.fixture
+def blocked_analysis(backend, monkeypatch):
+    """A stub analysis that holds its inference worker until the returned event is set."""
+    release = threading.Event()
+
+    def analyse_image(source, timings=None, image_key=None):
+        release.wait(30)
+        return (6, 8), backend.pack_analysis_results([])
+
+    monkeypatch.setattr(backend, "analyse_image", analyse_image)
+    monkeypatch.setattr(backend, "ANALYSIS_CACHE_ENABLED", False)
+    monkeypatch.setattr(backend.models, "require_ready", lambda: None)
+    yield release
+    release.set()
+
+def test_login_and_rejection_while_pool_is_saturated(client, login, backend, blocked_analysis):
+    from backend.scripts import inference_pool
+    assert inference_pool.INFERENCE_MAX_PENDING == inference_pool.INFERENCE_WORKERS == 2
+
+    username = unique("uploader")
+    headers = login(username, ["macro_pathologist"])
+    case_name = unique("case")
+    responses = []
+    uploads = [
+        threading.Thread(target=lambda index=index: responses.append(
+            upload(client, headers, case_name, png_bytes(8 + index))
+        ))
+        for index in range(2)
+    ]
+    for thread in uploads:
+        thread.start()
+    try:
+        assert wait_for(lambda: inference_pool.pending_jobs() == 2)
+
+        start = time.perf_counter()
+        token = client.post("/token", data={"username": username, "password": "secret"})
+        assert token.status_code == 200
+        assert time.perf_counter() - start < LOGIN_BOUND_SECONDS
+
+        rejected = upload(client, headers, case_name, png_bytes(16))
+        assert rejected.status_code == 503
+        assert inference_pool.pending_jobs() == 2
+    finally:
+        blocked_analysis.set()
+        for thread in uploads:
+            thread.join(30)
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert inference_pool.pending_jobs() == 0
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("pymongo")
+
+from backend.scripts.jobs import (
+    JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_RUNNING, claim_next_job, complete_job, enqueue_job, fail_job, get_job,
+    release_job, renew_lease
+)
+from backend.scripts.memory_db import InMemoryDatabase
+
+LEASE_SECONDS = 60
+
+@pytest.fixture
+def jobs():
+    return InMemoryDatabase("test")["AnalysisJobs"]
+
+def expire_lease(jobs, job_id):
+    job = get_job(jobs, job_id)
+    jobs.update_one({"_id": job["_id"]}, {"$set": {"claimed_at": datetime.utcnow() - timedelta(seconds=LEASE_SECONDS + 1)}})
+
+def test_complete_and_fail_require_the_claim(jobs):
+    job_id = enqueue_job(jobs, "image", "case")
+    assert claim_next_job(jobs, "worker-a", LEASE_SECONDS, 3)["claimed_by"] == "worker-a"
+
+    assert not complete_job(jobs, job_id, "worker-b", {})
+    assert not fail_job(jobs, job_id, "worker-b", "error", {})
+    assert not release_job(jobs, job_id, "worker-b")
+    assert get_job(jobs, job_id)["status"] == JOB_RUNNING
+
+    assert complete_job(jobs, job_id, "worker-a", {"total": 1.0})
+    assert get_job(jobs, job_id)["status"] == JOB_DONE
+    # A finished job is not failed or released by its former worker
+    assert not fail_job(jobs, job_id, "worker-a", "error", {})
+    assert not release_job(jobs, job_id, "worker-a")
+    assert get_job(jobs, job_id)["status"] == JOB_DONE
+
+def test_reclaimed_job_ignores_the_previous_worker(jobs):
+    job_id = enqueue_job(jobs, "image", "case")
+    claim_next_job(jobs, "worker-a", LEASE_SECONDS, 3)
+    expire_lease(jobs, job_id)
+    assert claim_next_job(jobs, "worker-b", LEASE_SECONDS, 3)["claimed_by"] == "worker-b"
+
+    assert not renew_lease(jobs, job_id, "worker-a")
+    assert not fail_job(jobs, job_id, "worker-a", "timeout", {})
+    assert fail_job(jobs, job_id, "worker-b", "error", {})
+    job = get_job(jobs, job_id)
+    assert (job["status"], job["error"], job["attempts"]) == (JOB_FAILED, "error", 2)
+
+def test_renewed_lease_is_not_reclaimed(jobs):
+    job_id = enqueue_job(jobs, "image", "case")
+    claim_next_job(jobs, "worker-a", LEASE_SECONDS, 3)
+    expire_lease(jobs, job_id)
+    assert renew_lease(jobs, job_id, "worker-a")
+    assert claim_next_job(jobs, "worker-b", LEASE_SECONDS, 3) is None
+
+def test_release_does_not_count_the_attempt(jobs):
+    job_id = enqueue_job(jobs, "image", "case")
+    claim_next_job(jobs, "worker-a", LEASE_SECONDS, 3)
+    assert release_job(jobs, job_id, "worker-a")
+    job = get_job(jobs, job_id)
+    assert (job["status"], job["attempts"], job["claimed_by"]) == (JOB_PENDING, 0, None)
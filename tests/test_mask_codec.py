@@ -0,0 +1,77 @@
+import json
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from common.analysis_format import pack_analysis_results, unpack_analysis_results
+from common.mask_codec import (
+    MASK_CODECS, decode_mask_crop, decode_mask_with_metadata, encode_mask_with_metadata, mask_bbox
+)
+
+def random_mask(rng, shape, kind):
+    if kind == "sparse":
+        return rng.random(shape) < rng.uniform(0.0, 0.05)
+    if kind == "dense":
+        return rng.random(shape) < rng.uniform(0.5, 1.0)
+    if kind == "blobs":
+        mask = np.zeros(shape, dtype=bool)
+        for _ in range(rng.integers(1, 6)):
+            y, x = rng.integers(shape[0]), rng.integers(shape[1])
+            mask[y:y + rng.integers(1, shape[0] + 1), x:x + rng.integers(1, shape[1] + 1)] = True
+        return mask
+    if kind == "empty":
+        return np.zeros(shape, dtype=bool)
+    if kind == "full":
+        return np.ones(shape, dtype=bool)
+    # Foreground in the first and the last pixel
+    mask = rng.random(shape) < 0.3
+    mask.flat[0] = mask.flat[-1] = True
+    return mask
+
+MASK_KINDS = ("sparse", "dense", "blobs", "empty", "full", "edges")
+
+def masks(kind, count=25, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        shape = (int(rng.integers(1, 64)), int(rng.integers(1, 64)))
+        yield random_mask(rng, shape, kind)
+
+@pytest.mark.parametrize("codec", MASK_CODECS)
+@pytest.mark.parametrize("kind", MASK_KINDS)
+def test_round_trip_through_json(codec, kind):
+    for index, mask in enumerate(masks(kind)):
+        # Through JSON, as the masks are stored
+        encoded = json.loads(json.dumps(encode_mask_with_metadata(mask, {"case": index}, codec)))
+        decoded, metadata = decode_mask_with_metadata(encoded, mask.shape)
+        assert decoded.shape == mask.shape
+        np.testing.assert_array_equal(decoded != 0, mask)
+        assert metadata == {"case": index}
+
+@pytest.mark.parametrize("codec", MASK_CODECS)
+@pytest.mark.parametrize("kind", MASK_KINDS)
+def test_cropped_round_trip_through_container(codec, kind):
+    for index, mask in enumerate(masks(kind, seed=1)):
+        entry = encode_mask_with_metadata(mask.astype(np.uint8), {"case": index}, codec, crop=True)
+        encoded = unpack_analysis_results(pack_analysis_results([entry]))[0]
+        decoded, _ = decode_mask_with_metadata(encoded, mask.shape)
+        np.testing.assert_array_equal(decoded != 0, mask)
+
+        crop, (x, y), metadata = decode_mask_crop(encoded, mask.shape)
+        full = np.zeros(mask.shape, dtype=bool)
+        full[y:y + crop.shape[0], x:x + crop.shape[1]] = crop != 0
+        np.testing.assert_array_equal(full, mask)
+        assert metadata["case"] == index
+
+def test_crop_is_bounding_box():
+    mask = np.zeros((40, 50), dtype=np.uint8)
+    mask[10:20, 5:45] = 1
+    entry = encode_mask_with_metadata(mask, {}, "rle", crop=True)
+    crop, offset, _ = decode_mask_crop(entry, mask.shape)
+    assert offset == (5, 10)
+    assert crop.shape == (10, 40)
+
+def test_mask_bbox():
+    mask = np.zeros((30, 20), dtype=np.uint8)
+    assert mask_bbox(mask) == (0, 0, 0, 0)
+    mask[0, 19] = mask[29, 3] = 1
+    assert tuple(mask_bbox(mask)) == (3, 0, 17, 30)
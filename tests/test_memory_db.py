@@ -0,0 +1,156 @@
+import threading
+import pytest
+
+pytest.importorskip("pymongo")
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from backend.scripts.memory_db import InMemoryDatabase, matches
+
+DOCUMENT = {
+    "name": "a", "size": 5, "tags": ["x", "y"], "nested": {"status": "running", "count": 2},
+    "data": b"raw", "missing_value": None
+}
+
+@pytest.mark.parametrize("query, expected", [
+    ({}, True),
+    ({"name": "a"}, True),
+    ({"name": "b"}, False),
+    ({"nested.status": "running"}, True),
+    ({"nested.unknown": None}, True),
+    ({"tags": "x"}, True),
+    ({"tags": "z"}, False),
+    ({"size": {"$gt": 4, "$lte": 5}}, True),
+    ({"size": {"$lt": 5}}, False),
+    ({"size": {"$gte": "text"}}, False),
+    ({"name": {"$in": ["a", "b"]}}, True),
+    ({"name": {"$nin": ["a"]}}, False),
+    ({"name": {"$ne": "b"}}, True),
+    ({"name": {"$eq": "a"}}, True),
+    ({"absent": {"$exists": False}}, True),
+    ({"missing_value": {"$exists": True}}, True),
+    ({"name": {"$type": "string"}}, True),
+    ({"data": {"$type": "binData"}}, True),
+    ({"size": {"$type": "string"}}, False),
+    ({"$or": [{"name": "b"}, {"size": 5}]}, True),
+    ({"$or": [{"name": "b"}, {"size": 6}]}, False),
+    ({"$and": [{"name": "a"}, {"nested.count": {"$gte": 2}}]}, True),
+    # A dict without operators is compared as a value
+    ({"nested": {"status": "running", "count": 2}}, True),
+])
+def test_matches(query, expected):
+    assert matches(DOCUMENT, query) is expected
+
+@pytest.fixture
+def collection():
+    return InMemoryDatabase("test")["items"]
+
+def test_insert_and_find_copies_documents(collection):
+    document = {"name": "a", "nested": {"value": 1}}
+    inserted_id = collection.insert_one(document).inserted_id
+    assert isinstance(inserted_id, ObjectId) and document["_id"] == inserted_id
+
+    document["nested"]["value"] = 2
+    found = collection.find_one({"_id": inserted_id})
+    assert found["nested"]["value"] == 1
+    found["nested"]["value"] = 3
+    assert collection.find_one({"_id": inserted_id})["nested"]["value"] == 1
+
+def test_projection(collection):
+    collection.insert_one({"name": "a", "size": 1, "data": b"x"})
+    assert set(collection.find_one({}, {"data": 0})) == {"_id", "name", "size"}
+    assert set(collection.find_one({}, {"name": 1})) == {"_id", "name"}
+    assert set(collection.find_one({}, {"name": 1, "_id": 0})) == {"name"}
+
+def test_sort_limit_and_pagination(collection):
+    collection.insert_many([{"group": group, "rank": rank} for group, rank in [(2, 1), (1, 2), (1, 1), (None, 0)]])
+    documents = list(collection.find({}).sort([("group", 1), ("rank", -1)]))
+    assert [(d.get("group"), d["rank"]) for d in documents] == [(None, 0), (1, 2), (1, 1), (2, 1)]
+
+    ids = [d["_id"] for d in collection.find({}).sort("_id", 1)]
+    page = list(collection.find({"_id": {"$gt": ids[0]}}).sort("_id", 1).limit(2))
+    assert [d["_id"] for d in page] == ids[1:3]
+    assert collection.count_documents({"group": 1}) == 2
+
+def test_unique_index(collection):
+    collection.create_index([("name", 1)], unique=True)
+    collection.insert_one({"name": "a"})
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_one({"name": "a"})
+    other = collection.insert_one({"name": "b"}).inserted_id
+    with pytest.raises(DuplicateKeyError):
+        collection.update_one({"_id": other}, {"$set": {"name": "a"}})
+    assert collection.find_one({"_id": other})["name"] == "b"
+
+def test_update_operators(collection):
+    document_id = collection.insert_one({"count": 1, "log": [], "old": True}).inserted_id
+    result = collection.update_one({"_id": document_id}, {
+        "$inc": {"count": 2, "new_counter": 1}, "$push": {"log": {"event": "a"}},
+        "$unset": {"old": ""}, "$set": {"nested.value": 5}, "$setOnInsert": {"ignored": True}
+    })
+    assert (result.matched_count, result.modified_count) == (1, 1)
+    document = collection.find_one({"_id": document_id})
+    assert document["count"] == 3 and document["new_counter"] == 1
+    assert document["log"] == [{"event": "a"}] and document["nested"] == {"value": 5}
+    assert "old" not in document and "ignored" not in document
+
+    unchanged = collection.update_one({"_id": document_id}, {"$set": {"count": 3}})
+    assert (unchanged.matched_count, unchanged.modified_count) == (1, 0)
+    assert collection.update_one({"_id": ObjectId()}, {"$set": {"count": 0}}).matched_count == 0
+
+def test_upsert(collection):
+    result = collection.update_one({"key": "k", "size": {"$gt": 1}}, {"$setOnInsert": {"value": 1}}, upsert=True)
+    assert result.upserted_id is not None
+    # Only the equality conditions of the query become fields of the new document
+    document = collection.find_one({"_id": result.upserted_id})
+    assert document["key"] == "k" and document["value"] == 1 and "size" not in document
+
+    after = collection.find_one_and_update(
+        {"key": "other"}, {"$setOnInsert": {"value": 2}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    assert after["key"] == "other" and after["value"] == 2
+
+def test_find_one_and_update(collection):
+    collection.insert_many([{"status": "queued", "priority": priority} for priority in (2, 1, 3)])
+    before = collection.find_one_and_update(
+        {"status": "queued"}, {"$set": {"status": "running"}}, sort=[("priority", 1)]
+    )
+    assert before["status"] == "queued" and before["priority"] == 1
+    after = collection.find_one_and_update(
+        {"status": "queued"}, {"$set": {"status": "running"}}, sort=[("priority", -1)],
+        return_document=ReturnDocument.AFTER
+    )
+    assert after["status"] == "running" and after["priority"] == 3
+    assert collection.count_documents({"status": "running"}) == 2
+    assert collection.find_one_and_update({"status": "done"}, {"$set": {"status": "x"}}) is None
+
+def test_delete_one(collection):
+    collection.insert_many([{"name": "a"}, {"name": "a"}])
+    assert collection.delete_one({"name": "a"}).deleted_count == 1
+    assert collection.delete_one({"name": "b"}).deleted_count == 0
+    assert collection.count_documents({}) == 1
+
+def test_concurrent_claims_are_exclusive(collection):
+    collection.insert_many([{"status": "queued"} for _ in range(50)])
+    claimed = []
+
+    def claim():
+        while True:
+            job = collection.find_one_and_update({"status": "queued"}, {"$set": {"status": "running"}})
+            if job is None:
+                return
+            claimed.append(job["_id"])
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(claimed) == len(set(claimed)) == 50
+
+def test_database_collections():
+    db = InMemoryDatabase("test")
+    assert db["a"] is db["a"]
+    db["b"]
+    assert sorted(db.list_collection_names()) == ["a", "b"]
@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from backend.scripts.onnx_interference import onnx_prediction, onnx_prediction_batch
+
+class FailingSession:
+    """An ONNX session stand-in with a fixed batch size whose runs fail."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def get_inputs(self):
+        return [SimpleNamespace(name="input", shape=[self.batch_size, 3, 640, 640])]
+
+    def get_outputs(self):
+        return [SimpleNamespace(name="output")]
+
+    def run(self, outputs, feed):
+        raise RuntimeError("session failed")
+
+def test_prediction_errors_are_raised():
+    image = np.zeros((32, 32, 3), dtype=np.uint8)
+    tensor = np.zeros((1, 3, 640, 640), dtype=np.uint8)
+    with pytest.raises(RuntimeError, match="session failed"):
+        onnx_prediction(image, FailingSession(1), tensor)
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_batch_prediction_errors_are_raised(batch_size):
+    images = [np.zeros((32, 32, 3), dtype=np.uint8)] * 2
+    tensors = [np.zeros((1, 3, 640, 640), dtype=np.uint8)] * 2
+    with pytest.raises(RuntimeError, match="session failed"):
+        onnx_prediction_batch(images, FailingSession(batch_size), 4, tensors)
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+
+pytest.importorskip("pymongo")
+
+from pymongo.errors import DuplicateKeyError
+from backend.scripts.database import DatabaseExecutor
+from backend.scripts.memory_db import InMemoryDatabase
+from backend.scripts.repositories import CaseRepository, ImageRepository, UserRepository
+
+@pytest.fixture
+def executor():
+    executor = DatabaseExecutor(max_workers=4)
+    yield executor
+    executor.shutdown()
+
+@pytest.fixture
+def db():
+    db = InMemoryDatabase("test")
+    db["Users"].create_index([("username", 1)], unique=True)
+    db["Users"].create_index([("email", 1)], unique=True)
+    db["Cases"].create_index([("caseName", 1)], unique=True)
+    return db
+
+def test_users(db, executor):
+    users = UserRepository(db["Users"], executor)
+
+    async def scenario():
+        user_id = await users.insert({"username": "alice", "email": "alice@example.com"})
+        assert (await users.find_by_username("alice"))["_id"] == user_id
+        assert (await users.find_by_email("alice@example.com"))["_id"] == user_id
+        assert await users.find_by_username("bob") is None
+        with pytest.raises(DuplicateKeyError):
+            await users.insert({"username": "alice", "email": "other@example.com"})
+
+    asyncio.run(scenario())
+
+def test_case_get_or_create(db, executor):
+    cases = CaseRepository(db["Cases"], executor)
+
+    async def scenario():
+        created = await asyncio.gather(*(cases.get_or_create("case") for _ in range(10)))
+        assert len({case["_id"] for case in created}) == 1
+        assert created[0]["caseName"] == "case" and "createdAt" in created[0]
+        assert (await cases.find_by_name("case"))["_id"] == created[0]["_id"]
+        with pytest.raises(DuplicateKeyError):
+            await cases.insert({"caseName": "case"})
+
+    asyncio.run(scenario())
+    assert db["Cases"].count_documents({}) == 1
+
+def test_images_for_case(db, executor):
+    images = ImageRepository(db["Images"], executor)
+
+    async def scenario():
+        ids = [await images.insert({"case_id": "c1", "index": index, "data": b"x"}) for index in range(5)]
+        await images.insert({"case_id": "c2", "index": 5})
+        await images.update(ids[0], {"status": "done"})
+        assert (await images.find_by_id(ids[0]))["status"] == "done"
+        assert "data" not in await images.find_by_id(ids[0], {"data": 0})
+
+        listed = await images.list_for_case("c1", projection={"data": 0}, transform=lambda image: image["index"])
+        assert listed == [0, 1, 2, 3, 4]
+        page = await images.list_for_case("c1", after=ids[1], limit=2, transform=lambda image: image["_id"])
+        assert page == ids[2:4]
+        assert await images.list_for_case("c1", after=ids[-1]) == []
+        assert [image["index"] for image in images.cursor_for_case("c2")] == [5]
+
+    asyncio.run(scenario())
+
+def test_blob_references(db, executor):
+    images = ImageRepository(db["Images"], executor)
+
+    async def scenario():
+        image_id = await images.insert({"case_id": "c1", "blob": {"key": "a"}})
+        await images.update(image_id, {"thumbnail": {"max_size": 256, "blob": {"key": "t"}}})
+        assert await images.references_blob({"key": "a"})
+        assert await images.references_blob({"key": "t"})
+        assert not await images.references_blob({"key": "b"})
+
+    asyncio.run(scenario())
@@ -0,0 +1,105 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from backend.scripts.process_tissue import SegmentationSession
+
+HEIGHT, WIDTH = 48, 64
+
+class StubPredictor:
+    """
+    Deterministic stand-in for SAM2ImagePredictor. Every box yields three candidate masks (the box
+    shrunk by 0, 2 and 4 pixels) scored so that the middle one wins. Like SAM2, the single-mask
+    output is a prediction of its own rather than the best candidate: the box shrunk by 1 pixel.
+    Counts the calls and the boxes per call.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def set_image(self, image):
+        self.image_shape = image.shape[:2]
+
+    def _candidates(self, box):
+        x_min, y_min, x_max, y_max = (int(v) for v in box)
+        masks = np.zeros((3, HEIGHT, WIDTH), dtype=bool)
+        for index, shrink in enumerate((0, 2, 4)):
+            masks[index, y_min + shrink:y_max - shrink, x_min + shrink:x_max - shrink] = True
+        scores = np.array([0.5, 0.9, 0.7], dtype=np.float32)
+        logits = np.stack([np.full((256, 256), score, dtype=np.float32) for score in scores])
+        return masks, scores, logits
+
+    def _single(self, box):
+        x_min, y_min, x_max, y_max = (int(v) for v in box)
+        mask = np.zeros((1, HEIGHT, WIDTH), dtype=bool)
+        mask[0, y_min + 1:y_max - 1, x_min + 1:x_max - 1] = True
+        return mask, np.array([0.8], dtype=np.float32), np.full((1, 256, 256), 0.8, dtype=np.float32)
+
+    def predict(self, box, multimask_output=True):
+        boxes = np.asarray(box, dtype=np.float32).reshape(-1, 4)
+        self.calls.append((len(boxes), multimask_output))
+        predict_box = self._candidates if multimask_output else self._single
+        masks, scores, logits = (np.stack(parts) for parts in zip(*(predict_box(b) for b in boxes)))
+        # Like SAM2, a single box comes back without the batch axis
+        if len(boxes) == 1:
+            return masks[0], scores[0], logits[0]
+        return masks, scores, logits
+
+def random_boxes(rng, count):
+    x = rng.integers(0, WIDTH - 16, size=count)
+    y = rng.integers(0, HEIGHT - 16, size=count)
+    return [(float(x0), float(y0), float(x0 + 14), float(y0 + 14)) for x0, y0 in zip(x, y)]
+
+def per_box_single(predictor, image, boxes):
+    """SAM2's single-mask prediction of every box, decoded one box at a time."""
+    predictor.set_image(image)
+    return [predictor.predict(box=np.array(box), multimask_output=False)[0][0] for box in boxes]
+
+def per_box_argmax(predictor, image, boxes):
+    """The best of the three candidates of every box, what was stored before single masks."""
+    predictor.set_image(image)
+    best = []
+    for box in boxes:
+        masks, scores, _ = predictor.predict(box=np.array(box), multimask_output=True)
+        best.append(masks[np.argmax(scores)])
+    return best
+
+@pytest.mark.parametrize("count", [1, 2, 5, 17])
+@pytest.mark.parametrize("chunk_size", [1, 4, 16])
+def test_batched_single_masks_match_per_box(count, chunk_size):
+    rng = np.random.default_rng(count * 100 + chunk_size)
+    image = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    boxes = random_boxes(rng, count)
+
+    predictor = StubPredictor()
+    masks, scores, logits = SegmentationSession(predictor, image).segment(boxes, single_mask=True, chunk_size=chunk_size)
+
+    assert masks.shape == (count, HEIGHT, WIDTH)
+    assert scores.shape == (count,)
+    assert logits.shape == (count, 256, 256)
+    # SAM2's single-mask prediction, not the best of the multimask candidates
+    reference_predictor = StubPredictor()
+    for mask, single, argmax in zip(masks, per_box_single(reference_predictor, image, boxes),
+                                    per_box_argmax(reference_predictor, image, boxes)):
+        np.testing.assert_array_equal(mask, single)
+        assert not np.array_equal(mask, argmax)
+    # One mask per box is requested, in chunks of at most chunk_size boxes
+    assert all(not multimask and size <= chunk_size for size, multimask in predictor.calls)
+    assert sum(size for size, _ in predictor.calls) == count
+
+def test_multimask_keeps_all_candidates():
+    image = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    boxes = random_boxes(np.random.default_rng(0), 5)
+    masks, scores, logits = SegmentationSession(StubPredictor(), image).segment(boxes, chunk_size=2)
+    assert masks.shape == (5, 3, HEIGHT, WIDTH)
+    assert scores.shape == (5, 3)
+    assert logits.shape == (5, 3, 256, 256)
+
+@pytest.mark.parametrize("single_mask", [False, True])
+def test_no_boxes(single_mask):
+    image = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    predictor = StubPredictor()
+    masks, scores, _ = SegmentationSession(predictor, image).segment([], single_mask=single_mask)
+    assert len(masks) == 0 and len(scores) == 0
+    assert predictor.calls == []
@@ -0,0 +1,41 @@
+import io
+import os
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from backend.scripts.tiles import TileCache
+
+def image_source(width, height, color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "PNG")
+    return lambda: io.BytesIO(buffer.getvalue())
+
+def test_read_tile(tmp_path):
+    cache = TileCache(str(tmp_path), tile_size=64)
+    tile = cache.read_tile("a", 9, 0, 0, image_source(300, 200, (255, 0, 0)))
+    assert Image.open(io.BytesIO(tile)).size == (64, 64)
+    assert cache.read_tile("a", 9, 5, 0, image_source(300, 200, (255, 0, 0))) is None
+    assert cache.stats()["builds"] == 1 and cache.stats()["hits"] == 1
+
+def test_eviction_moves_pyramids_aside(tmp_path):
+    cache = TileCache(str(tmp_path), max_bytes=1, tile_size=64)
+    source = image_source(100, 100, (0, 255, 0))
+    cache.read_tile("a", 0, 0, 0, source)
+    # An open tile of an evicted pyramid stays readable
+    tile_file = open(os.path.join(cache.ensure("a", source), "0", "0_0.jpg"), "rb")
+    cache.read_tile("b", 0, 0, 0, image_source(100, 100, (0, 0, 255)))
+    with tile_file:
+        assert tile_file.read()
+
+    assert cache.stats()["evictions"] == 1
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(cache._pyramid_dir("b"))]
+    # The evicted image is built again on its next request
+    assert cache.read_tile("a", 0, 0, 0, source)
+    assert cache.stats()["builds"] == 3
+
+def test_leftovers_are_removed_on_start(tmp_path):
+    (tmp_path / ".build-x").mkdir()
+    (tmp_path / ".evicted-y").mkdir()
+    TileCache(str(tmp_path))
+    assert os.listdir(tmp_path) == []